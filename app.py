@@ -8,6 +8,11 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from config import Config
+from utils.user_cache import UserCache
+from services.client_search import ClientSearch
+from services.document_storage import DocumentStorage
+from services.report_cache import ReportCache
+from utils.query_stats import QueryStats
 from flask_wtf.csrf import CSRFProtect, CSRFError
 
 from flask_migrate import Migrate
@@ -29,6 +34,10 @@ def handle_csrf_error(e):
     return redirect(url_for('auth.login'))
 
 db.init_app(app)
+ClientSearch.init_app(app) # Mantiene sincronizado el índice de búsqueda de clientes
+DocumentStorage.init_app(app) # Conteo de referencias de los archivos deduplicados
+ReportCache.init_app(app) # Versiones de datos que invalidan los PDF de reportes en caché
+QueryStats.init_app(app, db) # Instrumentación SQL por petición (solo con SQL_STATS_ENABLED)
 migrate = Migrate(app, db) # Initialize Flask-Migrate
 
 login_manager = LoginManager()
@@ -37,7 +46,8 @@ login_manager.login_view = 'auth.login'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Caché por proceso: evita un SELECT de User en cada petición (polling de chat y notificaciones)
+    return UserCache.load(int(user_id))
 
 from routes.auth import auth_bp
 from routes.admin import admin_bp
@@ -50,6 +60,7 @@ from routes.financial import financial_bp
 from routes.radicador import radicador_bp
 from routes.appointments import appointments_bp
 from routes.negociador import negociador_bp
+from routes.pdf_jobs import pdf_jobs_bp
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(admin_bp)
@@ -61,67 +72,32 @@ app.register_blueprint(financial_bp)
 app.register_blueprint(radicador_bp)
 app.register_blueprint(appointments_bp)
 app.register_blueprint(negociador_bp)
+app.register_blueprint(pdf_jobs_bp)
 app.register_blueprint(main_bp)
 
+# Comandos de mantenimiento ('flask sweep-arrears', ...)
+from commands import register_commands
+register_commands(app)
 
-from models import CaseMessage, Client
+# Tareas programadas opcionales: solo en el servidor web (gunicorn o python app.py). Flask marca
+# con FLASK_RUN_FROM_CLI todo proceso de 'flask ...' (db upgrade, pdf-worker, gc-uploads, run)
+if app.config.get('ARREARS_SCHEDULER_ENABLED') and os.environ.get('FLASK_RUN_FROM_CLI') != 'true':
+    from services.payment_service import PaymentService
+    from utils.scheduler import DailyJob
+    DailyJob(app, 'sweep-arrears', app.config.get('ARREARS_SWEEP_HOUR', 1), PaymentService.sweep_arrears).start()
+
+
+from services.notification_service import NotificationService
 
 @app.context_processor
+@QueryStats.track('app.inject_notifications')
 def inject_notifications():
     if not current_user.is_authenticated:
         return dict(unread_messages_count=0, notifications_list={})
-    
-    total_count = 0
-    notifications_list = {}
-    
-    if current_user.rol == 'Cliente':
-        # Buscamos el cliente asociado a este usuario de login
-        user_client = Client.query.filter_by(login_user_id=current_user.id).first()
-        if user_client:
-            unread_msgs = CaseMessage.query.filter(
-                CaseMessage.client_id == user_client.id,
-                CaseMessage.sender_id != current_user.id,
-                CaseMessage.is_read_by_recipient == False
-            ).all()
-            total_count = len(unread_msgs)
-            if total_count > 0:
-                notifications_list[user_client.id] = {
-                    'name': 'Mi Abogado',
-                    'count': total_count,
-                    'id': user_client.id
-                }
-            
-    elif current_user.rol in ['Admin', 'Analista', 'Abogado', 'Radicador', 'Negociador', 'Aliado']:
-        from sqlalchemy import or_
-        query = CaseMessage.query.filter(
-            CaseMessage.sender_id != current_user.id,
-            CaseMessage.is_read_by_recipient == False
-        )
-        
-        if current_user.rol != 'Admin':
-            query = query.join(Client).filter(
-                or_(
-                    Client.analista_id == current_user.id,
-                    Client.abogado_id == current_user.id,
-                    Client.radicador_id == current_user.id,
-                    Client.negociador_id == current_user.id
-                )
-            )
-        
-        unread_msgs = query.all()
-        total_count = len(unread_msgs)
-        
-        for msg in unread_msgs:
-            c_id = msg.client_id
-            if c_id not in notifications_list:
-                notifications_list[c_id] = {
-                    'name': msg.client.nombre,
-                    'count': 0,
-                    'id': c_id
-                }
-            notifications_list[c_id]['count'] += 1
-            
-    return dict(unread_messages_count=total_count, notifications_list=notifications_list)
+
+    # Lee los contadores desnormalizados en lugar de escanear CaseMessage en cada página
+    summary = NotificationService.get_unread_summary(current_user)
+    return dict(unread_messages_count=summary['count'], notifications_list=summary['clients'])
 
 if __name__ == '__main__':
     with app.app_context():
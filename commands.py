@@ -0,0 +1,138 @@
+import signal
+import time
+import click
+from datetime import timedelta
+from models import db, StoredBlob
+from services.document_service import DocumentService
+from services.document_storage import DocumentStorage
+from services.payment_service import PaymentService
+from services.pdf_job_service import PdfJobService
+from services.upload_gc import UploadGC
+
+def register_commands(app):
+    """
+    Registers the maintenance commands on `flask`.
+    """
+
+    @app.cli.command('sweep-arrears')
+    def sweep_arrears():
+        """Marca En Mora todas las cuotas pendientes vencidas.
+
+        Programar una vez al día, por ejemplo con cron:
+
+            15 1 * * * cd /ruta/al/crm && FLASK_APP=app.py venv/bin/flask sweep-arrears
+        """
+        updated = PaymentService.sweep_arrears()
+        click.echo(f"Cuotas marcadas En Mora: {updated}")
+
+    @app.cli.command('verify-documents')
+    @click.option('--batch-size', default=500, show_default=True, help='Blobs leídos por consulta.')
+    def verify_documents(batch_size):
+        """Recalcula el SHA-256 de cada archivo del almacén y reporta los faltantes o alterados."""
+        checked = 0
+        problems = 0
+        last_sha = ''
+        while True:
+            blobs = StoredBlob.query.filter(StoredBlob.sha256 > last_sha).order_by(StoredBlob.sha256).limit(batch_size).all()
+            if not blobs:
+                break
+            for blob in blobs:
+                problem = DocumentStorage.verify(blob)
+                if problem:
+                    problems += 1
+                    click.echo(f"{blob.sha256}: {problem} (referencias: {blob.ref_count})")
+            checked += len(blobs)
+            last_sha = blobs[-1].sha256
+        click.echo(f"Archivos verificados: {checked}, con problemas: {problems}")
+
+    @app.cli.command('migrate-uploads')
+    @click.option('--batch-size', default=200, show_default=True, help='Documentos por lote (un commit por lote).')
+    @click.option('--pause', default=0.0, show_default=True, help='Segundos de espera entre lotes para no cargar el servidor.')
+    @click.option('--dry-run', is_flag=True, help='Solo informa qué se migraría.')
+    def migrate_uploads(batch_size, pause, dry_run):
+        """Mueve los archivos planos de uploads/ al almacén por hash (uploads/blobs/<aa>/<bb>/).
+
+        Se puede ejecutar con la aplicación en línea y repetir si se interrumpe:
+        cada lote solo toma los documentos que todavía no tienen blob.
+        """
+        after_id = 0
+        migrated = 0
+        missing = []
+        while True:
+            result = DocumentService.migrate_legacy_batch(batch_size=batch_size, after_id=after_id, dry_run=dry_run)
+            if result['last_id'] is None:
+                break
+            after_id = result['last_id']
+            migrated += result['migrated']
+            missing.extend(result['missing'])
+            click.echo(f"Hasta el documento {after_id}: {migrated} migrados, {len(missing)} sin archivo")
+            if pause:
+                time.sleep(pause)
+
+        for filename in missing:
+            click.echo(f"Sin archivo en disco: {filename}")
+        action = 'Se migrarían' if dry_run else 'Migrados'
+        click.echo(f"{action}: {migrated} documentos. Sin archivo: {len(missing)}")
+
+    @app.cli.command('gc-uploads')
+    @click.option('--grace-hours', default=24, show_default=True, help='Solo archivos sin modificar en este tiempo.')
+    @click.option('--delete', 'delete_files', is_flag=True, help='Elimina los huérfanos.')
+    @click.option('--move-to', type=click.Path(file_okay=False), help='Mueve los huérfanos a esta carpeta (fuera de uploads/).')
+    def gc_uploads(grace_hours, delete_files, move_to):
+        """Busca archivos de uploads/ que ninguna fila de la base referencia.
+
+        Sin --delete ni --move-to solo muestra el reporte (dry-run).
+        """
+        dry_run = not (delete_files or move_to)
+
+        def report(path, size, reason):
+            click.echo(f"{path}\t{size}\t{reason}")
+
+        summary = UploadGC.collect(timedelta(hours=grace_hours), dry_run=dry_run, move_to=move_to, report=report)
+        megabytes = summary['bytes'] / (1024 * 1024)
+        if dry_run:
+            click.echo(f"Dry-run: {summary['files']} archivos huérfanos ({megabytes:.1f} MB). Use --delete o --move-to para limpiarlos.")
+        else:
+            action = 'Movidos' if move_to else 'Eliminados'
+            click.echo(f"{action}: {summary['files']} archivos ({megabytes:.1f} MB). Blobs sin documentos borrados: {summary['blob_rows']}")
+
+    @app.cli.command('pdf-worker')
+    @click.option('--poll-interval', default=2.0, show_default=True, help='Segundos de espera cuando no hay trabajos.')
+    @click.option('--once', is_flag=True, help='Procesa los trabajos pendientes y termina.')
+    def pdf_worker(poll_interval, once):
+        """Genera los PDF encolados por la aplicación (comprobantes y balance general).
+
+        Ejecutar como servicio aparte del servidor web (systemd, supervisor). Se pueden correr
+        varios procesos a la vez; cada trabajo lo toma uno solo. Con SIGTERM termina el trabajo
+        en curso antes de salir.
+        """
+        stop = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.append(signum))
+
+        timeout = timedelta(seconds=app.config.get('PDF_JOB_TIMEOUT', 600))
+        max_attempts = app.config.get('PDF_JOB_MAX_ATTEMPTS', 3)
+        retention = timedelta(days=app.config.get('PDF_JOB_RETENTION_DAYS', 7))
+        last_purge = 0.0
+
+        click.echo('Worker de PDF iniciado.')
+        while not stop:
+            if time.monotonic() - last_purge > 3600:
+                purged = PdfJobService.purge_finished(retention)
+                if purged:
+                    click.echo(f"Trabajos antiguos eliminados: {purged}")
+                last_purge = time.monotonic()
+            PdfJobService.requeue_stale(timeout, max_attempts)
+
+            job = PdfJobService.claim_next()
+            if job is None:
+                db.session.remove()
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            started = time.monotonic()
+            ok = PdfJobService.run(job)
+            click.echo(f"Trabajo {job.id} ({job.tipo}): {'listo' if ok else 'error'} en {time.monotonic() - started:.1f} s")
+            # Sesión nueva por trabajo: el proceso vive días y no debe acumular objetos
+            db.session.remove()
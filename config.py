@@ -12,6 +12,57 @@ class Config:
     SQLALCHEMY_ENGINE_OPTIONS = {"pool_pre_ping": True}
     UPLOAD_FOLDER = 'uploads'
 
+    # Envío de archivos de uploads/: 'python' (desarrollo), 'x-accel' (Nginx X-Accel-Redirect)
+    # o 'x-sendfile' (Apache/Lighttpd). La location interna de Nginx debe apuntar a UPLOAD_FOLDER
+    DOWNLOAD_BACKEND = os.environ.get('DOWNLOAD_BACKEND', 'python')
+    DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/_protected_uploads/')
+
+    # Generación de PDF en segundo plano con 'flask pdf-worker'. PDF_JOBS_INLINE los genera dentro
+    # de la misma petición (desarrollo sin worker). Un trabajo en proceso por más de PDF_JOB_TIMEOUT
+    # segundos se reintenta hasta PDF_JOB_MAX_ATTEMPTS veces; los terminados se borran tras PDF_JOB_RETENTION_DAYS
+    PDF_JOBS_INLINE = os.environ.get('PDF_JOBS_INLINE', 'false').lower() in ('1', 'true', 'yes')
+    PDF_JOB_TIMEOUT = int(os.environ.get('PDF_JOB_TIMEOUT', 600))
+    PDF_JOB_MAX_ATTEMPTS = int(os.environ.get('PDF_JOB_MAX_ATTEMPTS', 3))
+    PDF_JOB_RETENTION_DAYS = int(os.environ.get('PDF_JOB_RETENTION_DAYS', 7))
+    # Procesos que convierten a PDF los comprobantes de un lote (0 = uno por CPU)
+    RECEIPT_BATCH_WORKERS = int(os.environ.get('RECEIPT_BATCH_WORKERS', 0))
+
+    # Tamaño máximo de la caché de PDF de reportes (uploads/reports); se eliminan primero los menos usados
+    REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_MB', 200)) * 1024 * 1024
+
+    # Segundos que el user_loader reutiliza los datos de sesión del usuario (0 desactiva el caché)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    # Segundos entre lecturas de la versión del caché de usuarios en la base (cache_version): un cambio de
+    # contraseña, borrado o revocación en cualquier servidor invalida el caché de los demás en ese plazo
+    USER_CACHE_VERSION_CHECK = int(os.environ.get('USER_CACHE_VERSION_CHECK', 5))
+
+    # Stream SSE de notificaciones. Cada pestaña abierta retiene un worker mientras dura la conexión:
+    # activarlo solo con workers asíncronos (gunicorn -k gevent). Apagado, el navegador usa el polling JSON
+    NOTIFICATIONS_STREAM_ENABLED = os.environ.get('NOTIFICATIONS_STREAM_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    # Segundos entre revisiones y vida máxima de cada conexión
+    NOTIFICATIONS_STREAM_INTERVAL = int(os.environ.get('NOTIFICATIONS_STREAM_INTERVAL', 3))
+    NOTIFICATIONS_STREAM_MAX_AGE = int(os.environ.get('NOTIFICATIONS_STREAM_MAX_AGE', 55))
+
+    # Segundos que se reutiliza el total de registros de los listados paginados (0 desactiva el caché)
+    PAGINATION_COUNT_TTL = int(os.environ.get('PAGINATION_COUNT_TTL', 60))
+
+    # Barrido diario de cuotas en mora dentro del proceso web (solo despliegues de un servidor;
+    # con varios servidores usar cron con 'flask sweep-arrears'). No arranca en los comandos 'flask ...'
+    ARREARS_SCHEDULER_ENABLED = os.environ.get('ARREARS_SCHEDULER_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    ARREARS_SWEEP_HOUR = int(os.environ.get('ARREARS_SWEEP_HOUR', 1))
+
+    # Instrumentación SQL por petición (conteo, tiempo, consultas repetidas / N+1). En modo debug
+    # se envía en la cabecera X-SQL-Stats; en producción como una línea JSON por petición en el log
+    SQL_STATS_ENABLED = os.environ.get('SQL_STATS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    SQL_STATS_HEADER = os.environ.get('SQL_STATS_HEADER', 'false').lower() in ('1', 'true', 'yes')
+    # Veces que debe repetirse la misma forma de consulta en una petición para reportarla como N+1
+    SQL_STATS_REPEAT_THRESHOLD = int(os.environ.get('SQL_STATS_REPEAT_THRESHOLD', 5))
+    # Presupuesto de sentencias por endpoint o sección ('endpoint=max,...'); 0 en el default lo desactiva
+    SQL_QUERY_BUDGETS = os.environ.get(
+        'SQL_QUERY_BUDGETS', 'admin.reports=10,admin.impuestos_dashboard=10,app.inject_notifications=2'
+    )
+    SQL_QUERY_BUDGET_DEFAULT = int(os.environ.get('SQL_QUERY_BUDGET_DEFAULT', 0))
+
     # Cookies seguras para producción con HTTPS
     SESSION_COOKIE_SECURE = os.environ.get('FLASK_ENV') != 'development'
     SESSION_COOKIE_HTTPONLY = True
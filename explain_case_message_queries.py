@@ -0,0 +1,86 @@
+from app import app
+from models import db, CaseMessage, Client, User
+from sqlalchemy import func, or_, update, text
+
+def compile_sql(statement):
+    """Renderiza la consulta con los parámetros en línea para poder pasarla a EXPLAIN."""
+    return str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+
+def explain(title, statement):
+    sql = compile_sql(statement)
+    if db.engine.dialect.name == 'postgresql':
+        explain_sql = f"EXPLAIN {sql}"
+    else:
+        explain_sql = f"EXPLAIN QUERY PLAN {sql}"
+
+    print("=" * 80)
+    print(title)
+    print("-" * 80)
+    print(sql)
+    print("-" * 80)
+    for row in db.session.execute(text(explain_sql)):
+        print(" | ".join(str(col) for col in row))
+    print()
+
+def main():
+    """
+    Imprime el plan de ejecución de las consultas de CaseMessage (historial, no leídos,
+    marcar como leído y feed de notificaciones) para confirmar que usan los índices.
+    """
+    with app.app_context():
+        # Tomamos el cliente con más mensajes y un usuario de staff como muestra
+        sample = db.session.query(CaseMessage.client_id, func.count(CaseMessage.id)).group_by(
+            CaseMessage.client_id
+        ).order_by(func.count(CaseMessage.id).desc()).first()
+        client_id = sample[0] if sample else 1
+        client = Client.query.get(client_id)
+        user_id = (client.abogado_id if client and client.abogado_id else None) or \
+            (db.session.query(User.id).filter(User.rol == 'Abogado').scalar() or 1)
+
+        print(f"Motor: {db.engine.dialect.name} | cliente de muestra: {client_id} | usuario de muestra: {user_id}\n")
+
+        history = CaseMessage.query.filter(
+            CaseMessage.client_id == client_id
+        ).order_by(CaseMessage.id.desc()).limit(51)
+        explain("Historial del chat (última página)", history.statement)
+
+        history_before = CaseMessage.query.filter(
+            CaseMessage.client_id == client_id,
+            CaseMessage.id < 1000000
+        ).order_by(CaseMessage.id.desc()).limit(51)
+        explain("Historial del chat (before_id)", history_before.statement)
+
+        unread_by_sender = db.session.query(CaseMessage.sender_id, func.count(CaseMessage.id)).filter(
+            CaseMessage.client_id == client_id,
+            CaseMessage.is_read_by_recipient == False
+        ).group_by(CaseMessage.sender_id)
+        explain("No leídos por remitente (recalculo de contadores)", unread_by_sender.statement)
+
+        mark_read = update(CaseMessage).where(
+            CaseMessage.client_id == client_id,
+            CaseMessage.sender_id != user_id,
+            CaseMessage.is_read_by_recipient == False
+        ).values(is_read_by_recipient=True)
+        explain("Marcar como leído", mark_read)
+
+        admin_feed = CaseMessage.query.filter(
+            CaseMessage.sender_id != user_id,
+            CaseMessage.is_read_by_recipient == False
+        ).order_by(CaseMessage.timestamp.desc()).limit(50)
+        explain("Feed de notificaciones (Admin)", admin_feed.statement)
+
+        staff_feed = CaseMessage.query.filter(
+            CaseMessage.sender_id != user_id,
+            CaseMessage.is_read_by_recipient == False
+        ).join(Client).filter(
+            or_(
+                Client.analista_id == user_id,
+                Client.abogado_id == user_id,
+                Client.radicador_id == user_id,
+                Client.negociador_id == user_id
+            )
+        ).order_by(CaseMessage.timestamp.desc()).limit(50)
+        explain("Feed de notificaciones (staff asignado)", staff_feed.statement)
+
+if __name__ == '__main__':
+    main()
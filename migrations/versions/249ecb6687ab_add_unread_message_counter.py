@@ -0,0 +1,40 @@
+"""Add UnreadMessageCounter table
+
+Revision ID: 249ecb6687ab
+Revises: ef6786e6889d
+Create Date: 2026-10-18 09:12:40.118245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '249ecb6687ab'
+down_revision = 'ef6786e6889d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('unread_message_counter',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['client_id'], ['client.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'client_id', name='uq_unread_counter_user_client')
+    )
+    with op.batch_alter_table('unread_message_counter', schema=None) as batch_op:
+        batch_op.create_index('ix_unread_counter_user_count', ['user_id', 'count'], unique=False)
+
+    # Los contadores se llenan después de migrar con: python rebuild_unread_counters.py
+
+
+def downgrade():
+    with op.batch_alter_table('unread_message_counter', schema=None) as batch_op:
+        batch_op.drop_index('ix_unread_counter_user_count')
+
+    op.drop_table('unread_message_counter')
@@ -0,0 +1,65 @@
+"""Add trigram / FTS5 search index for client name, phone and ID
+
+Revision ID: a3c91f0d7e52
+Revises: ecb3277d3a40
+Create Date: 2026-10-18 12:14:51.208337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import unicodedata
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c91f0d7e52'
+down_revision = 'ecb3277d3a40'
+branch_labels = None
+depends_on = None
+
+
+def _normalize(value):
+    # Misma normalización que services.client_search.normalize_term (copiada para no importar la app)
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', value)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower().strip()
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+        # unaccent() es STABLE; el wrapper IMMUTABLE con diccionario explícito permite usarlo en un índice
+        op.execute("""
+            CREATE OR REPLACE FUNCTION crm_unaccent(text) RETURNS text AS
+            $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+            LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+        """)
+        op.execute('CREATE INDEX ix_client_nombre_trgm ON client USING gin (crm_unaccent(lower(nombre)) gin_trgm_ops)')
+        op.execute('CREATE INDEX ix_client_telefono_trgm ON client USING gin (lower(telefono) gin_trgm_ops)')
+        op.execute('CREATE INDEX ix_client_numero_id_trgm ON client USING gin (lower(numero_id) gin_trgm_ops)')
+
+    elif bind.dialect.name == 'sqlite':
+        # Tabla FTS5 con tokenizador trigram (SQLite >= 3.34); rowid = client.id
+        op.execute("CREATE VIRTUAL TABLE client_search_fts USING fts5(nombre, telefono, numero_id, tokenize='trigram')")
+        rows = bind.execute(sa.text('SELECT id, nombre, telefono, numero_id FROM client')).fetchall()
+        for row in rows:
+            bind.execute(
+                sa.text('INSERT INTO client_search_fts (rowid, nombre, telefono, numero_id) VALUES (:id, :nombre, :telefono, :numero_id)'),
+                {'id': row[0], 'nombre': _normalize(row[1]), 'telefono': _normalize(row[2]), 'numero_id': _normalize(row[3])}
+            )
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_client_numero_id_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_client_telefono_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_client_nombre_trgm')
+        op.execute('DROP FUNCTION IF EXISTS crm_unaccent(text)')
+
+    elif bind.dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS client_search_fts')
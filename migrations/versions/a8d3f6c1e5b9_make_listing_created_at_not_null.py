@@ -0,0 +1,32 @@
+"""Backfill and require created_at on the keyset-paginated tables
+
+Revision ID: a8d3f6c1e5b9
+Revises: f2b7d5a1c9e4
+Create Date: 2026-10-18 21:04:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d3f6c1e5b9'
+down_revision = 'f2b7d5a1c9e4'
+branch_labels = None
+depends_on = None
+
+# Las filas sin fecha quedan al final de los listados, como las ordenaba SQLite
+EPOCH = '1970-01-01 00:00:00'
+
+
+def upgrade():
+    for table in ('client', 'negotiation'):
+        op.execute(sa.text(f"UPDATE {table} SET created_at = :epoch WHERE created_at IS NULL").bindparams(epoch=EPOCH))
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    for table in ('negotiation', 'client'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
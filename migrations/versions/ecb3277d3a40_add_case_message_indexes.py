@@ -0,0 +1,36 @@
+"""Add composite and partial indexes to CaseMessage
+
+Revision ID: ecb3277d3a40
+Revises: 249ecb6687ab
+Create Date: 2026-10-18 11:03:27.402113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ecb3277d3a40'
+down_revision = '249ecb6687ab'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Historial del chat: WHERE client_id = ? ORDER BY id (keyset)
+    op.create_index('ix_case_message_client_id_id', 'case_message', ['client_id', 'id'], unique=False)
+
+    # Índices parciales: solo cubren los mensajes pendientes de leer, que son pocos frente al historial.
+    # En motores sin índices parciales quedan como índices compuestos normales.
+    op.create_index('ix_case_message_unread_client_sender', 'case_message', ['client_id', 'sender_id'], unique=False,
+                    postgresql_where=sa.text('is_read_by_recipient = false'),
+                    sqlite_where=sa.text('is_read_by_recipient = 0'))
+    op.create_index('ix_case_message_unread_timestamp', 'case_message', ['timestamp'], unique=False,
+                    postgresql_where=sa.text('is_read_by_recipient = false'),
+                    sqlite_where=sa.text('is_read_by_recipient = 0'))
+
+
+def downgrade():
+    op.drop_index('ix_case_message_unread_timestamp', table_name='case_message')
+    op.drop_index('ix_case_message_unread_client_sender', table_name='case_message')
+    op.drop_index('ix_case_message_client_id_id', table_name='case_message')
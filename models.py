@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import re
 from flask_login import UserMixin
 
 db = SQLAlchemy()
@@ -42,14 +43,16 @@ class Client(db.Model):
 
     ciudad = db.Column(db.String(50))
     es_responsable_iva = db.Column(db.Boolean, default=False)
-    motivo_consulta = db.Column(db.Text)
+    # Textos largos: solo se cargan al leerlos (ficha del cliente), no en los listados
+    motivo_consulta = db.deferred(db.Column(db.Text), group='client_texts')
     estado = db.Column(db.String(50), default=ClientStatus.NUEVO) # Use keys from ClientStatus
     analista_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     abogado_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     radicador_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     negociador_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    conclusion_analisis = db.Column(db.Text) # New field for analysis conclusion
+    # NOT NULL: es la clave de la paginación por cursor, donde una fila NULL nunca pasaría de la primera página
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    conclusion_analisis = db.deferred(db.Column(db.Text), group='client_texts') # New field for analysis conclusion
     last_status_update = db.Column(db.DateTime, default=datetime.utcnow) # New field for last status update
     login_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # Link to User
 
@@ -59,6 +62,14 @@ class Client(db.Model):
     radicador = db.relationship('User', foreign_keys=[radicador_id], backref='casos_radicados')
     negociador = db.relationship('User', foreign_keys=[negociador_id], backref='casos_negociados')
 
+    __table_args__ = (
+        # Listados por rol filtrados por rango de fecha y ordenados por (created_at, id)
+        db.Index('ix_client_created_at_id', 'created_at', 'id'),
+        db.Index('ix_client_analista_created_at', 'analista_id', 'created_at'),
+        db.Index('ix_client_abogado_estado_created_at', 'abogado_id', 'estado', 'created_at'),
+        db.Index('ix_client_radicador_created_at', 'radicador_id', 'created_at'),
+    )
+
 
 class FinancialObligation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -98,10 +109,22 @@ class Installment(db.Model):
     monto_cuota = db.Column(db.Numeric(15, 2))
     estado = db.Column(db.String(20), default='Pendiente') # 'Pendiente', 'Pagado'
 
+class StoredBlob(db.Model):
+    # Contenido de un archivo guardado una sola vez por hash (uploads/blobs/<aa>/<bb>/<sha256>)
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0) # Documentos que lo usan; 0 = candidato a limpieza
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Document(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    filename = db.Column(db.String(255), nullable=False)
+    filename = db.Column(db.String(255), nullable=False, index=True)
     client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
+    # None en documentos anteriores al almacenamiento por hash (archivo plano en uploads/<filename>)
+    blob_sha256 = db.Column(db.String(64), db.ForeignKey('stored_blob.sha256'), nullable=True, index=True)
+    # Pago del que el documento es comprobante (None en documentos que no son comprobantes)
+    payment_diagnosis_id = db.Column(db.Integer, db.ForeignKey('payment_diagnosis.id', ondelete='SET NULL'), nullable=True, index=True)
+    contract_installment_id = db.Column(db.Integer, db.ForeignKey('contract_installment.id', ondelete='SET NULL'), nullable=True, index=True)
     uploaded_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     visible_para_analista = db.Column(db.Boolean, default=False)
     visible_para_cliente = db.Column(db.Boolean, default=False)
@@ -109,12 +132,19 @@ class Document(db.Model):
     
     uploaded_by = db.relationship('User', backref='documents')
     client = db.relationship('Client', backref=db.backref('documents', cascade='all, delete-orphan'))
+    blob = db.relationship('StoredBlob')
+
+    @property
+    def display_name(self):
+        # Nombre para listas y descargas: sin el prefijo client_<id>_ de las subidas (los comprobantes no lo llevan)
+        return re.sub(r'^client_\d+_', '', self.filename)
 
 class PaymentDiagnosis(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False, unique=True)
     valor = db.Column(db.Numeric(15, 2))
-    fecha_pago = db.Column(db.Date, index=True)
+    # active_history: al mover la fecha de un objeto expirado, ReportCache conoce también el mes anterior
+    fecha_pago = db.column_property(db.Column(db.Date, index=True), active_history=True)
     metodo_pago = db.Column(db.String(50)) # 'Nequi', 'Daviplata', 'Bancolombia', 'Link de pago', 'Efectivo'
     verificado = db.Column(db.Boolean, default=False)
 
@@ -134,7 +164,7 @@ class ContractInstallment(db.Model):
     numero_cuota = db.Column(db.Integer, nullable=False)
     concepto = db.Column(db.String(255)) # New field for description
     valor = db.Column(db.Numeric(15, 2))
-    fecha_vencimiento = db.Column(db.Date, index=True)
+    fecha_vencimiento = db.column_property(db.Column(db.Date, index=True), active_history=True)  # Fecha anterior cargada al asignar (ver ReportCache)
     metodo_pago = db.Column(db.String(255))
 
     estado = db.Column(db.String(50), default='Pendiente') # 'Pendiente', 'Pagada', 'En Mora'
@@ -173,9 +203,36 @@ class CaseMessage(db.Model):
     client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
     is_read_by_recipient = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        # Historial paginado por cliente (keyset sobre id)
+        db.Index('ix_case_message_client_id_id', 'client_id', 'id'),
+        # Solo mensajes no leídos: conteos por cliente/remitente y feed de notificaciones
+        db.Index('ix_case_message_unread_client_sender', 'client_id', 'sender_id',
+                 postgresql_where=db.text('is_read_by_recipient = false'),
+                 sqlite_where=db.text('is_read_by_recipient = 0')),
+        db.Index('ix_case_message_unread_timestamp', 'timestamp',
+                 postgresql_where=db.text('is_read_by_recipient = false'),
+                 sqlite_where=db.text('is_read_by_recipient = 0')),
+    )
+
     sender = db.relationship('User', backref='sent_case_messages')
     client = db.relationship('Client', backref=db.backref('case_messages', cascade='all, delete-orphan'))
 
+class UnreadMessageCounter(db.Model):
+    # Contador desnormalizado de mensajes no leídos por (usuario, cliente). Lo mantiene NotificationService.
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'client_id', name='uq_unread_counter_user_client'),
+        db.Index('ix_unread_counter_user_count', 'user_id', 'count'),
+    )
+
+    user = db.relationship('User', backref=db.backref('unread_counters', cascade='all, delete-orphan'))
+    client = db.relationship('Client', backref=db.backref('unread_counters', cascade='all, delete-orphan'))
+
 class ClientNote(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
@@ -192,7 +249,7 @@ class Expense(db.Model):
     descripcion = db.Column(db.String(255), nullable=False)
     valor_base = db.Column(db.Float, nullable=False)
     valor_impuesto = db.Column(db.Float, default=0.0)
-    fecha = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha = db.column_property(db.Column(db.DateTime, default=datetime.utcnow), active_history=True)  # Fecha anterior cargada al asignar (ver ReportCache)
     usuario_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
     usuario = db.relationship('User', backref='expenses_registered')
@@ -207,9 +264,45 @@ class Negotiation(db.Model):
     observaciones = db.Column(db.Text, nullable=True)  # Notas del negociador
     aceptada_por_cliente = db.Column(db.Boolean, nullable=True, default=None)  # None=sin respuesta, True=aceptada, False=rechazada
     fecha_respuesta_cliente = db.Column(db.DateTime, nullable=True)  # Cuando el cliente respondió
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Clave de la paginación por cursor
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     obligation = db.relationship('FinancialObligation', backref=db.backref('negotiations', lazy=True))
     negociador = db.relationship('User', backref='negociaciones_asignadas')
 
+
+class ReportDataVersion(db.Model):
+    # Versión de los datos financieros de un mes; la sube ReportCache cuando cambian pagos, cuotas o gastos
+    periodo = db.Column(db.String(7), primary_key=True) # 'YYYY-MM'
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CacheVersion(db.Model):
+    # Versión de un caché en memoria compartida por todos los procesos y servidores; la sube UserCache.bump_version
+    name = db.Column(db.String(50), primary_key=True) # 'users'
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class PdfJob(db.Model):
+    # PDF pendiente de generar por el worker ('flask pdf-worker') fuera de las peticiones web
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(30), nullable=False) # 'comprobante', 'balance_general'
+    estado = db.Column(db.String(20), nullable=False, default='Pendiente') # 'Pendiente', 'Procesando', 'Listo', 'Error'
+    params = db.Column(db.Text, nullable=False, default='{}') # JSON con los datos para armar el PDF
+    params_hash = db.Column(db.String(32), nullable=True) # Para no encolar dos veces el mismo reporte
+    requested_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=True)
+    result_filename = db.Column(db.String(255), nullable=True) # Documento creado o archivo relativo a UPLOAD_FOLDER
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_pdf_job_estado_id', 'estado', 'id'),
+        db.Index('ix_pdf_job_tipo_params_hash', 'tipo', 'params_hash'),
+    )
+
+    requested_by = db.relationship('User', backref=db.backref('pdf_jobs', cascade='all, delete-orphan'))
+    client = db.relationship('Client', backref=db.backref('pdf_jobs', cascade='all, delete-orphan'))
@@ -0,0 +1,14 @@
+from app import app
+from services.notification_service import NotificationService
+
+def main():
+    """
+    Recalcula la tabla unread_message_counter desde case_message.
+    Ejecutar una vez después de 'flask db upgrade' o si los contadores se desincronizan.
+    """
+    with app.app_context():
+        processed = NotificationService.rebuild_all()
+        print(f"Contadores recalculados para {processed} clientes con mensajes no leídos.")
+
+if __name__ == '__main__':
+    main()
@@ -6,11 +6,20 @@ from services.user_service import UserService
 from services.client_service import ClientService
 from services.document_service import DocumentService
 from services.financial_service import FinancialService
+from services.notification_service import NotificationService
+from services.report_cache import ReportCache
 from utils.decorators import role_required
+from utils.zip_stream import zip_response
+from sqlalchemy.orm import load_only
+from werkzeug.utils import secure_filename
+from datetime import datetime
 
 
 admin_bp = Blueprint('admin', __name__)
 
+# Máximo de clientes por descarga masiva de documentos
+BULK_ZIP_MAX_CLIENTS = 50
+
 @admin_bp.route('/admin')
 @login_required
 @role_required(['Admin'])
@@ -19,8 +28,8 @@ def admin_dashboard():
     page = request.args.get('page', 1, type=int)
     users = User.query.paginate(page=page, per_page=20)
     all_users = User.query.filter(User.rol != 'Cliente').all()
-    all_clients = Client.query.order_by(Client.nombre).all()
-    return render_template('admin/dashboard.html', users=users, all_analysts=all_users, all_clients=all_clients)
+    # El cliente a reasignar se busca con /api/clients/lookup en lugar de listar todos
+    return render_template('admin/dashboard.html', users=users, all_analysts=all_users)
 
 
 @admin_bp.route('/admin/create_user', methods=['POST'])
@@ -75,6 +84,10 @@ def reassign_analyst():
             elif new_user.rol == 'Radicador':
                 field_to_update = Client.radicador_id
 
+            affected_client_ids = [row.id for row in db.session.query(Client.id).filter(
+                (Client.analista_id == old_analyst_id) | (Client.abogado_id == old_analyst_id) | (Client.radicador_id == old_analyst_id)
+            )]
+
             # Actualizamos cualquier rol que tuviera el usuario anterior hacia el nuevo en su respectivo campo
             clients_updated_1 = Client.query.filter_by(analista_id=old_analyst_id).update({field_to_update: new_analyst_id})
             clients_updated_2 = Client.query.filter_by(abogado_id=old_analyst_id).update({field_to_update: new_analyst_id})
@@ -90,6 +103,7 @@ def reassign_analyst():
             # 5. Interacciones
             interactions_updated = Interaction.query.filter_by(usuario_id=old_analyst_id).update({Interaction.usuario_id: new_analyst_id})
 
+            NotificationService.refresh_clients(affected_client_ids)
             db.session.commit()
             
             total_ops = clients_updated + docs_updated + notes_updated + msgs_updated + interactions_updated
@@ -139,6 +153,7 @@ def reassign_analyst():
                 CaseMessage.query.filter_by(client_id=client_id, sender_id=old_analyst_id).update({CaseMessage.sender_id: new_analyst_id})
                 Interaction.query.filter_by(cliente_id=client_id, usuario_id=old_analyst_id).update({Interaction.usuario_id: new_analyst_id})
 
+            NotificationService.refresh_client(client.id)
             db.session.commit()
             flash(f'Cliente "{client.nombre}" reasignado exitosamente.', 'success')
 
@@ -242,6 +257,40 @@ def delete_document(doc_id):
         
     return redirect(request.referrer or url_for('main.index'))
 
+@admin_bp.route('/admin/clients/documents.zip')
+@login_required
+@role_required(['Admin'])
+def download_clients_documents_zip():
+    client_ids = request.args.getlist('client_ids', type=int)[:BULK_ZIP_MAX_CLIENTS]
+    if not client_ids:
+        flash('Seleccione al menos un cliente.', 'warning')
+        return redirect(url_for('admin.admin_dashboard'))
+
+    clients = Client.query.options(load_only(Client.id, Client.nombre)).filter(Client.id.in_(client_ids)).all()
+    documents = Document.query.filter(Document.client_id.in_(client_ids)).order_by(
+        Document.client_id, Document.created_at.desc()
+    ).all()
+
+    # Una carpeta por cliente dentro del ZIP
+    by_client = {}
+    for doc in documents:
+        by_client.setdefault(doc.client_id, []).append(doc)
+    entries = []
+    for client in clients:
+        folder = secure_filename(f"{client.id}_{client.nombre}") or str(client.id)
+        entries.extend(DocumentService.zip_entries(by_client.get(client.id, []), folder=folder))
+
+    return zip_response(entries, f"Documentos_{len(clients)}_clientes_{datetime.now():%Y%m%d}.zip")
+
+@admin_bp.route('/admin/report-cache/purge', methods=['POST'])
+@login_required
+@role_required(['Admin'])
+def purge_report_cache():
+    removed = ReportCache.purge()
+    megabytes = removed['bytes'] / (1024 * 1024)
+    flash(f"Caché de reportes vaciada: {removed['files']} archivos ({megabytes:.1f} MB).", 'success')
+    return redirect(request.referrer or url_for('admin.admin_dashboard'))
+
 @admin_bp.route('/admin/delete_obligation/<int:obligation_id>', methods=['POST'])
 @login_required
 @role_required(['Admin', 'Abogado'])
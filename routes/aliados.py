@@ -1,12 +1,17 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_from_directory
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required, current_user
 from models import db, User, Client, AllyPayment
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 import os
-from sqlalchemy import func
 from utils.decorators import role_required
+from utils.pagination import KeysetPaginator
+from utils.date_filters import apply_date_range
+from utils.file_delivery import send_upload
 from services.client_service import ClientService
 from services.payment_service import PaymentService
+from services.notification_service import NotificationService
+from services.client_search import ClientSearch
 
 
 from datetime import datetime, date
@@ -23,23 +28,25 @@ def aliados_dashboard():
     nombre = request.args.get('nombre')
     analista = request.args.get('analista')
     fecha = request.args.get('fecha')
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
 
-    query = Client.query
+    query = ClientService.list_query()
 
     if current_user.rol == 'Aliado':
         query = query.filter(Client.analista_id == current_user.id)
     
     if nombre:
-        query = query.filter(Client.nombre.ilike(f'%{nombre}%'))
+        query = ClientSearch.apply(query, nombre, ('nombre',))
     
     if analista: # This filter might be redundant for Aliado if they can only see theirs, but kept for Admin
         query = query.join(Client.analista).filter(User.nombre_completo.ilike(f'%{analista}%'))
     
-    if fecha:
-        query = query.filter(func.date(Client.created_at) == fecha)
+    if fecha or desde or hasta:
+        query = apply_date_range(query, Client.created_at, fecha=fecha, desde=desde, hasta=hasta)
     
-    page = request.args.get('page', 1, type=int)
-    clients = query.order_by(Client.created_at.desc()).paginate(page=page, per_page=20)
+    clients = KeysetPaginator.paginate(query, Client.created_at, Client.id, cursor=request.args.get('cursor'))
+    clients.items = ClientService.to_rows(clients.items)
 
     
     return render_template('aliados/dashboard.html', 
@@ -80,6 +87,7 @@ def send_to_lawyer(client_id):
         
     client.estado = 'Pendiente_Analisis'
     client.abogado_id = lawyer.id
+    NotificationService.refresh_client(client.id)
     db.session.commit()
     
     # Simulation of email notification
@@ -139,4 +147,4 @@ def download_pago(filename):
          return redirect(url_for('aliados.mis_pagos'))
 
     upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'pagos_aliados')
-    return send_from_directory(upload_folder, filename)
+    return send_upload(safe_join(upload_folder, filename))
@@ -1,8 +1,11 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from models import db, User, Client
-from sqlalchemy import func, or_
+from sqlalchemy import func
 from utils.decorators import role_required
+from utils.pagination import KeysetPaginator
+from utils.date_filters import apply_date_range
+from services.client_search import ClientSearch
 
 
 analyst_bp = Blueprint('analyst', __name__)
@@ -31,12 +34,10 @@ def analyst_dashboard():
     # but based on previous logs 'Con_Analisis' seems to be the key.
     
     # Calculate Progress: Clients belonging to current user, created this month, in advanced state
-    progreso = Client.query.filter(
-        Client.analista_id == current_user.id,
-        Client.created_at >= first_date,
-        Client.created_at <= last_date,
-        Client.estado.in_(approved_states)
-    ).count()
+    progreso = apply_date_range(
+        db.session.query(func.count(Client.id)).filter(Client.analista_id == current_user.id, Client.estado.in_(approved_states)),
+        Client.created_at, desde=first_date, hasta=last_date
+    ).scalar()
     
     meta = 64
     porcentaje = min((progreso / meta) * 100, 100) if meta > 0 else 0
@@ -44,30 +45,25 @@ def analyst_dashboard():
     nombre = request.args.get('nombre')
     status = request.args.get('status')
     fecha = request.args.get('fecha')
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
 
-    query = Client.query
+    query = ClientService.list_query()
 
     if current_user.rol == 'Analista':
         query = query.filter(Client.analista_id == current_user.id)
 
     if nombre:
-        search_term = f'%{nombre}%'
-        query = query.filter(
-            or_(
-                Client.nombre.ilike(search_term),
-                Client.telefono.ilike(search_term),
-                Client.numero_id.ilike(search_term)
-            )
-        )
+        query = ClientSearch.apply(query, nombre, ('nombre', 'telefono', 'numero_id'))
     
     if status:
         query = query.filter(Client.estado == status)
     
-    if fecha:
-        query = query.filter(func.date(Client.created_at) == fecha)
+    if fecha or desde or hasta:
+        query = apply_date_range(query, Client.created_at, fecha=fecha, desde=desde, hasta=hasta)
     
-    page = request.args.get('page', 1, type=int)
-    clients = query.order_by(Client.created_at.desc()).paginate(page=page, per_page=20)
+    clients = KeysetPaginator.paginate(query, Client.created_at, Client.id, cursor=request.args.get('cursor'))
+    clients.items = ClientService.to_rows(clients.items)
 
         
     return render_template('analyst/dashboard.html', 
@@ -77,6 +73,7 @@ def analyst_dashboard():
                            porcentaje=porcentaje)
 
 from services.client_service import ClientService
+from services.notification_service import NotificationService
 
 @analyst_bp.route('/analyst/new_client', methods=['GET', 'POST'])
 @login_required
@@ -122,6 +119,7 @@ def send_to_lawyer(client_id):
         
     client.estado = 'Pendiente_Analisis'
     client.abogado_id = lawyer.id
+    NotificationService.refresh_client(client.id)
     db.session.commit()
     
     # Simulation of email notification
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash, generate_password_hash
 from models import db, User
+from services.user_service import UserService
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -59,8 +60,12 @@ def change_password():
         elif new_password != confirm_password:
             flash('Las nuevas contraseñas no coinciden.', 'warning')
         else:
-            current_user.password = generate_password_hash(new_password)
-            db.session.commit()
+            # current_user es un proxy cacheado: el cambio se guarda vía UserService
+            try:
+                UserService.change_password(current_user.id, new_password)
+            except ValueError as e:
+                flash(str(e), 'warning')
+                return redirect(request.referrer or url_for('main.index'))
             flash('Contraseña actualizada exitosamente.', 'success')
             
             # Redirect based on role
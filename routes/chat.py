@@ -1,6 +1,8 @@
 from flask import Blueprint, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from models import db, CaseMessage, Client, User
+from services.notification_service import NotificationService
+from services.chat_service import ChatService, DEFAULT_PAGE_SIZE
 from datetime import datetime
 
 chat_bp = Blueprint('chat', __name__)
@@ -46,6 +48,7 @@ def send_message(client_id):
         )
         
         db.session.add(new_message)
+        NotificationService.register_message(new_message)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -68,23 +71,24 @@ def get_messages(client_id):
     else:
         return {'error': 'Rol no autorizado'}, 403
 
-    messages = CaseMessage.query.filter_by(client_id=client.id).order_by(CaseMessage.timestamp.asc()).all()
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+
+    messages, has_more = ChatService.get_messages_page(client.id, after_id=after_id, before_id=before_id, limit=limit)
+    messages_data = [ChatService.serialize_message(msg, current_user.id) for msg in messages]
+
+    # Cursor reutilizable por el widget: after_id para el siguiente poll, before_id para cargar historial
+    cursor = {
+        'after_id': messages[-1].id if messages else after_id,
+        'before_id': messages[0].id if messages else before_id,
+        'has_more': has_more
+    }
     
     # Mark as read (only if mark_read is not explicitly false)
     mark_read_param = request.args.get('mark_read', 'true').lower()
     
     if mark_read_param != 'false':
-        unread_msgs = [m for m in messages if m.sender_id != current_user.id and not m.is_read_by_recipient]
-        if unread_msgs:
-            for msg in unread_msgs:
-                msg.is_read_by_recipient = True
-            db.session.commit()
-
-    messages_data = [{
-        'is_me': msg.sender_id == current_user.id,
-        'sender_name': 'Yo' if msg.sender_id == current_user.id else msg.sender.nombre_completo,
-        'content': msg.content,
-        'timestamp': msg.timestamp.strftime('%d/%m %H:%M')
-    } for msg in messages]
+        ChatService.mark_as_read(client.id, current_user.id)
 
-    return {'messages': messages_data}
+    return {'messages': messages_data, 'cursor': cursor}
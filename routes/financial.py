@@ -1,11 +1,12 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, send_file
+from flask import Blueprint, render_template, request, flash, redirect, url_for
 from flask_login import current_user, login_required
 from services.financial_service import FinancialService
-from services.pdf_service import PDFService
+from services.report_cache import ReportCache
+from services.pdf_job_service import PdfJobService, BALANCE_GENERAL, DONE
 from models import PaymentDiagnosis, ContractInstallment, AdministrativeExpense, Expense, db
 from utils.decorators import role_required
+from utils.file_delivery import send_upload
 from datetime import datetime
-import hashlib
 import os
 
 financial_bp = Blueprint('financial', __name__)
@@ -77,60 +78,21 @@ def download_balance_pdf():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
 
-    # Hash params for caching
-    params_str = f"{start_date}_{end_date}"
-    params_hash = hashlib.md5(params_str.encode()).hexdigest()
+    # Clave de caché: rango de fechas y versión de los datos de sus meses
+    start_date, end_date = FinancialService.resolve_period(start_date, end_date)
+    cache_key = ReportCache.range_key(start_date, end_date)
 
-    # Check Cache
-    cached_pdf = PDFService.get_cached_report('balance_general', params_hash)
+    cached_pdf = ReportCache.get(BALANCE_GENERAL, cache_key)
     if cached_pdf:
-        return send_file(cached_pdf, as_attachment=True, download_name=f'Balance_General_{datetime.now().date()}.pdf', mimetype='application/pdf')
-
-    # Get Data
-    data = FinancialService.get_balance_general(start_date, end_date)
-    
-    # Execute queries for PDF (Lists, not query objects)
-    expenses_list = [] # Expenses are now separated
-
-    recent_diagnoses = data['q_recent_diag'].order_by(PaymentDiagnosis.fecha_pago.desc()).limit(20).all()
-    recent_installments = data['q_recent_inst'].order_by(ContractInstallment.fecha_vencimiento.desc()).limit(20).all()
-
-    # Context for PDF
-    context = {
-        'total_ingresos': data.get('total_ingresos', 0),
-        'costo_negocio': data.get('costo_negocio', 0),
-        'utilidad_neta': data.get('utilidad_neta', 0),
-        'costos_totales': data['costos_totales'],
-        'ventas_totales': data['ventas_totales'],
-        'ventas_diagnosticos': data.get('ventas_diagnosticos', 0),
-        'ventas_contratos': data.get('ventas_contratos', 0),
-        'costos_directos': data.get('costos_directos', 0),
-        'costos_indirectos': data.get('costos_indirectos', 0),
-        'gastos_administrativos': data['gastos_administrativos'],
-        'utilidad_bruta': data['ventas_totales'] - (data['costos_totales'] + data['gastos_administrativos']),
-        'total_iva': data.get('total_iva', 0),
-        'total_retefuente': data.get('total_retefuente', 0),
-        'total_ica': data.get('total_ica', 0),
-        'impuestos_clientes': data['impuestos_clientes'],
-        'utilidad_neta': data['ventas_totales'] - (data['costos_totales'] + data['gastos_administrativos']) - data['impuestos_clientes'],
-        'expenses': expenses_list,
-        'recent_diagnoses': recent_diagnoses,
-        'recent_installments': recent_installments,
-        'start_date': data['start_date_used'],
-        'end_date': data['end_date_used'],
-        'generation_date': datetime.now().strftime('%Y-%m-%d %H:%M')
-    }
-
-    try:
-        pdf_buffer = PDFService.generate_pdf('balance_pdf.html', context)
-        # Save to cache
-        PDFService.save_pdf_to_cache('balance_general', params_hash, pdf_buffer)
-        
-        pdf_buffer.seek(0)
-        return send_file(pdf_buffer, as_attachment=True, download_name=f'Balance_General_{datetime.now().date()}.pdf', mimetype='application/pdf')
-    except Exception as e:
-        flash(f"Error al generar el reporte: {str(e)}", "danger")
-        return redirect(url_for('financial.balance_general'))
+        return send_upload(cached_pdf, as_attachment=True, download_name=f'Balance_General_{datetime.now().date()}.pdf', mimetype='application/pdf')
+
+    # Sin caché: lo genera el worker y la página de espera inicia la descarga
+    job = PdfJobService.enqueue(BALANCE_GENERAL, {'start_date': start_date, 'end_date': end_date},
+                                current_user.id, params_hash=cache_key)
+    if job.estado == DONE:
+        # PDF_JOBS_INLINE: ya se generó dentro de esta petición
+        return redirect(url_for('pdf_jobs.download', job_id=job.id))
+    return redirect(url_for('pdf_jobs.wait', job_id=job.id))
 
 @financial_bp.route('/gastos', methods=['GET', 'POST'])
 @login_required
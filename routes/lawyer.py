@@ -1,14 +1,16 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from models import db, User, Client
-from sqlalchemy import func
-from sqlalchemy.orm import joinedload
 from utils.decorators import role_required
+from utils.pagination import KeysetPaginator
+from utils.date_filters import apply_date_range
 from utils.time_utils import get_colombia_now
+from services.client_search import ClientSearch
 from datetime import datetime
 
 
 from services.payment_service import PaymentService
+from services.client_service import ClientService
 from models import Interaction
 
 lawyer_bp = Blueprint('lawyer', __name__)
@@ -19,10 +21,7 @@ lawyer_bp = Blueprint('lawyer', __name__)
 def lawyer_dashboard():
 
     
-    query = Client.query.options(
-        joinedload(Client.analista),
-        joinedload(Client.abogado)
-    ).filter(
+    query = ClientService.list_query().filter(
         Client.estado.in_(['Pendiente_Analisis', 'Con_Analisis', 'Con_Contrato', 'Radicado', 'Finalizado', 'Finalizado_Proceso_Credito'])
     )
 
@@ -34,20 +33,20 @@ def lawyer_dashboard():
     nombre = request.args.get('nombre')
     analista = request.args.get('analista')
     fecha = request.args.get('fecha')
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
 
     if nombre:
-        query = query.filter((Client.nombre.ilike(f'%{nombre}%')) | (Client.numero_id.ilike(f'%{nombre}%')))
+        query = ClientSearch.apply(query, nombre, ('nombre', 'numero_id'))
     
     if analista:
         query = query.join(Client.analista).filter(User.nombre_completo.ilike(f'%{analista}%'))
     
-    if fecha:
-        # Cast created_at to date for comparison
-        query = query.filter(func.date(Client.created_at) == fecha)
+    if fecha or desde or hasta:
+        query = apply_date_range(query, Client.created_at, fecha=fecha, desde=desde, hasta=hasta)
 
-    page = request.args.get('page', 1, type=int)
-    page = request.args.get('page', 1, type=int)
-    clients = query.paginate(page=page, per_page=20)
+    clients = KeysetPaginator.paginate(query, Client.created_at, Client.id, cursor=request.args.get('cursor'))
+    clients.items = ClientService.to_rows(clients.items)
     
     # Fetch upcoming appointments
     upcoming_appointments = []
@@ -1,19 +1,30 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, send_from_directory, current_app, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, Response, stream_with_context, abort, make_response
 from flask_login import login_required, logout_user, current_user
-from models import db, Client, CaseMessage, ClientNote, ContractInstallment, Document, User, ClientStatus, Negotiation, FinancialObligation
+from models import db, Client, CaseMessage, ClientNote, ContractInstallment, Document, User, ClientStatus, Negotiation, FinancialObligation, PdfJob
 from services.financial_service import FinancialService
 from services.document_service import DocumentService
-from services.client_service import ClientService
-from services.payment_service import PaymentService
+from services.client_service import ClientService, DETAIL_PANELS
+from services.notification_service import NotificationService
+from services.pdf_job_service import PdfJobService, COMPROBANTE, COMPROBANTES_LOTE
+from services.chat_service import ChatService
+from services.user_service import UserService
+from services.client_search import ClientSearch, LOOKUP_LIMIT
 from utils.decorators import role_required
 from utils.time_utils import get_colombia_now
+from utils.zip_stream import zip_response
 from datetime import datetime
+import hashlib
 import os
+import json
+import time
 from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
 
 main_bp = Blueprint('main', __name__)
 
+# Roles que ven la bitácora (Historial de Gestión) de la ficha
+NOTES_ROLES = ['Analista', 'Abogado', 'Admin', 'Aliado', 'Radicador', 'Negociador']
+
 @main_bp.route('/')
 def index():
     if current_user.is_authenticated:
@@ -31,91 +42,92 @@ def index():
             return redirect(url_for('main.client_portal'))
     return redirect(url_for('auth.login'))
 
-@main_bp.route('/client/<int:client_id>')
-@login_required
-def client_detail(client_id):
-    client = Client.query.get_or_404(client_id)
-
-    # Permission Checks
+def _client_access_denied(client):
+    """
+    Returns (message, dashboard endpoint) if the current user may not open the client's file, else None.
+    """
     if current_user.rol == 'Aliado' and client.analista_id != current_user.id:
-        flash('No tienes permiso para acceder a este cliente.', 'danger')
-        return redirect(url_for('aliados.aliados_dashboard'))
+        return 'No tienes permiso para acceder a este cliente.', 'aliados.aliados_dashboard'
     
     if current_user.rol == 'Abogado' and client.abogado_id != current_user.id:
-        flash('No tienes permiso para ver este expediente.', 'danger')
-        return redirect(url_for('lawyer.lawyer_dashboard'))
+        return 'No tienes permiso para ver este expediente.', 'lawyer.lawyer_dashboard'
     
     if current_user.rol == 'Analista' and client.analista_id != current_user.id:
-        flash('No tienes permiso para ver este expediente.', 'danger')
-        return redirect(url_for('analyst.analyst_dashboard'))
+        return 'No tienes permiso para ver este expediente.', 'analyst.analyst_dashboard'
 
     if current_user.rol == 'Radicador' and client.radicador_id != current_user.id:
-        flash('No tienes permiso para ver este expediente.', 'danger')
-        return redirect(url_for('radicador.dashboard'))
+        return 'No tienes permiso para ver este expediente.', 'radicador.dashboard'
 
     if current_user.rol == 'Negociador' and client.negociador_id != current_user.id:
         # Also check if this negociador has any negotiation on this client
         has_negotiation = Negotiation.query.join(FinancialObligation).filter(
-            FinancialObligation.client_id == client_id,
+            FinancialObligation.client_id == client.id,
             Negotiation.negociador_id == current_user.id
         ).first()
         if not has_negotiation:
-            flash('No tienes permiso para ver este expediente.', 'danger')
-            return redirect(url_for('negociador.dashboard'))
-    
-    # Mark messages as read if Abogado is viewing
-    if current_user.rol == 'Abogado' and client.abogado_id == current_user.id:
-        unread_msgs = CaseMessage.query.filter_by(client_id=client.id, is_read_by_recipient=False).all()
-        for msg in unread_msgs:
-            if msg.sender_id != current_user.id:
-                msg.is_read_by_recipient = True
-            db.session.commit()
-
-    # Check for arrears automatically
-    PaymentService.check_and_update_arrears(client.id)
+            return 'No tienes permiso para ver este expediente.', 'negociador.dashboard'
+    return None
+
+def _document_access_denied(doc):
+    """
+    True if the current user may not download the document: no access to its client, or
+    the document is hidden from the user's role.
+    """
+    if _client_access_denied(doc.client):
+        return True
+    if current_user.rol == 'Cliente':
+        return doc.client.login_user_id != current_user.id or not doc.visible_para_cliente
+    if current_user.rol in ['Analista', 'Aliado']:
+        return not doc.visible_para_analista
+    return False
 
-    # Fetch chat history
-    messages = CaseMessage.query.filter_by(client_id=client.id).order_by(CaseMessage.timestamp.asc()).all()
+@main_bp.route('/client/<int:client_id>')
+@login_required
+def client_detail(client_id):
+    # Carga la ficha (relaciones y colecciones de la pestaña financiera) en un número fijo de consultas
+    client = ClientService.get_detail(client_id)
 
-    # PERFORMANCE FIX: Use DB instead of os.listdir
-    # This replaces the IO blocking loop
-    documents = DocumentService.get_client_documents(client_id, current_user.rol)
+    # Permission Checks
+    denied = _client_access_denied(client)
+    if denied:
+        flash(denied[0], 'danger')
+        return redirect(url_for(denied[1]))
     
-    # For compatibility with template, we pass 'files' as empty or just use documents
-    # The template likely iterates 'files' for the raw list. We should check the template.
-    # Assuming we update template or 'documents' is what matters.
-    # Based on previous code: 'files' was used to list files in folder. 'documents' was from DB.
-    # Now we only support DB documents. We will pass empty files list to avoid errors if template uses it,
-    # but the User should update template to rely on 'documents'. 
-    # Actually, the user asked to FIX it. 
-    # Ideally we should verify if 'files' is used in template. 
-    # Looking at previous read of main.py, it passed 'files' AND 'documents'.
-    # I will pass 'files' as a list of filenames from 'documents' to maintain compatibility if template uses "files" for something specific,
-    # but the reliable source is 'documents'.
-    files = [doc.filename for doc in documents]
-            
-    # Fetch Notes
-    notes = ClientNote.query.filter_by(client_id=client_id).order_by(ClientNote.timestamp.desc()).all()
+    # Las cuotas vencidas se marcan En Mora con 'flask sweep-arrears' (cron o scheduler), no al abrir la ficha
 
-    radicadores = []
-    negociadores = []
-    all_users = []
-    if current_user.rol in ['Abogado', 'Admin']:
-        radicadores = User.query.filter_by(rol='Radicador').all()
-        negociadores = User.query.filter_by(rol='Negociador').all()
-        all_users = User.query.filter(User.rol != 'Cliente').all()
+    # Mark messages as read if Abogado is viewing
+    if current_user.rol == 'Abogado' and client.abogado_id == current_user.id:
+        # Un commit expira los objetos cargados: se vuelve a cargar la ficha completa de una vez
+        if ChatService.mark_as_read(client.id, current_user.id):
+            client = ClientService.get_detail(client_id)
 
-    # Verify if Prospect needs to complete info
-    completion_required = False
-    if client.estado == ClientStatus.PROSPECTO and client.payment_diagnosis and client.payment_diagnosis.verificado:
-        completion_required = True
+    # Mensajes, documentos, negociaciones y bitácora se piden aparte al abrir cada pestaña
+    context = ClientService.get_detail_context(client, current_user)
+    return render_template('client_detail.html', **context)
 
-    # Get negotiations for this client
-    client_negotiations = Negotiation.query.join(FinancialObligation).filter(
-        FinancialObligation.client_id == client_id
-    ).order_by(Negotiation.created_at.desc()).all()
+@main_bp.route('/client/<int:client_id>/panel/<panel>')
+@login_required
+def client_panel(client_id, panel):
+    """
+    HTML fragment of one client_detail tab. The ETag is a hash of the rendered fragment, so the
+    browser revalidates on every visit and gets an empty 304 while the panel has not changed.
+    """
+    if panel not in DETAIL_PANELS:
+        abort(404)
 
-    return render_template('client_detail.html', client=client, files=files, documents=documents, messages=messages, notes=notes, radicadores=radicadores, negociadores=negociadores, all_users=all_users, completion_required=completion_required, client_negotiations=client_negotiations)
+    client = Client.query.get_or_404(client_id)
+    if _client_access_denied(client):
+        abort(403)
+    if panel == 'notes' and current_user.rol not in NOTES_ROLES:
+        abort(403)
+
+    context = ClientService.get_panel_context(client, panel, current_user)
+    response = make_response(render_template(f'client_detail/{panel}.html', **context))
+    # Contenido por usuario: nunca en cachés compartidas y siempre revalidado con el ETag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    response.add_etag()
+    return response.make_conditional(request)
 
 @main_bp.route('/client/<int:client_id>/upload', methods=['POST'])
 @login_required
@@ -164,9 +176,29 @@ def upload_file(client_id):
 @main_bp.route('/uploads/<filename>')
 @login_required
 def download_file(filename):
-    # Security: Ensure user has access to this file? 
-    # Taking a shortcut here for now as requested strict refactor of structure, but can be improved.
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+    # Nginx entrega el archivo (X-Accel-Redirect) sin más controles: esta vista es la única barrera.
+    # Los nombres antiguos pueden repetirse entre clientes: se entrega el que el usuario puede ver
+    docs = DocumentService.get_all_by_filename(filename)
+    if not docs:
+        abort(404)
+    doc = next((doc for doc in docs if not _document_access_denied(doc)), None)
+    if doc is None:
+        abort(403)
+    return DocumentService.send_document(doc)
+
+@main_bp.route('/client/<int:client_id>/documents.zip')
+@login_required
+def download_documents_zip(client_id):
+    client = Client.query.get_or_404(client_id)
+    if _client_access_denied(client):
+        abort(403)
+    if current_user.rol == 'Cliente' and client.login_user_id != current_user.id:
+        abort(403)
+
+    # Mismas reglas de visibilidad por rol que la pestaña de documentos
+    documents = DocumentService.get_client_documents(client.id, current_user.rol)
+    entries = DocumentService.zip_entries(documents)
+    return zip_response(entries, secure_filename(f"Documentos_{client.nombre}_{client.id}.zip"))
 
 @main_bp.route('/client/<int:client_id>/update_status', methods=['POST'])
 @login_required
@@ -190,8 +222,7 @@ def profile():
         if len(new_password.strip()) < 4:
             flash('La nueva contraseña debe tener al menos 4 caracteres.', 'warning')
             return redirect(url_for('main.profile'))
-        current_user.password = generate_password_hash(new_password)
-        db.session.commit()
+        UserService.change_password(current_user.id, new_password)
         flash('Contraseña actualizada correctamente.', 'success')
 
     # Guardar avatar
@@ -218,17 +249,17 @@ def profile():
 @login_required
 @role_required(['Admin', 'Analista', 'Abogado'])
 def comprobantes_index():
-    # Obtener clientes según el rol
-    if current_user.rol == 'Admin':
-        clients = Client.query.all()
-    elif current_user.rol == 'Analista':
-        clients = Client.query.filter_by(analista_id=current_user.id).all()
-    elif current_user.rol == 'Abogado':
-        clients = Client.query.filter_by(abogado_id=current_user.id).all()
-    else:
-        clients = []
-        
-    return render_template('comprobantes/index.html', clients=clients)
+    # El selector de clientes se llena bajo demanda desde /api/clients/lookup (filtrado por rol)
+    return render_template('comprobantes/index.html')
+
+@main_bp.route('/api/clients/lookup', methods=['GET'])
+@login_required
+@role_required(['Admin', 'Analista', 'Abogado', 'Aliado', 'Radicador', 'Negociador'])
+def lookup_clients():
+    """Typeahead de clientes: mejores coincidencias por nombre, documento o número de contrato."""
+    q = request.args.get('q', '')
+    limit = request.args.get('limit', LOOKUP_LIMIT, type=int)
+    return jsonify({'results': ClientSearch.lookup(current_user, q, limit)})
 
 @main_bp.route('/api/comprobantes/client/<int:client_id>', methods=['GET'])
 @login_required
@@ -287,23 +318,13 @@ def generar_comprobante():
         flash('Acceso denegado a este cliente.', 'danger')
         return redirect(url_for('main.comprobantes_index'))
 
-    context = {
-        'client': client,
-        'generation_date': datetime.now().strftime('%Y-%m-%d %H:%M'),
-        'company_name': 'MC Innovación Financiera S.A.S',
-        'generated_by': current_user.nombre_completo,
-        'tipo': tipo
-    }
-
     if tipo == 'analisis':
         if not client.payment_diagnosis:
             flash('El cliente no tiene un pago de análisis registrado.', 'warning')
             return redirect(url_for('main.comprobantes_index'))
-        context['concepto'] = 'Pago de Análisis'
-        context['valor'] = client.payment_diagnosis.valor
-        context['fecha_pago'] = client.payment_diagnosis.fecha_pago
-        context['metodo_pago'] = client.payment_diagnosis.metodo_pago
-        
+        valor = client.payment_diagnosis.valor
+        installment_id = None
+
     elif tipo == 'cuota':
         installment_id = request.form.get('installment_id')
         if not installment_id:
@@ -314,74 +335,60 @@ def generar_comprobante():
         if inst.payment_contract.client_id != client.id:
             flash('La cuota no pertenece a este cliente.', 'danger')
             return redirect(url_for('main.comprobantes_index'))
-            
-        # Update status to 'Pagada' automatically
-        inst.estado = 'Pagada'
-        
-        context['concepto'] = inst.concepto or f"Cuota {inst.numero_cuota}"
-        context['valor'] = inst.valor
-        context['fecha_pago'] = inst.fecha_vencimiento
-        context['metodo_pago'] = inst.metodo_pago
+        valor = inst.valor
+        installment_id = inst.id
 
     else:
         flash('Tipo de comprobante inválido.', 'danger')
         return redirect(url_for('main.comprobantes_index'))
 
-    # Calculate IVA if client is responsible
-    if client.es_responsable_iva:
-        valor_float = float(context['valor'])
-        context['base_imponible'] = valor_float / 1.19
-        context['iva_amount'] = valor_float - context['base_imponible']
-    else:
-        context['base_imponible'] = float(context['valor'])
-        context['iva_amount'] = 0
+    # El PDF lo genera el worker; la cuota se marca Pagada cuando el comprobante queda guardado.
+    # Un doble envío o un reintento del navegador reutiliza el trabajo pendiente del mismo pago
+    job = PdfJobService.enqueue(COMPROBANTE, {
+        'tipo': tipo,
+        'installment_id': installment_id,
+        'valor': float(valor or 0),
+        'generated_by': current_user.nombre_completo,
+        'generation_date': datetime.now().strftime('%Y-%m-%d %H:%M'),
+    }, current_user.id, client_id=client.id,
+       params_hash=hashlib.md5(f"{client.id}_{tipo}_{installment_id}".encode()).hexdigest())
+    return redirect(url_for('main.ver_comprobante', job_id=job.id))
 
-    # Generar PDF
-    from services.pdf_service import PDFService
-    import uuid
-    import os
-    from flask import current_app, send_file
-    from models import db, Document
+@main_bp.route('/comprobantes/lote', methods=['POST'])
+@login_required
+@role_required(['Admin'])
+def generar_comprobantes_lote():
+    # Sin fechas: mes actual, igual que los reportes financieros
+    start_date, end_date = FinancialService.resolve_period(request.form.get('start_date'), request.form.get('end_date'))
+    if start_date > end_date:
+        flash('La fecha inicial no puede ser posterior a la final.', 'warning')
+        return redirect(url_for('main.comprobantes_index'))
 
-    try:
-        pdf_buffer = PDFService.generate_pdf('comprobantes/receipt_pdf.html', context)
-        
-        # Guardar en sistema de archivos y DB
-        prefix = 'Comprobante_Analisis' if tipo == 'analisis' else 'Comprobante_Contrato'
-        filename = f"{prefix}_{client.numero_id}_{uuid.uuid4().hex[:8]}.pdf"
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-            
-        pdf_path = os.path.join(upload_folder, filename)
-        
-        # Rewind buffer to start and write to file
-        pdf_buffer.seek(0)
-        with open(pdf_path, 'wb') as f:
-            f.write(pdf_buffer.read())
-            
-        # Crear registro en Documentos
-        new_doc = Document()
-        new_doc.filename = filename
-        new_doc.client_id = client.id
-        new_doc.uploaded_by_id = current_user.id
-        new_doc.visible_para_analista = True
-        new_doc.visible_para_cliente = True
-        
-        db.session.add(new_doc)
-        db.session.commit()
+    job = PdfJobService.enqueue(COMPROBANTES_LOTE, {
+        'start_date': start_date,
+        'end_date': end_date,
+        'generated_by': current_user.nombre_completo,
+    }, current_user.id, params_hash=hashlib.md5(f"{start_date}_{end_date}".encode()).hexdigest())
+    return redirect(url_for('pdf_jobs.wait', job_id=job.id))
 
-        # Retornar vista con el PDF y opciones de compartir
-        return render_template('comprobantes/view.html', 
-                               filename=filename, 
-                               client=client, 
-                               tipo=tipo, 
-                               valor=context['valor'])
-        
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error al generar comprobante: {str(e)}', 'danger')
-        return redirect(url_for('main.comprobantes_index'))
+@main_bp.route('/comprobantes/<int:job_id>')
+@login_required
+@role_required(['Admin', 'Analista', 'Abogado'])
+def ver_comprobante(job_id):
+    job = db.session.get(PdfJob, job_id)
+    if job is None or job.tipo != COMPROBANTE:
+        abort(404)
+    if not PdfJobService.can_access(job, current_user):
+        abort(403)
+
+    params = json.loads(job.params)
+    # Vista con el PDF y opciones de compartir (o la espera mientras se genera)
+    return render_template('comprobantes/view.html',
+                           job=job,
+                           filename=job.result_filename,
+                           client=job.client,
+                           tipo=params['tipo'],
+                           valor=params['valor'])
 
 @main_bp.route('/document/<int:doc_id>/toggle_analyst_visibility', methods=['POST'])
 @login_required
@@ -541,13 +548,9 @@ def client_portal():
         return redirect(url_for('auth.login'))
 
     # Mark messages as read
-    unread_msgs = CaseMessage.query.filter_by(client_id=client.id, is_read_by_recipient=False).all()
-    for msg in unread_msgs:
-        if msg.sender_id != current_user.id:
-            msg.is_read_by_recipient = True
-    db.session.commit()
+    ChatService.mark_as_read(client.id, current_user.id)
 
-    messages = CaseMessage.query.filter_by(client_id=client.id).order_by(CaseMessage.timestamp.asc()).all()
+    messages, has_more_messages = ChatService.get_messages_page(client.id)
         
     contract = client.payment_contract
     total_pagado = 0
@@ -561,7 +564,7 @@ def client_portal():
     # Use Service for documents
     documents = DocumentService.get_client_documents(client.id, 'Cliente')
 
-    return render_template('client_dashboard.html', client=client, contract=contract, total_pagado=total_pagado, progress_percentage=progress_percentage, documents=documents, messages=messages)
+    return render_template('client_dashboard.html', client=client, contract=contract, total_pagado=total_pagado, progress_percentage=progress_percentage, documents=documents, messages=messages, has_more_messages=has_more_messages)
 
 @main_bp.route('/client/<int:client_id>/assign_radicador', methods=['POST'])
 @login_required
@@ -572,6 +575,7 @@ def assign_radicador(client_id):
     
     if radicador_id:
         client.radicador_id = radicador_id
+        NotificationService.refresh_client(client.id)
         db.session.commit()
         flash('Radicador asignado exitosamente', 'success')
     
@@ -617,6 +621,7 @@ def reassign_user(client_id):
             from models import Interaction
             Interaction.query.filter_by(cliente_id=client_id, usuario_id=old_user_id).update({Interaction.usuario_id: new_user_id})
 
+        NotificationService.refresh_client(client.id)
         db.session.commit()
         flash('El usuario fue reasignado exitosamente y sus registros fueron transferidos.', 'success')
             
@@ -662,71 +667,46 @@ def respond_negotiation(negotiation_id):
 @main_bp.route('/api/notifications/unread')
 @login_required
 def get_unread_notifications():
-    if not current_user.is_authenticated:
-        return jsonify({'count': 0, 'notifications': [], 'grouped': {}})
-        
-    notifications_list = []
-    grouped = {}
-    
-    if current_user.rol == 'Cliente':
-        user_client = Client.query.filter_by(login_user_id=current_user.id).first()
-        if user_client:
-            unread_msgs = CaseMessage.query.filter(
-                CaseMessage.client_id == user_client.id,
-                CaseMessage.sender_id != current_user.id,
-                CaseMessage.is_read_by_recipient == False
-            ).order_by(CaseMessage.timestamp.desc()).limit(50).all()
-            
-            for msg in unread_msgs:
-                notifications_list.append({
-                    'id': msg.id,
-                    'sender': 'Mi Abogado',
-                    'message': msg.content[:50] + ('...' if len(msg.content) > 50 else ''),
-                    'client_id': user_client.id,
-                    'url': url_for('main.client_portal')
-                })
-            
-            if unread_msgs:
-                grouped[str(user_client.id)] = {
-                    'name': 'Mi Abogado',
-                    'count': len(unread_msgs),
-                    'url': url_for('main.client_portal')
-                }
-            
-    elif current_user.rol in ['Admin', 'Analista', 'Abogado', 'Radicador', 'Negociador', 'Aliado']:
-        from sqlalchemy import or_
-        query = CaseMessage.query.filter(
-            CaseMessage.sender_id != current_user.id,
-            CaseMessage.is_read_by_recipient == False
-        )
-        if current_user.rol != 'Admin':
-            query = query.join(Client).filter(
-                or_(
-                    Client.analista_id == current_user.id,
-                    Client.abogado_id == current_user.id,
-                    Client.radicador_id == current_user.id,
-                    Client.negociador_id == current_user.id
-                )
-            )
-            
-        unread_msgs = query.order_by(CaseMessage.timestamp.desc()).limit(50).all()
-        for msg in unread_msgs:
-            sender_name = msg.client.nombre if msg.client else "Cliente Desconocido"
-            notifications_list.append({
-                'id': msg.id,
-                'sender': sender_name,
-                'message': msg.content[:50] + ('...' if len(msg.content) > 50 else ''),
-                'client_id': msg.client_id,
-                'url': url_for('main.client_detail', client_id=msg.client_id)
-            })
-            
-            c_id = str(msg.client_id)
-            if c_id not in grouped:
-                grouped[c_id] = {
-                    'name': sender_name,
-                    'count': 0,
-                    'url': url_for('main.client_detail', client_id=msg.client_id)
-                }
-            grouped[c_id]['count'] += 1
-
-    return jsonify({'count': len(notifications_list), 'notifications': notifications_list, 'grouped': grouped})
+    # Endpoint JSON de respaldo para navegadores sin EventSource
+    return jsonify(NotificationService.get_unread_feed(current_user))
+
+@main_bp.route('/api/notifications/stream')
+@login_required
+def stream_notifications():
+    """Server-Sent Events: envía el feed completo al conectar y luego solo los cambios.
+
+    Cada conexión abierta ocupa un worker durante NOTIFICATIONS_STREAM_MAX_AGE segundos, así que
+    solo se activa (NOTIFICATIONS_STREAM_ENABLED) con workers asíncronos, p. ej. gunicorn -k gevent.
+    Con workers síncronos responde 204 y el navegador se queda con el polling JSON.
+    """
+    if not current_app.config.get('NOTIFICATIONS_STREAM_ENABLED'):
+        # 204: EventSource no reconecta
+        return '', 204
+
+    user = current_user._get_current_object()
+    interval = current_app.config.get('NOTIFICATIONS_STREAM_INTERVAL', 3)
+    max_age = current_app.config.get('NOTIFICATIONS_STREAM_MAX_AGE', 55)
+
+    def event_stream():
+        last_signature = None
+        last_feed = None
+        started = time.monotonic()
+        # El navegador reconecta solo al cerrar el stream; así no se retiene un worker indefinidamente
+        yield f"retry: {interval * 1000}\n\n"
+        while time.monotonic() - started < max_age:
+            # Solo la consulta de contadores en cada vuelta; el feed se arma cuando cambian
+            signature = NotificationService.get_unread_signature(user)
+            payload = None
+            if signature != last_signature:
+                feed = NotificationService.get_unread_feed(user)
+                payload = feed if last_feed is None else NotificationService.feed_delta(last_feed, feed)
+                last_signature, last_feed = signature, feed
+            yield f"data: {json.dumps(payload)}\n\n" if payload else ": ping\n\n"
+            # Liberar la conexión al pool entre consultas
+            db.session.remove()
+            time.sleep(interval)
+
+    response = Response(stream_with_context(event_stream()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -2,8 +2,9 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for
 from flask_login import login_required, current_user
 from models import db, Client, User, FinancialObligation, Negotiation
 from utils.decorators import role_required
+from utils.pagination import KeysetPaginator
 from utils.time_utils import get_colombia_now
-from sqlalchemy import or_
+from services.client_search import ClientSearch
 from sqlalchemy.orm import joinedload
 
 negociador_bp = Blueprint('negociador', __name__)
@@ -25,19 +26,16 @@ def dashboard():
         query = query.filter(Negotiation.negociador_id == current_user.id)
 
     if nombre:
-        search_term = f'%{nombre}%'
-        query = query.join(Negotiation.obligation).join(FinancialObligation.client).filter(
-            or_(
-                Client.nombre.ilike(search_term),
-                Client.numero_id.ilike(search_term)
-            )
-        )
+        query = query.join(Negotiation.obligation).join(FinancialObligation.client)
+        query = ClientSearch.apply(query, nombre, ('nombre', 'numero_id'))
     
     if estado:
         query = query.filter(Negotiation.estado == estado)
     
-    page = request.args.get('page', 1, type=int)
-    negotiations = query.order_by(Negotiation.created_at.desc()).paginate(page=page, per_page=20)
+    # El total se muestra en el encabezado; se cachea por usuario y filtros
+    count_key = ('negociador', current_user.id, nombre, estado)
+    negotiations = KeysetPaginator.paginate(query, Negotiation.created_at, Negotiation.id,
+                                            cursor=request.args.get('cursor'), count_key=count_key)
 
     return render_template('negociador/dashboard.html', negotiations=negotiations)
 
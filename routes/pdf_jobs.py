@@ -0,0 +1,67 @@
+from flask import Blueprint, render_template, jsonify, abort, redirect, url_for
+from flask_login import current_user, login_required
+from models import db, PdfJob
+from services.document_service import DocumentService
+from services.pdf_job_service import PdfJobService, COMPROBANTE, COMPROBANTES_LOTE, DONE, FAILED
+from utils.file_delivery import send_upload
+import json
+import os
+
+pdf_jobs_bp = Blueprint('pdf_jobs', __name__)
+
+def _get_job(job_id):
+    job = db.session.get(PdfJob, job_id)
+    if job is None:
+        abort(404)
+    if not PdfJobService.can_access(job, current_user):
+        abort(403)
+    return job
+
+@pdf_jobs_bp.route('/pdf-jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    job = _get_job(job_id)
+    data = {
+        'id': job.id,
+        'tipo': job.tipo,
+        'estado': job.estado,
+        'ready': job.estado == DONE,
+        'failed': job.estado == FAILED,
+        'error': job.error,
+    }
+    if job.estado == DONE:
+        data['download_url'] = url_for('pdf_jobs.download', job_id=job.id)
+    response = jsonify(data)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@pdf_jobs_bp.route('/pdf-jobs/<int:job_id>/download')
+@login_required
+def download(job_id):
+    job = _get_job(job_id)
+    if job.estado != DONE:
+        abort(404)
+    if job.tipo == COMPROBANTE:
+        doc = DocumentService.get_by_filename(job.result_filename, job.client_id)
+        if doc is None:
+            abort(404)
+        return DocumentService.send_document(doc)
+    if job.tipo == COMPROBANTES_LOTE:
+        return send_upload(PdfJobService.file_path(job), as_attachment=True,
+                           mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                           download_name=os.path.basename(job.result_filename))
+    path = PdfJobService.file_path(job)
+    if not os.path.isfile(path):
+        # La caché de reportes (LRU o purge) ya borró el PDF: el balance sirve la versión vigente o lo vuelve a generar
+        params = json.loads(job.params)
+        return redirect(url_for('financial.download_balance_pdf', start_date=params['start_date'],
+                                end_date=params['end_date']))
+    return send_upload(path, mimetype='application/pdf', as_attachment=True,
+                       download_name=f"Balance_General_{job.finished_at.date()}.pdf")
+
+@pdf_jobs_bp.route('/pdf-jobs/<int:job_id>/wait')
+@login_required
+def wait(job_id):
+    # Página de espera para descargas directas (balance, resumen de lote): descarga el archivo cuando está listo
+    job = _get_job(job_id)
+    return render_template('pdf_jobs/wait.html', job=job)
@@ -2,9 +2,12 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for,
 from flask_login import login_required, current_user
 from models import db, Client, User, AllyPayment
 from utils.decorators import role_required
-from sqlalchemy import or_, func
+from utils.pagination import KeysetPaginator
+from utils.date_filters import apply_date_range
 from services.client_service import ClientService
 from services.payment_service import PaymentService
+from services.notification_service import NotificationService
+from services.client_search import ClientSearch
 import os
 
 radicador_bp = Blueprint('radicador', __name__)
@@ -17,26 +20,28 @@ def dashboard():
     # Use 'analista' param name to match template form, but it refers to radicador/analyst search
     analista_query = request.args.get('analista') 
     fecha = request.args.get('fecha')
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
 
-    query = Client.query
+    query = ClientService.list_query()
 
     # If Radicador, see only theirs
     if current_user.rol == 'Radicador':
         query = query.filter_by(radicador_id=current_user.id)
 
     if nombre:
-        query = query.filter(Client.nombre.ilike(f'%{nombre}%'))
+        query = ClientSearch.apply(query, nombre, ('nombre',))
     
     if analista_query:
         # Search by Radicador name if Admin is looking, or redundant filtering
         query = query.join(Client.radicador).filter(User.nombre_completo.ilike(f'%{analista_query}%'))
 
-    if fecha:
-        query = query.filter(func.date(Client.created_at) == fecha)
+    if fecha or desde or hasta:
+        query = apply_date_range(query, Client.created_at, fecha=fecha, desde=desde, hasta=hasta)
 
-    # Ordenar por fecha de creación descendente por defecto
-    page = request.args.get('page', 1, type=int)
-    clients = query.order_by(Client.created_at.desc()).paginate(page=page, per_page=20)
+    # Ordenado por fecha de creación descendente (created_at, id)
+    clients = KeysetPaginator.paginate(query, Client.created_at, Client.id, cursor=request.args.get('cursor'))
+    clients.items = ClientService.to_rows(clients.items)
     
     return render_template('radicador/dashboard.html', clients=clients)
 
@@ -103,6 +108,7 @@ def send_to_lawyer(client_id):
         
     client.estado = 'Pendiente_Analisis'
     client.abogado_id = lawyer.id
+    NotificationService.refresh_client(client.id)
     db.session.commit()
     
     flash(f'Caso enviado exitosamente al abogado {lawyer.nombre_completo}', 'success')
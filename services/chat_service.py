@@ -0,0 +1,71 @@
+from models import db, CaseMessage
+from services.notification_service import NotificationService
+from sqlalchemy.orm import joinedload
+from typing import Dict, Any, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class ChatService:
+    @staticmethod
+    def get_messages_page(client_id: int, after_id: Optional[int] = None, before_id: Optional[int] = None,
+                          limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[CaseMessage], bool]:
+        """
+        Keyset pagination over a case conversation, ordered by message id.
+
+        - after_id: messages newer than the cursor (incremental polling).
+        - before_id: messages older than the cursor (loading history page by page).
+        - neither: the latest page of the conversation.
+
+        Returns (messages in ascending order, has_more) where has_more tells whether
+        more messages exist in the requested direction.
+        """
+        limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+        query = CaseMessage.query.options(joinedload(CaseMessage.sender)).filter(CaseMessage.client_id == client_id)
+
+        if after_id is not None:
+            rows = query.filter(CaseMessage.id > after_id).order_by(CaseMessage.id.asc()).limit(limit + 1).all()
+            has_more = len(rows) > limit
+            return rows[:limit], has_more
+
+        if before_id is not None:
+            query = query.filter(CaseMessage.id < before_id)
+
+        rows = query.order_by(CaseMessage.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+        return rows, has_more
+
+    @staticmethod
+    def mark_as_read(client_id: int, reader_id: int) -> int:
+        """
+        Marks every unread message of a case that was not sent by the reader as read,
+        in a single UPDATE, and refreshes the unread counters when something changed.
+
+        Returns:
+            int: Number of messages marked as read.
+        """
+        updated = CaseMessage.query.filter(
+            CaseMessage.client_id == client_id,
+            CaseMessage.sender_id != reader_id,
+            CaseMessage.is_read_by_recipient == False
+        ).update({CaseMessage.is_read_by_recipient: True}, synchronize_session=False)
+
+        if updated:
+            NotificationService.refresh_client(client_id)
+            db.session.commit()
+        return updated
+
+    @staticmethod
+    def serialize_message(msg: CaseMessage, user_id: int) -> Dict[str, Any]:
+        """
+        JSON representation used by the chat widgets.
+        """
+        return {
+            'id': msg.id,
+            'is_me': msg.sender_id == user_id,
+            'sender_name': 'Yo' if msg.sender_id == user_id else msg.sender.nombre_completo,
+            'content': msg.content,
+            'timestamp': msg.timestamp.strftime('%d/%m %H:%M')
+        }
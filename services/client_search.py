@@ -0,0 +1,220 @@
+from models import db, Client
+from sqlalchemy import event, func, or_, text
+from sqlalchemy.engine import Engine
+from typing import Any, Dict, Iterable, List, Optional
+import sqlite3
+import unicodedata
+
+SEARCHABLE_FIELDS = ('nombre', 'telefono', 'numero_id')
+FTS_TABLE = 'client_search_fts'
+LOOKUP_LIMIT = 20
+MAX_LOOKUP_LIMIT = 50
+
+# Columna que define qué clientes ve cada rol en los buscadores (Admin ve todos)
+ROLE_SCOPE = {
+    'Analista': 'analista_id',
+    'Aliado': 'analista_id',
+    'Abogado': 'abogado_id',
+    'Radicador': 'radicador_id',
+    'Negociador': 'negociador_id',
+}
+
+def normalize_term(value: Optional[str]) -> str:
+    """
+    Lowercases and strips accents so 'José Peña' and 'jose pena' match.
+    """
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', value)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower().strip()
+
+# Respaldo de PostgreSQL sin crm_unaccent: translate() con las letras acentuadas del español
+ACCENTED = 'áàäâãéèëêíìïîóòöôõúùüûñç'
+UNACCENTED = 'aaaaaeeeeiiiiooooouuuunc'
+# El tokenizador trigram solo atiende términos de 3 caracteres o más
+MIN_MATCH_LEN = 3
+
+def _escape_like(term: str) -> str:
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _like_pattern(term: str) -> str:
+    return f'%{_escape_like(term)}%'
+
+
+class ClientSearch:
+    """
+    Substring search over Client name, phone and ID shared by the role dashboards.
+
+    - PostgreSQL: pg_trgm GIN indexes over crm_unaccent(lower(nombre)), lower(telefono) and lower(numero_id),
+      so '%term%' no longer scans the whole table.
+    - SQLite: FTS5 table with the trigram tokenizer holding normalized copies of the fields,
+      kept in sync through mapper events and queried with a MATCH phrase, where '%' and '_'
+      are plain characters. Terms shorter than a trigram use the fallback.
+    - Fallback (or migrations not applied yet): LIKE over the accent-folded columns, using
+      crm_unaccent (a Python function registered on SQLite connections) or translate() on
+      PostgreSQL; plain ILIKE on other databases.
+    """
+    _backend = None
+
+    @staticmethod
+    def init_app(app) -> None:
+        event.listen(Client, 'after_insert', ClientSearch._sync_row)
+        event.listen(Client, 'after_update', ClientSearch._sync_row)
+        event.listen(Client, 'after_delete', ClientSearch._delete_row)
+        event.listen(Engine, 'connect', ClientSearch._register_unaccent)
+
+    @staticmethod
+    def _register_unaccent(dbapi_connection, connection_record) -> None:
+        # Misma normalización que el término, disponible en SQL como crm_unaccent(texto)
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            dbapi_connection.create_function('crm_unaccent', 1, lambda value: normalize_term(value) if value else value,
+                                             deterministic=True)
+
+    @staticmethod
+    def backend() -> str:
+        """
+        Detects once per process which search strategy the database supports.
+        """
+        if ClientSearch._backend is None:
+            dialect = db.engine.dialect.name
+            backend = 'ilike'
+            if dialect == 'postgresql':
+                has_function = db.session.execute(text("SELECT to_regprocedure('crm_unaccent(text)') IS NOT NULL")).scalar()
+                if has_function:
+                    backend = 'trigram'
+            elif dialect == 'sqlite':
+                has_table = db.session.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+                ).scalar()
+                if has_table:
+                    backend = 'fts5'
+            ClientSearch._backend = backend
+        return ClientSearch._backend
+
+    @staticmethod
+    def apply(query, term: Optional[str], fields: Iterable[str] = ('nombre',)):
+        """
+        Filters a query that already selects from Client by a search term over the given fields.
+
+        Args:
+            query: SQLAlchemy query with Client in its FROM clause.
+            term: Raw text typed in the dashboard filter.
+            fields: Subset of SEARCHABLE_FIELDS to match against.
+        """
+        condition = ClientSearch.condition(term, fields)
+        return query if condition is None else query.filter(condition)
+
+    @staticmethod
+    def condition(term: Optional[str], fields: Iterable[str] = ('nombre',)):
+        """
+        Builds the WHERE clause for a search term, or None if the term is empty.
+        """
+        normalized = normalize_term(term)
+        if not normalized:
+            return None
+
+        fields = [f for f in fields if f in SEARCHABLE_FIELDS]
+        pattern = _like_pattern(normalized)
+        backend = ClientSearch.backend()
+
+        if backend == 'fts5' and len(normalized) >= MIN_MATCH_LEN:
+            # Frase MATCH sobre las columnas pedidas: subcadena atendida por el índice trigram,
+            # sin comodines (LIKE con ESCAPE recorre toda la tabla)
+            phrase = '{%s} : "%s"' % (' '.join(fields), normalized.replace('"', '""'))
+            return Client.id.in_(text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :phrase").bindparams(phrase=phrase))
+
+        dialect = db.engine.dialect.name
+        conditions = []
+        for field in fields:
+            column = getattr(Client, field)
+            if backend == 'trigram' and field == 'nombre':
+                conditions.append(func.crm_unaccent(func.lower(column)).like(pattern, escape='\\'))
+            elif backend == 'trigram':
+                conditions.append(func.lower(column).like(pattern, escape='\\'))
+            elif dialect == 'sqlite':
+                conditions.append(func.crm_unaccent(column).like(pattern, escape='\\'))
+            elif dialect == 'postgresql':
+                conditions.append(func.translate(func.lower(column), ACCENTED, UNACCENTED).like(pattern, escape='\\'))
+            else:
+                conditions.append(column.ilike(_like_pattern(term.strip()), escape='\\'))
+        return or_(*conditions)
+
+    @staticmethod
+    def scope_for(query, user):
+        """
+        Restricts a Client query to the clients the user may see. Admin sees all of them.
+        Returns None for roles without access to client listings.
+        """
+        if user.rol == 'Admin':
+            return query
+        column = ROLE_SCOPE.get(user.rol)
+        if column is None:
+            return None
+        return query.filter(getattr(Client, column) == user.id)
+
+    @staticmethod
+    def lookup(user, term: Optional[str], limit: int = LOOKUP_LIMIT) -> List[Dict[str, Any]]:
+        """
+        Top matches by name, document or contract number for the typeahead selects,
+        limited to the clients visible to the user.
+        """
+        term = (term or '').strip()
+        if not term:
+            return []
+
+        query = ClientSearch.scope_for(db.session.query(Client.id, Client.nombre, Client.numero_id, Client.contract_number), user)
+        if query is None:
+            return []
+
+        limit = max(1, min(limit or LOOKUP_LIMIT, MAX_LOOKUP_LIMIT))
+        query = query.filter(or_(
+            ClientSearch.condition(term, ('nombre', 'numero_id')),
+            # Número de contrato: búsqueda por prefijo sobre el índice existente
+            Client.contract_number.like(f'{_escape_like(term)}%', escape='\\')
+        ))
+        rows = query.order_by(Client.nombre, Client.id).limit(limit).all()
+        return [
+            {
+                'id': row.id,
+                'text': f"{row.nombre} ({row.numero_id})" if row.numero_id else row.nombre,
+                'numero_id': row.numero_id,
+                'contract_number': row.contract_number
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def rebuild_index() -> int:
+        """
+        Repopulates the SQLite FTS table from the client table. Returns the number of rows indexed.
+        """
+        if ClientSearch.backend() != 'fts5':
+            return 0
+
+        db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        rows = db.session.query(Client.id, Client.nombre, Client.telefono, Client.numero_id).all()
+        for row in rows:
+            db.session.execute(
+                text(f"INSERT INTO {FTS_TABLE} (rowid, nombre, telefono, numero_id) VALUES (:id, :nombre, :telefono, :numero_id)"),
+                {'id': row.id, 'nombre': normalize_term(row.nombre), 'telefono': normalize_term(row.telefono),
+                 'numero_id': normalize_term(row.numero_id)}
+            )
+        db.session.commit()
+        return len(rows)
+
+    @staticmethod
+    def _sync_row(mapper, connection, target) -> None:
+        if ClientSearch.backend() != 'fts5':
+            return
+        connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': target.id})
+        connection.execute(
+            text(f"INSERT INTO {FTS_TABLE} (rowid, nombre, telefono, numero_id) VALUES (:id, :nombre, :telefono, :numero_id)"),
+            {'id': target.id, 'nombre': normalize_term(target.nombre), 'telefono': normalize_term(target.telefono),
+             'numero_id': normalize_term(target.numero_id)}
+        )
+
+    @staticmethod
+    def _delete_row(mapper, connection, target) -> None:
+        if ClientSearch.backend() != 'fts5':
+            return
+        connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': target.id})
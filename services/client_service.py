@@ -1,7 +1,38 @@
-from models import db, Client, ClientStatus
-from typing import Dict, Any, List
+from models import db, Client, ClientStatus, User, ClientNote, FinancialObligation, Negotiation, PaymentContract
+from services.document_service import DocumentService
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy.orm import contains_eager, joinedload, load_only, selectinload, undefer_group
+from typing import Dict, Any, List, Optional
 import pandas as pd
 
+# Columnas que muestran los listados de los dashboards
+LIST_COLUMNS = (
+    Client.id, Client.nombre, Client.tipo_id, Client.numero_id, Client.telefono,
+    Client.estado, Client.created_at, Client.last_status_update,
+    Client.analista_id, Client.radicador_id
+)
+
+# Paneles de client_detail que se sirven como fragmentos aparte (templates/client_detail/<panel>.html)
+DETAIL_PANELS = ('documents', 'negotiations', 'notes')
+
+@dataclass(frozen=True)
+class ClientRow:
+    """
+    Read-only row of a dashboard client list. Templates get plain values and cannot
+    trigger lazy loads of relationships or heavy columns.
+    """
+    id: int
+    nombre: Optional[str]
+    tipo_id: Optional[str]
+    numero_id: Optional[str]
+    telefono: Optional[str]
+    estado: Optional[str]
+    created_at: Optional[datetime]
+    last_status_update: Optional[datetime]
+    analista_nombre: Optional[str]
+    radicador_nombre: Optional[str]
+
 class ClientService:
     @staticmethod
     def create_client(data: Dict[str, Any], analyst_id: int) -> Client:
@@ -74,6 +105,113 @@ class ClientService:
         
         return client
 
+    @staticmethod
+    def list_query():
+        """
+        Base query for the dashboard lists: loads only LIST_COLUMNS plus the names of
+        the assigned analyst and radicador.
+        """
+        return Client.query.options(
+            load_only(*LIST_COLUMNS),
+            joinedload(Client.analista).load_only(User.id, User.nombre_completo),
+            joinedload(Client.radicador).load_only(User.id, User.nombre_completo)
+        )
+
+    @staticmethod
+    def to_rows(clients: List[Client]) -> List[ClientRow]:
+        """
+        Converts clients loaded with list_query() into ClientRow DTOs.
+        """
+        return [
+            ClientRow(
+                id=c.id,
+                nombre=c.nombre,
+                tipo_id=c.tipo_id,
+                numero_id=c.numero_id,
+                telefono=c.telefono,
+                estado=c.estado,
+                created_at=c.created_at,
+                last_status_update=c.last_status_update,
+                analista_nombre=c.analista.nombre_completo if c.analista else None,
+                radicador_nombre=c.radicador.nombre_completo if c.radicador else None
+            )
+            for c in clients
+        ]
+
+    @staticmethod
+    def get_detail(client_id: int) -> Client:
+        """
+        Loads a client with everything the detail page shell reads from it, in a fixed number of queries:
+        the row plus its many-to-one relations in one JOIN, and one SELECT ... IN per collection
+        (installments, obligations, negotiations) no matter how many rows each has.
+        """
+        return Client.query.options(
+            undefer_group('client_texts'),
+            joinedload(Client.analista),
+            joinedload(Client.radicador),
+            joinedload(Client.login_user),
+            joinedload(Client.payment_diagnosis),
+            joinedload(Client.payment_contract).selectinload(PaymentContract.installments),
+            selectinload(Client.financial_obligations).selectinload(FinancialObligation.negotiations)
+        ).filter(Client.id == client_id).first_or_404()
+
+    @staticmethod
+    def get_detail_context(client: Client, user) -> Dict[str, Any]:
+        """
+        Builds the template context of the client_detail shell for a client loaded with get_detail().
+        Messages, documents, negotiations and notes are not part of it: the page requests them
+        when their tab is opened (see get_panel_context and the chat messages API).
+        """
+        # Una sola consulta de usuarios de staff; los selectores por rol se arman en memoria
+        radicadores = []
+        negociadores = []
+        all_users = []
+        if user.rol in ['Abogado', 'Admin']:
+            all_users = User.query.filter(User.rol != 'Cliente').all()
+            radicadores = [u for u in all_users if u.rol == 'Radicador']
+            negociadores = [u for u in all_users if u.rol == 'Negociador']
+
+        # Las negociaciones ya vienen cargadas con las obligaciones de la pestaña financiera
+        negotiation_count = sum(len(obligation.negotiations) for obligation in client.financial_obligations)
+
+        completion_required = bool(
+            client.estado == ClientStatus.PROSPECTO and client.payment_diagnosis and client.payment_diagnosis.verificado
+        )
+
+        return {
+            'client': client,
+            'radicadores': radicadores,
+            'negociadores': negociadores,
+            'all_users': all_users,
+            'completion_required': completion_required,
+            'negotiation_count': negotiation_count
+        }
+
+    @staticmethod
+    def get_panel_context(client: Client, panel: str, user) -> Dict[str, Any]:
+        """
+        Builds the template context of one lazily loaded client_detail panel (see DETAIL_PANELS).
+        """
+        if panel == 'documents':
+            return {'client': client, 'documents': DocumentService.get_client_documents(client.id, user.rol)}
+
+        if panel == 'negotiations':
+            negotiations = Negotiation.query.join(Negotiation.obligation).options(
+                contains_eager(Negotiation.obligation),
+                joinedload(Negotiation.negociador)
+            ).filter(
+                FinancialObligation.client_id == client.id
+            ).order_by(Negotiation.created_at.desc(), Negotiation.id.desc()).all()
+            return {'client': client, 'negotiations': negotiations}
+
+        if panel == 'notes':
+            notes = ClientNote.query.options(joinedload(ClientNote.author)).filter_by(
+                client_id=client.id
+            ).order_by(ClientNote.timestamp.desc()).all()
+            return {'client': client, 'notes': notes}
+
+        raise ValueError(f"Panel desconocido: {panel}")
+
     @staticmethod
     def delete_client(client_id: int) -> None:
         """
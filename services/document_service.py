@@ -1,31 +1,35 @@
 from models import db, Document
+from services.document_storage import DocumentStorage
+from sqlalchemy.orm import joinedload
+from utils.file_delivery import send_upload
+from utils.zip_stream import unique_arcname
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
+import mimetypes
 import os
+import uuid
 from flask import current_app
 
 class DocumentService:
     @staticmethod
     def upload_file(file, client_id, user_id, visible_analyst=False, visible_client=False):
         """
-        Handles file upload, saving to disk and creating a DB record.
+        Handles file upload: streams the content into the deduplicated blob store and creates a DB record.
         """
         if not file or file.filename == '':
             raise ValueError("No file selected")
             
         filename = secure_filename(file.filename)
         # Prefix with client_id to associate
-        filename = f"client_{client_id}_{filename}"
-        
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-            
-        file.save(os.path.join(upload_folder, filename))
+        filename = DocumentService.unique_filename(f"client_{client_id}_{filename}")
+
+        blob = DocumentStorage.store(file.stream)
         
         new_doc = Document(
             filename=filename,
             client_id=client_id,
             uploaded_by_id=user_id,
+            blob_sha256=blob.sha256,
             visible_para_analista=visible_analyst,
             visible_para_cliente=visible_client
         )
@@ -34,6 +38,121 @@ class DocumentService:
         
         return new_doc
 
+    @staticmethod
+    def unique_filename(filename):
+        """
+        Returns filename with a random suffix before the extension, unique without looking
+        at the table (as receipt names are): two concurrent uploads with the same name never
+        share a download link. A re-upload never replaces the previous document.
+        """
+        stem, ext = os.path.splitext(filename)
+        return f"{stem}_{uuid.uuid4().hex[:8]}{ext}"
+
+    @staticmethod
+    def file_path(doc):
+        """
+        Path on disk of a document: its blob, or the flat file in UPLOAD_FOLDER for documents
+        saved before the blob store (None if the name would escape the folder).
+        """
+        if doc.blob_sha256:
+            return DocumentStorage.blob_path(doc.blob_sha256)
+        return safe_join(current_app.config['UPLOAD_FOLDER'], doc.filename)
+
+    @staticmethod
+    def get_by_filename(filename, client_id):
+        """
+        Document of a client registered under a download name, or None.
+        """
+        return Document.query.filter_by(filename=filename, client_id=client_id).order_by(Document.id.desc()).first()
+
+    @staticmethod
+    def get_all_by_filename(filename):
+        """
+        Every document registered under a download name, newest first. Names uploaded
+        before they were made unique can repeat across clients.
+        """
+        return Document.query.options(joinedload(Document.client)).filter_by(
+            filename=filename
+        ).order_by(Document.id.desc()).all()
+
+    @staticmethod
+    def send_document(doc):
+        """
+        Response with the file of a document: its blob, or the flat file of documents
+        saved before the blob store. The caller checks that the user may see it.
+        """
+        if doc.blob_sha256:
+            mimetype = mimetypes.guess_type(doc.filename)[0] or 'application/octet-stream'
+            # El contenido de un blob nunca cambia: su hash es un ETag fuerte
+            return send_upload(DocumentService.file_path(doc), mimetype=mimetype,
+                               download_name=doc.display_name, etag=doc.blob_sha256)
+        return send_upload(DocumentService.file_path(doc))
+
+    @staticmethod
+    def zip_entries(documents, folder=''):
+        """
+        (arcname, path, created_at) tuples for utils.zip_stream, named as the document lists
+        show them and optionally inside a folder. Built eagerly, so the ZIP generator does
+        not need the app context.
+        """
+        used = set()
+        entries = []
+        for doc in documents:
+            name = unique_arcname(doc.display_name, used)
+            entries.append((f"{folder}/{name}" if folder else name, DocumentService.file_path(doc), doc.created_at))
+        return entries
+
+    @staticmethod
+    def migrate_legacy_batch(batch_size=200, after_id=0, dry_run=False):
+        """
+        Moves the flat files of up to batch_size documents saved before the blob store
+        (blob_sha256 IS NULL, id > after_id) into the sharded blob store.
+
+        Each batch is one commit and the flat files are removed only after it, so downloads keep
+        working during the migration and an interrupted run resumes where it stopped.
+        Document.filename is not rewritten: it is the name used by download links.
+
+        Returns:
+            dict: last_id (None when nothing is left), migrated, missing (filenames without a file).
+        """
+        docs = Document.query.filter(
+            Document.blob_sha256.is_(None), Document.id > after_id
+        ).order_by(Document.id).limit(batch_size).all()
+        if not docs:
+            return {'last_id': None, 'migrated': 0, 'missing': []}
+
+        migrated = 0
+        missing = []
+        moved_paths = set()
+        for doc in docs:
+            path = DocumentService.file_path(doc)
+            if not path or not os.path.isfile(path):
+                # Varios documentos con el mismo nombre compartían el archivo plano (subidas sobrescritas)
+                twin = Document.query.filter(
+                    Document.filename == doc.filename, Document.blob_sha256.isnot(None)
+                ).first()
+                if twin and not dry_run:
+                    doc.blob_sha256 = twin.blob_sha256
+                    migrated += 1
+                elif not twin:
+                    missing.append(doc.filename)
+                continue
+
+            migrated += 1
+            if dry_run:
+                continue
+            with open(path, 'rb') as f:
+                doc.blob_sha256 = DocumentStorage.store(f).sha256
+            moved_paths.add(path)
+
+        if not dry_run:
+            db.session.commit()
+            for path in moved_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+        return {'last_id': docs[-1].id, 'migrated': migrated, 'missing': missing}
+
     @staticmethod
     def toggle_visibility(doc_id, role_type):
         """
@@ -59,7 +178,7 @@ class DocumentService:
         Retrieves documents for a client, optionally filtering by visibility for specific roles.
         This replaces the os.listdir usage.
         """
-        query = Document.query.filter_by(client_id=client_id)
+        query = Document.query.options(joinedload(Document.uploaded_by)).filter_by(client_id=client_id)
         
         if user_role == 'Analista' or user_role == 'Aliado':
             query = query.filter_by(visible_para_analista=True)
@@ -71,21 +190,22 @@ class DocumentService:
     @staticmethod
     def delete_document(doc_id):
         """
-        Deletes a document record from DB and the physical file.
+        Deletes a document record from DB. Flat files of old documents are deleted too;
+        blobs are only dereferenced, since other documents may share them.
         """
         doc = Document.query.get_or_404(doc_id)
         
-        # Construct full path
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        file_path = os.path.join(upload_folder, doc.filename)
-        
-        # Delete physical file if exists
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                # Log error but continue to delete form DB
-                print(f"Error checking/deleting file {file_path}: {e}")
+        if not doc.blob_sha256:
+            # Construct full path
+            file_path = DocumentService.file_path(doc)
+            
+            # Delete physical file if exists
+            if file_path and os.path.exists(file_path):
+                try:
+                    os.remove(file_path)
+                except Exception as e:
+                    # Log error but continue to delete form DB
+                    print(f"Error checking/deleting file {file_path}: {e}")
         
         db.session.delete(doc)
         db.session.commit()
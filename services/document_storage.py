@@ -0,0 +1,172 @@
+from models import db, Document, StoredBlob
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, inspect, update
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import BinaryIO, Optional, Tuple
+import hashlib
+import os
+import tempfile
+
+BLOBS_DIR = 'blobs'
+CHUNK_SIZE = 1024 * 1024
+
+class DocumentStorage:
+    """
+    Content-addressed storage for client documents.
+
+    Each upload is streamed to disk while its SHA-256 is computed and kept once under
+    uploads/blobs/<aa>/<bb>/<sha256>, no matter how many Document rows point to it.
+    StoredBlob.ref_count follows the Document rows through mapper events (inserts, deletes,
+    client cascades and changes of blob_sha256). Blobs that drop to zero references stay
+    on disk until the cleanup removes them, so a concurrent upload of the same content
+    never loses its file.
+    """
+
+    @staticmethod
+    def init_app(app) -> None:
+        event.listen(Document, 'before_insert', DocumentStorage._on_insert)
+        event.listen(Document, 'before_update', DocumentStorage._on_update)
+        event.listen(Document, 'after_delete', DocumentStorage._on_delete)
+
+    @staticmethod
+    def blobs_root() -> str:
+        return os.path.join(current_app.config['UPLOAD_FOLDER'], BLOBS_DIR)
+
+    @staticmethod
+    def blob_path(sha256: str) -> str:
+        """
+        Path of a blob on disk (relative to the working directory when UPLOAD_FOLDER is).
+        """
+        return os.path.join(DocumentStorage.blobs_root(), sha256[:2], sha256[2:4], sha256)
+
+    @staticmethod
+    def spool(stream: BinaryIO) -> Tuple[str, str, int]:
+        """
+        Copies a readable binary stream in fixed-size chunks to a temporary file of the
+        blob store, computing its hash on the way.
+
+        Returns:
+            (temporary path, sha256, size). place() moves the file to its final path.
+        """
+        tmp_dir = os.path.join(DocumentStorage.blobs_root(), 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size
+
+    @staticmethod
+    def place(tmp_path: str, sha256: str) -> None:
+        """
+        Moves a spooled file to the blob path, or discards it when the content is already
+        stored. A reused blob gets a fresh mtime, so the cleanup sees it as recent.
+        """
+        path = DocumentStorage.blob_path(sha256)
+        try:
+            if os.path.exists(path):
+                # Contenido duplicado: se reutiliza el blob existente
+                os.utime(path)
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # mkstemp crea el archivo 0600; el resto de uploads/ es legible por el servidor web
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def store(stream: BinaryIO) -> StoredBlob:
+        """
+        Saves the content of a stream and returns its StoredBlob row, the existing one for a
+        duplicate. The row is created in the current transaction with ref_count 0; it is
+        counted when a Document referencing it is flushed.
+
+        The row is written (and, for a duplicate, its created_at refreshed and the row locked)
+        before the file is put in place. The cleanup deletes an unreferenced blob's row and
+        file under the same row lock, so either it sees the refreshed row and keeps the blob,
+        or it finishes first and the file is written again here.
+        """
+        tmp_path, sha256, size = DocumentStorage.spool(stream)
+        try:
+            now = datetime.utcnow()
+            values = {'sha256': sha256, 'size': size, 'ref_count': 0, 'created_at': now}
+
+            dialect = db.session.get_bind().dialect.name
+            if dialect in ('postgresql', 'sqlite'):
+                insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+                # Dos subidas simultáneas del mismo contenido no chocan por la clave primaria;
+                # el DO UPDATE deja la fila bloqueada hasta el commit
+                db.session.execute(insert(StoredBlob).values(**values).on_conflict_do_update(
+                    index_elements=['sha256'], set_={'created_at': now}
+                ))
+            else:
+                existing = db.session.query(StoredBlob).filter_by(sha256=sha256).with_for_update().first()
+                if existing is None:
+                    db.session.add(StoredBlob(**values))
+                else:
+                    existing.created_at = now
+                db.session.flush()
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        DocumentStorage.place(tmp_path, sha256)
+        return db.session.query(StoredBlob).filter_by(sha256=sha256).populate_existing().one()
+
+    @staticmethod
+    def verify(blob: StoredBlob) -> Optional[str]:
+        """
+        Re-hashes a blob on disk. Returns None if it is intact, otherwise the problem found.
+        """
+        path = DocumentStorage.blob_path(blob.sha256)
+        if not os.path.exists(path):
+            return 'missing'
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        if digest.hexdigest() != blob.sha256:
+            return 'corrupt'
+        if os.path.getsize(path) != blob.size:
+            return 'size mismatch'
+        return None
+
+    @staticmethod
+    def _change_refs(connection, sha256: Optional[str], delta: int) -> None:
+        if not sha256:
+            return
+        table = StoredBlob.__table__
+        connection.execute(
+            update(table).where(table.c.sha256 == sha256).values(ref_count=table.c.ref_count + delta)
+        )
+
+    @staticmethod
+    def _on_insert(mapper, connection, target) -> None:
+        DocumentStorage._change_refs(connection, target.blob_sha256, 1)
+
+    @staticmethod
+    def _on_update(mapper, connection, target) -> None:
+        history = inspect(target).attrs.blob_sha256.history
+        if not history.has_changes():
+            return
+        for old in history.deleted:
+            DocumentStorage._change_refs(connection, old, -1)
+        for new in history.added:
+            DocumentStorage._change_refs(connection, new, 1)
+
+    @staticmethod
+    def _on_delete(mapper, connection, target) -> None:
+        DocumentStorage._change_refs(connection, target.blob_sha256, -1)
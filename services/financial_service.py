@@ -1,5 +1,5 @@
 from models import db, PaymentDiagnosis, ContractInstallment, AdministrativeExpense, Client, Sale, PaymentContract, FinancialObligation
-from sqlalchemy import func
+from sqlalchemy import case, func, true
 from datetime import datetime
 from sqlalchemy.orm import joinedload
 
@@ -35,14 +35,14 @@ class FinancialService:
         }
 
     @staticmethod
-    def get_balance_general(start_date=None, end_date=None):
+    def resolve_period(start_date=None, end_date=None):
         """
-        Calculates general balance KPIs and retrieves filtered data for financial reports.
+        Date range of the financial reports ('YYYY-MM-DD' strings): missing bounds default
+        to the first and last day of the current month.
         """
-        # Validate Dates
         import calendar
         from datetime import date
-        
+
         if not start_date or start_date in ['None', '', 'null']:
             today = date.today()
             start_date = f"{today.year}-{today.month:02d}-01"
@@ -51,66 +51,73 @@ class FinancialService:
             today = date.today()
             last_day = calendar.monthrange(today.year, today.month)[1]
             end_date = f"{today.year}-{today.month:02d}-{last_day}"
+        return start_date, end_date
+
+    @staticmethod
+    def get_balance_general(start_date=None, end_date=None):
+        """
+        Calculates general balance KPIs and retrieves filtered data for financial reports.
+        """
+        start_date, end_date = FinancialService.resolve_period(start_date, end_date)
 
         from models import Expense
-        # Tarjeta 3: Ventas Totales
-        # Diagnósticos
-        q_income_diag_total = db.session.query(func.sum(PaymentDiagnosis.valor)).filter(
+        # Para DateTime, necesitamos que el end_date cubra todo el día hasta las 23:59:59
+        end_date_str = f"{end_date} 23:59:59"
+
+        # Una sola sentencia: cada tabla se recorre una vez con agregación condicional (CASE)
+        # y las tres subconsultas de una fila se combinan en un único SELECT
+        iva_client = Client.es_responsable_iva == True
+        paid = ContractInstallment.estado == 'Pagada'
+
+        diag = db.session.query(
+            func.sum(PaymentDiagnosis.valor).label('ventas'),
+            func.count(PaymentDiagnosis.id).label('vendidos'),
+            func.sum(case((iva_client, PaymentDiagnosis.valor))).label('base_iva')
+        ).outerjoin(Client, PaymentDiagnosis.client_id == Client.id).filter(
             PaymentDiagnosis.verificado == True,
             PaymentDiagnosis.fecha_pago >= start_date,
             PaymentDiagnosis.fecha_pago <= end_date
-        ).scalar() or 0.0
-        
+        ).subquery()
+
         # Contratos (Proxy: The contract's first installment falls in the date range)
-        q_contracts_total = db.session.query(func.sum(PaymentContract.valor_total)).join(ContractInstallment).filter(
-            ContractInstallment.numero_cuota == 1,
+        inst = db.session.query(
+            func.sum(case((ContractInstallment.numero_cuota == 1, PaymentContract.valor_total))).label('ventas_contratos'),
+            func.sum(case((paid, ContractInstallment.valor))).label('recaudo'),
+            func.sum(case((paid & iva_client, ContractInstallment.valor))).label('base_iva')
+        ).join(PaymentContract, ContractInstallment.payment_contract_id == PaymentContract.id
+        ).outerjoin(Client, PaymentContract.client_id == Client.id).filter(
             ContractInstallment.fecha_vencimiento >= start_date,
             ContractInstallment.fecha_vencimiento <= end_date
-        ).scalar() or 0.0
-        
-        ventas_totales = float(q_income_diag_total) + float(q_contracts_total)
+        ).subquery()
 
-        # Calculo de Gastos en el rango
-        # Para DateTime, necesitamos que el end_date cubra todo el día hasta las 23:59:59
-        end_date_str = f"{end_date} 23:59:59"
-
-        q_expenses_indirect = db.session.query(func.sum(Expense.valor_base)).filter(
-            Expense.tipo == 'Costo Indirecto',
-            Expense.fecha >= start_date,
-            Expense.fecha <= end_date_str
-        ).scalar() or 0.0
-        
-        q_expenses_operative = db.session.query(func.sum(Expense.valor_base)).filter(
-            Expense.tipo == 'Gasto Operativo',
+        expenses = db.session.query(
+            func.sum(case((Expense.tipo == 'Costo Indirecto', Expense.valor_base))).label('indirectos'),
+            func.sum(case((Expense.tipo == 'Gasto Operativo', Expense.valor_base))).label('operativos')
+        ).filter(
             Expense.fecha >= start_date,
             Expense.fecha <= end_date_str
-        ).scalar() or 0.0
+        ).subquery()
+
+        totals = db.session.query(diag, inst, expenses).select_from(diag).join(inst, true()).join(expenses, true()).one()
+        (diag_ventas, count_diag_sold, diag_base_iva, contracts_total, installments_paid, inst_base_iva,
+         expenses_indirect, expenses_operative) = totals
+
+        # Tarjeta 3: Ventas Totales
+        q_income_diag_total = diag_ventas or 0.0
+        q_contracts_total = contracts_total or 0.0
+        ventas_totales = float(q_income_diag_total) + float(q_contracts_total)
+
+        q_expenses_indirect = expenses_indirect or 0.0
+        q_expenses_operative = expenses_operative or 0.0
 
         # Tarjeta 1: Costos Totales
-        count_diag_sold = PaymentDiagnosis.query.filter(
-            PaymentDiagnosis.verificado == True,
-            PaymentDiagnosis.fecha_pago >= start_date,
-            PaymentDiagnosis.fecha_pago <= end_date
-        ).count()
-        
         costos_totales = (count_diag_sold * 35000.0) + float(q_expenses_indirect)
 
         # Tarjeta 2: Gastos Administrativos
         gastos_administrativos = float(q_expenses_operative)
 
         # Tax calculations helpers (Para Tarjeta 4)
-        q_tax_diag_base = db.session.query(func.sum(PaymentDiagnosis.valor)).join(Client).filter(
-            PaymentDiagnosis.verificado == True, Client.es_responsable_iva == True,
-            PaymentDiagnosis.fecha_pago >= start_date,
-            PaymentDiagnosis.fecha_pago <= end_date
-        )
-        q_tax_inst_base = db.session.query(func.sum(ContractInstallment.valor)).join(PaymentContract).join(Client).filter(
-            ContractInstallment.estado == 'Pagada', Client.es_responsable_iva == True,
-            ContractInstallment.fecha_vencimiento >= start_date,
-            ContractInstallment.fecha_vencimiento <= end_date
-        )
-
-        base_taxable = (q_tax_diag_base.scalar() or 0) + (q_tax_inst_base.scalar() or 0)
+        base_taxable = (diag_base_iva or 0) + (inst_base_iva or 0)
         base_taxable = float(base_taxable)
         
         total_iva = base_taxable * 0.19
@@ -121,7 +128,7 @@ class FinancialService:
         impuestos_clientes = total_iva + total_retefuente + total_ica
 
         # Re-calc variables compatibility
-        total_ingresos = float(db.session.query(func.sum(PaymentDiagnosis.valor)).filter(PaymentDiagnosis.verificado == True, PaymentDiagnosis.fecha_pago >= start_date, PaymentDiagnosis.fecha_pago <= end_date).scalar() or 0) + float(db.session.query(func.sum(ContractInstallment.valor)).filter(ContractInstallment.estado == 'Pagada', ContractInstallment.fecha_vencimiento >= start_date, ContractInstallment.fecha_vencimiento <= end_date).scalar() or 0)
+        total_ingresos = float(q_income_diag_total) + float(installments_paid or 0)
         costo_negocio = count_diag_sold * 35000.0
         utilidad_neta = ventas_totales - (costos_totales + gastos_administrativos + impuestos_clientes)
         
@@ -161,6 +168,41 @@ class FinancialService:
             'end_date_used': end_date
         }
 
+    @staticmethod
+    def get_balance_pdf_context(start_date=None, end_date=None):
+        """
+        Template context of balance_pdf.html for the given period.
+        """
+        data = FinancialService.get_balance_general(start_date, end_date)
+
+        # Listas ya ejecutadas para el PDF (no objetos query)
+        recent_diagnoses = data['q_recent_diag'].order_by(PaymentDiagnosis.fecha_pago.desc()).limit(20).all()
+        recent_installments = data['q_recent_inst'].order_by(ContractInstallment.fecha_vencimiento.desc()).limit(20).all()
+
+        return {
+            'total_ingresos': data.get('total_ingresos', 0),
+            'costo_negocio': data.get('costo_negocio', 0),
+            'costos_totales': data['costos_totales'],
+            'ventas_totales': data['ventas_totales'],
+            'ventas_diagnosticos': data.get('ventas_diagnosticos', 0),
+            'ventas_contratos': data.get('ventas_contratos', 0),
+            'costos_directos': data.get('costos_directos', 0),
+            'costos_indirectos': data.get('costos_indirectos', 0),
+            'gastos_administrativos': data['gastos_administrativos'],
+            'utilidad_bruta': data['ventas_totales'] - (data['costos_totales'] + data['gastos_administrativos']),
+            'total_iva': data.get('total_iva', 0),
+            'total_retefuente': data.get('total_retefuente', 0),
+            'total_ica': data.get('total_ica', 0),
+            'impuestos_clientes': data['impuestos_clientes'],
+            'utilidad_neta': data['ventas_totales'] - (data['costos_totales'] + data['gastos_administrativos']) - data['impuestos_clientes'],
+            'expenses': [], # Los gastos se reportan por separado
+            'recent_diagnoses': recent_diagnoses,
+            'recent_installments': recent_installments,
+            'start_date': data['start_date_used'],
+            'end_date': data['end_date_used'],
+            'generation_date': datetime.now().strftime('%Y-%m-%d %H:%M')
+        }
+
     @staticmethod
     def get_expense_summary(start_date=None, end_date=None):
         from models import Expense  # Import local para evitar circular imports si es necesario
@@ -0,0 +1,299 @@
+from models import db, Client, User, CaseMessage, UnreadMessageCounter
+from sqlalchemy import case, func, or_, select, union
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import joinedload
+from flask import url_for
+from typing import Dict, Any, Iterable, Optional, Set, Tuple
+
+STAFF_ROLES = ['Admin', 'Analista', 'Abogado', 'Radicador', 'Negociador', 'Aliado']
+# Clientes por sentencia en refresh_clients (límite de parámetros de SQLite)
+REFRESH_CHUNK = 500
+
+class NotificationService:
+    @staticmethod
+    def get_recipient_ids(client: Client) -> Set[int]:
+        """
+        Returns the IDs of every user that should see unread messages for a client:
+        the assigned staff, the client's portal user and all admins.
+        """
+        recipients = {
+            client.analista_id,
+            client.abogado_id,
+            client.radicador_id,
+            client.negociador_id,
+            client.login_user_id
+        }
+        admin_ids = db.session.query(User.id).filter(User.rol == 'Admin').all()
+        recipients.update(row.id for row in admin_ids)
+        recipients.discard(None)
+        return recipients
+
+    @staticmethod
+    def register_message(message: CaseMessage) -> None:
+        """
+        Increments the unread counters of every recipient of a new message (except the sender).
+        Does not commit; the caller commits together with the message.
+        """
+        client = message.client or Client.query.get(message.client_id)
+        recipients = NotificationService.get_recipient_ids(client)
+        recipients.discard(message.sender_id)
+        if not recipients:
+            return
+
+        table = UnreadMessageCounter.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            # Upsert: dos mensajes simultáneos al mismo (usuario, cliente) no chocan con la restricción única.
+            # Orden fijo de filas para que dos envíos concurrentes tomen los bloqueos en el mismo orden
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            stmt = insert(table).values([
+                {'user_id': user_id, 'client_id': client.id, 'count': 1} for user_id in sorted(recipients)
+            ])
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['user_id', 'client_id'], set_={'count': table.c.count + 1}
+            ))
+            return
+
+        UnreadMessageCounter.query.filter(
+            UnreadMessageCounter.client_id == client.id,
+            UnreadMessageCounter.user_id.in_(recipients)
+        ).update({UnreadMessageCounter.count: UnreadMessageCounter.count + 1}, synchronize_session=False)
+
+        existing = {
+            row.user_id for row in db.session.query(UnreadMessageCounter.user_id).filter(
+                UnreadMessageCounter.client_id == client.id,
+                UnreadMessageCounter.user_id.in_(recipients)
+            )
+        }
+        for user_id in recipients - existing:
+            db.session.add(UnreadMessageCounter(user_id=user_id, client_id=client.id, count=1))
+
+    @staticmethod
+    def refresh_client(client_id: int) -> None:
+        """
+        Recomputes the unread counters of a client from the CaseMessage table.
+        Used after messages are marked as read or when the case is reassigned.
+        Does not commit.
+        """
+        client = Client.query.get(client_id)
+        if not client:
+            return
+
+        unread_by_sender = dict(
+            db.session.query(CaseMessage.sender_id, func.count(CaseMessage.id)).filter(
+                CaseMessage.client_id == client_id,
+                CaseMessage.is_read_by_recipient == False
+            ).group_by(CaseMessage.sender_id).all()
+        )
+        total_unread = sum(unread_by_sender.values())
+
+        recipients = NotificationService.get_recipient_ids(client)
+        counters = {c.user_id: c for c in UnreadMessageCounter.query.filter_by(client_id=client_id).all()}
+
+        for user_id, counter in counters.items():
+            if user_id not in recipients:
+                db.session.delete(counter)
+
+        for user_id in recipients:
+            count = total_unread - unread_by_sender.get(user_id, 0)
+            counter = counters.get(user_id)
+            if counter:
+                counter.count = count
+            elif count > 0:
+                db.session.add(UnreadMessageCounter(user_id=user_id, client_id=client_id, count=count))
+
+    @staticmethod
+    def refresh_clients(client_ids: Iterable[int]) -> None:
+        """
+        Recomputes the unread counters of many clients at once (mass reassignment, full
+        rebuild): per chunk of clients, one DELETE of their counters and one
+        INSERT ... SELECT over CaseMessage grouped by (client, recipient). Same result as
+        refresh_client on each, except that counters at zero are not kept. Does not commit.
+        """
+        client_ids = sorted(set(client_ids))
+        table = UnreadMessageCounter.__table__
+        for start in range(0, len(client_ids), REFRESH_CHUNK):
+            chunk = client_ids[start:start + REFRESH_CHUNK]
+
+            # Destinatarios de cada cliente: el equipo asignado, su usuario del portal y todos los admins
+            assigned = [
+                select(Client.id.label('client_id'), column.label('user_id')).where(
+                    Client.id.in_(chunk), column.isnot(None)
+                )
+                for column in (Client.analista_id, Client.abogado_id, Client.radicador_id,
+                               Client.negociador_id, Client.login_user_id)
+            ]
+            admins = select(Client.id.label('client_id'), User.id.label('user_id')).join(
+                User, User.rol == 'Admin'
+            ).where(Client.id.in_(chunk))
+            recipients = union(*assigned, admins).subquery()
+
+            unread = select(
+                CaseMessage.client_id, CaseMessage.sender_id, func.count(CaseMessage.id).label('unread')
+            ).where(
+                CaseMessage.client_id.in_(chunk), CaseMessage.is_read_by_recipient == False
+            ).group_by(CaseMessage.client_id, CaseMessage.sender_id).subquery()
+
+            # Cada destinatario cuenta los no leídos del cliente que no envió él
+            count = func.sum(case((unread.c.sender_id != recipients.c.user_id, unread.c.unread), else_=0))
+            counts = select(recipients.c.user_id, recipients.c.client_id, count).join(
+                unread, unread.c.client_id == recipients.c.client_id
+            ).group_by(recipients.c.user_id, recipients.c.client_id).having(count > 0)
+
+            db.session.execute(table.delete().where(table.c.client_id.in_(chunk)))
+            db.session.execute(table.insert().from_select(['user_id', 'client_id', 'count'], counts))
+
+    @staticmethod
+    def rebuild_all() -> int:
+        """
+        Rebuilds every counter from scratch. Returns the number of clients processed.
+        """
+        client_ids = [row.client_id for row in db.session.query(CaseMessage.client_id).filter(
+            CaseMessage.is_read_by_recipient == False
+        ).distinct()]
+
+        UnreadMessageCounter.query.delete(synchronize_session=False)
+        NotificationService.refresh_clients(client_ids)
+        db.session.commit()
+        return len(client_ids)
+
+    @staticmethod
+    def get_unread_summary(user) -> Dict[str, Any]:
+        """
+        Returns {'count': int, 'clients': {client_id: {'name', 'count', 'id'}}} for the navbar,
+        reading only the user's counter rows.
+        """
+        summary = {'count': 0, 'clients': {}}
+        if user.rol != 'Cliente' and user.rol not in STAFF_ROLES:
+            return summary
+
+        query = db.session.query(
+            UnreadMessageCounter.client_id, UnreadMessageCounter.count, Client.nombre
+        ).join(Client, Client.id == UnreadMessageCounter.client_id).filter(
+            UnreadMessageCounter.user_id == user.id,
+            UnreadMessageCounter.count > 0
+        )
+
+        # Los contadores de asignaciones antiguas se descartan hasta el próximo refresh del cliente
+        if user.rol == 'Cliente':
+            query = query.filter(Client.login_user_id == user.id)
+        elif user.rol != 'Admin':
+            query = query.filter(
+                or_(
+                    Client.analista_id == user.id,
+                    Client.abogado_id == user.id,
+                    Client.radicador_id == user.id,
+                    Client.negociador_id == user.id
+                )
+            )
+
+        for client_id, count, nombre in query.all():
+            summary['count'] += count
+            summary['clients'][client_id] = {
+                'name': 'Mi Abogado' if user.rol == 'Cliente' else nombre,
+                'count': count,
+                'id': client_id
+            }
+        return summary
+
+    @staticmethod
+    def get_unread_signature(user) -> Tuple:
+        """
+        Cheap version stamp of the user's unread state: their (client_id, count) counter rows,
+        read from the counter table alone through its user_id index. The SSE stream only
+        builds the feed when it changes.
+        """
+        rows = db.session.query(UnreadMessageCounter.client_id, UnreadMessageCounter.count).filter(
+            UnreadMessageCounter.user_id == user.id,
+            UnreadMessageCounter.count > 0
+        ).order_by(UnreadMessageCounter.client_id).all()
+        return tuple((client_id, count) for client_id, count in rows)
+
+    @staticmethod
+    def feed_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Changes between two feeds for the SSE stream: the new total, the grouped entries that
+        changed (None for the ones that disappeared) and only the notifications not sent before.
+        Returns None when nothing the navbar shows changed.
+        """
+        grouped = {
+            client_id: info for client_id, info in current['grouped'].items()
+            if previous['grouped'].get(client_id) != info
+        }
+        grouped.update({client_id: None for client_id in previous['grouped'] if client_id not in current['grouped']})
+        sent_ids = {notif['id'] for notif in previous['notifications']}
+        notifications = [notif for notif in current['notifications'] if notif['id'] not in sent_ids]
+        if not grouped and not notifications and current['count'] == previous['count']:
+            return None
+        return {'delta': True, 'count': current['count'], 'grouped': grouped, 'notifications': notifications}
+
+    @staticmethod
+    def get_unread_feed(user) -> Dict[str, Any]:
+        """
+        Builds the payload of /api/notifications/unread: the latest 50 unread messages
+        plus the per-client grouping used by the navbar dropdown.
+        """
+        notifications_list = []
+        grouped = {}
+
+        if user.rol == 'Cliente':
+            user_client = Client.query.filter_by(login_user_id=user.id).first()
+            if user_client:
+                unread_msgs = CaseMessage.query.filter(
+                    CaseMessage.client_id == user_client.id,
+                    CaseMessage.sender_id != user.id,
+                    CaseMessage.is_read_by_recipient == False
+                ).order_by(CaseMessage.timestamp.desc()).limit(50).all()
+
+                for msg in unread_msgs:
+                    notifications_list.append({
+                        'id': msg.id,
+                        'sender': 'Mi Abogado',
+                        'message': msg.content[:50] + ('...' if len(msg.content) > 50 else ''),
+                        'client_id': user_client.id,
+                        'url': url_for('main.client_portal')
+                    })
+
+                if unread_msgs:
+                    grouped[str(user_client.id)] = {
+                        'name': 'Mi Abogado',
+                        'count': len(unread_msgs),
+                        'url': url_for('main.client_portal')
+                    }
+
+        elif user.rol in STAFF_ROLES:
+            query = CaseMessage.query.options(joinedload(CaseMessage.client)).filter(
+                CaseMessage.sender_id != user.id,
+                CaseMessage.is_read_by_recipient == False
+            )
+            if user.rol != 'Admin':
+                query = query.join(Client).filter(
+                    or_(
+                        Client.analista_id == user.id,
+                        Client.abogado_id == user.id,
+                        Client.radicador_id == user.id,
+                        Client.negociador_id == user.id
+                    )
+                )
+
+            unread_msgs = query.order_by(CaseMessage.timestamp.desc()).limit(50).all()
+            for msg in unread_msgs:
+                sender_name = msg.client.nombre if msg.client else "Cliente Desconocido"
+                notifications_list.append({
+                    'id': msg.id,
+                    'sender': sender_name,
+                    'message': msg.content[:50] + ('...' if len(msg.content) > 50 else ''),
+                    'client_id': msg.client_id,
+                    'url': url_for('main.client_detail', client_id=msg.client_id)
+                })
+
+                c_id = str(msg.client_id)
+                if c_id not in grouped:
+                    grouped[c_id] = {
+                        'name': sender_name,
+                        'count': 0,
+                        'url': url_for('main.client_detail', client_id=msg.client_id)
+                    }
+                grouped[c_id]['count'] += 1
+
+        return {'count': len(notifications_list), 'notifications': notifications_list, 'grouped': grouped}
@@ -1,6 +1,6 @@
 from models import db, Client, PaymentDiagnosis, PaymentContract, ContractInstallment, AllyPayment
 from typing import Dict, Any
-from datetime import datetime
+from datetime import date, datetime
 import os
 from werkzeug.utils import secure_filename
 from flask import current_app
@@ -161,24 +161,18 @@ class PaymentService:
         db.session.commit()
 
     @staticmethod
-    def check_and_update_arrears(client_id: int) -> None:
+    def sweep_arrears(today: date = None) -> int:
         """
-        automatically checks for overdue pending installments and marks them as 'En Mora'.
-        """
-        client = Client.query.get_or_404(client_id)
-        contract = client.payment_contract
-        
-        if not contract or not contract.installments:
-            return
-
-        today = datetime.now().date()
-        changed = False
+        Marks every pending installment past its due date as 'En Mora', across all contracts,
+        with a single UPDATE. Meant to run daily from `flask sweep-arrears` or the in-process scheduler.
 
-        for inst in contract.installments:
-            if inst.estado == 'Pendiente' and inst.fecha_vencimiento:
-                if inst.fecha_vencimiento < today:
-                    inst.estado = 'En Mora'
-                    changed = True
-        
-        if changed:
-            db.session.commit()
+        Returns:
+            int: Number of installments moved to 'En Mora'.
+        """
+        today = today or datetime.now().date()
+        updated = ContractInstallment.query.filter(
+            ContractInstallment.estado == 'Pendiente',
+            ContractInstallment.fecha_vencimiento < today
+        ).update({ContractInstallment.estado: 'En Mora'}, synchronize_session=False)
+        db.session.commit()
+        return updated
@@ -0,0 +1,255 @@
+from models import db, PdfJob, Client, ContractInstallment, Document
+from services.document_storage import DocumentStorage
+from services.financial_service import FinancialService
+from services.pdf_service import PDFService
+from services.receipt_service import ReceiptService, RECEIPT_TEMPLATE
+from services.report_cache import ReportCache
+from datetime import datetime, timedelta
+from flask import current_app, has_request_context
+from typing import Any, Dict, Optional
+import contextlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'Pendiente'
+RUNNING = 'Procesando'
+DONE = 'Listo'
+FAILED = 'Error'
+ACTIVE_STATES = (PENDING, RUNNING)
+
+COMPROBANTE = 'comprobante'
+BALANCE_GENERAL = 'balance_general'
+COMPROBANTES_LOTE = 'comprobantes_lote'
+# Roles que pueden ver los trabajos de otro usuario según el tipo (el balance es un reporte compartido)
+SHARED_ROLES = {BALANCE_GENERAL: ('Admin', 'Abogado')}
+
+class PdfJobService:
+    """
+    Database-backed queue of PDFs rendered outside the web workers.
+
+    The views validate the request, enqueue a PdfJob and answer at once; 'flask pdf-worker'
+    claims pending jobs one at a time, renders them with PDFService and stores the result
+    (a client Document for receipts, the report cache file for the balance, an Excel summary
+    for a receipt batch). The pages poll the job status endpoint until it is ready. With
+    PDF_JOBS_INLINE the job is rendered in the same request, for development without a worker.
+    """
+
+    @staticmethod
+    def enqueue(tipo: str, params: Dict[str, Any], user_id: int, client_id: Optional[int] = None,
+                params_hash: Optional[str] = None) -> PdfJob:
+        """
+        Queues a job and commits it. With params_hash, an active job of the same type and
+        hash is returned instead of queueing a duplicate.
+        """
+        if params_hash:
+            existing = PdfJob.query.filter(
+                PdfJob.tipo == tipo, PdfJob.params_hash == params_hash, PdfJob.estado.in_(ACTIVE_STATES)
+            ).order_by(PdfJob.id).first()
+            if existing:
+                return existing
+
+        job = PdfJob(
+            tipo=tipo,
+            estado=PENDING,
+            params=json.dumps(params, default=str),
+            params_hash=params_hash,
+            requested_by_id=user_id,
+            client_id=client_id,
+            attempts=0,
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        if current_app.config.get('PDF_JOBS_INLINE'):
+            PdfJobService.run(job)
+        return job
+
+    @staticmethod
+    def can_access(job: PdfJob, user) -> bool:
+        if user.rol == 'Admin' or job.requested_by_id == user.id:
+            return True
+        if job.tipo == COMPROBANTE and job.client is not None:
+            # El trabajo de un comprobante se reutiliza entre quienes pueden generarlo para ese cliente
+            return ((user.rol == 'Analista' and job.client.analista_id == user.id) or
+                    (user.rol == 'Abogado' and job.client.abogado_id == user.id))
+        return user.rol in SHARED_ROLES.get(job.tipo, ())
+
+    @staticmethod
+    def file_path(job: PdfJob) -> Optional[str]:
+        """
+        File of a finished balance or batch job (receipts are served as documents).
+        """
+        if job.estado != DONE or job.tipo == COMPROBANTE or not job.result_filename:
+            return None
+        return os.path.join(current_app.config['UPLOAD_FOLDER'], job.result_filename)
+
+    @staticmethod
+    def claim_next() -> Optional[PdfJob]:
+        """
+        Takes the oldest pending job and marks it Procesando. The conditional UPDATE makes
+        the claim safe with several workers: only one of them changes the row.
+        """
+        while True:
+            job_id = db.session.query(PdfJob.id).filter_by(estado=PENDING).order_by(PdfJob.id).limit(1).scalar()
+            if job_id is None:
+                return None
+            claimed = PdfJob.query.filter_by(id=job_id, estado=PENDING).update({
+                'estado': RUNNING,
+                'started_at': datetime.utcnow(),
+                'attempts': PdfJob.attempts + 1,
+            }, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return db.session.get(PdfJob, job_id)
+
+    @staticmethod
+    def heartbeat(job: PdfJob) -> None:
+        """
+        Refreshes started_at of a long job between steps, so requeue_stale does not take it
+        for a dead worker. Raises if the job was requeued or claimed by another worker
+        meanwhile; the caller rolls back the step in progress.
+        """
+        alive = PdfJob.query.filter_by(id=job.id, estado=RUNNING, attempts=job.attempts).update(
+            {'started_at': datetime.utcnow()}, synchronize_session=False
+        )
+        if not alive:
+            raise RuntimeError('El trabajo fue reasignado a otro worker.')
+
+    @staticmethod
+    def requeue_stale(timeout: timedelta, max_attempts: int) -> int:
+        """
+        Jobs left in Procesando by a worker that died: back to Pendiente, or Error after
+        max_attempts. Long jobs (receipt batches) refresh started_at through heartbeat, so
+        `timeout` bounds one of their steps, not the whole job. Returns the number of jobs touched.
+        """
+        cutoff = datetime.utcnow() - timeout
+        stale = PdfJob.query.filter(PdfJob.estado == RUNNING, PdfJob.started_at < cutoff)
+        failed = stale.filter(PdfJob.attempts >= max_attempts).update({
+            'estado': FAILED,
+            'error': 'Se agotó el tiempo de generación del PDF.',
+            'finished_at': datetime.utcnow(),
+        }, synchronize_session=False)
+        requeued = stale.filter(PdfJob.attempts < max_attempts).update(
+            {'estado': PENDING}, synchronize_session=False
+        )
+        db.session.commit()
+        return failed + requeued
+
+    @staticmethod
+    def purge_finished(older_than: timedelta) -> int:
+        """
+        Deletes finished jobs older than `older_than`, and the Excel summaries of receipt
+        batches with them. Other PDFs are kept: receipts are documents and the balance
+        file belongs to the report cache.
+        """
+        cutoff = datetime.utcnow() - older_than
+        finished = PdfJob.query.filter(PdfJob.estado.in_((DONE, FAILED)), PdfJob.finished_at < cutoff)
+
+        summaries = [path for (path,) in finished.filter(
+            PdfJob.tipo == COMPROBANTES_LOTE, PdfJob.result_filename.isnot(None)
+        ).with_entities(PdfJob.result_filename)]
+        deleted = finished.delete(synchronize_session=False)
+        db.session.commit()
+
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        for relative in summaries:
+            try:
+                os.remove(os.path.join(upload_folder, relative))
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    @staticmethod
+    def run(job: PdfJob) -> bool:
+        """
+        Renders a claimed (or inline) job and records the result. Returns True on success.
+        """
+        job_id, attempts = job.id, job.attempts
+        params = json.loads(job.params or '{}')
+        try:
+            # render_template y url_for necesitan una petición; el worker usa una ficticia
+            context = contextlib.nullcontext() if has_request_context() else current_app.test_request_context()
+            with context:
+                if job.tipo == COMPROBANTE:
+                    result = PdfJobService._render_comprobante(job, params)
+                elif job.tipo == BALANCE_GENERAL:
+                    result = PdfJobService._render_balance(job, params)
+                elif job.tipo == COMPROBANTES_LOTE:
+                    result = PdfJobService._render_receipt_batch(job, params)
+                else:
+                    raise ValueError(f'Tipo de trabajo desconocido: {job.tipo}')
+            job.estado = DONE
+            job.result_filename = result
+            job.error = None
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("Error generando el PDF del trabajo %s", job_id)
+            # Si otro worker ya tomó el trabajo (attempts cambió), el error no es de su intento
+            PdfJob.query.filter_by(id=job_id, attempts=attempts).update({
+                'estado': FAILED,
+                'error': str(e)[:1000],
+                'finished_at': datetime.utcnow(),
+            }, synchronize_session=False)
+            db.session.commit()
+            return False
+
+    @staticmethod
+    def _render_comprobante(job: PdfJob, params: Dict[str, Any]) -> str:
+        """
+        Renders a payment receipt and saves it as a document visible to the client.
+        """
+        client = db.session.get(Client, job.client_id)
+        if client is None:
+            raise ValueError('El cliente ya no existe.')
+        tipo = params['tipo']
+
+        if tipo == 'analisis':
+            payment = client.payment_diagnosis
+            if not payment:
+                raise ValueError('El cliente no tiene un pago de análisis registrado.')
+        elif tipo == 'cuota':
+            payment = db.session.get(ContractInstallment, params['installment_id'])
+            if payment is None or payment.payment_contract.client_id != client.id:
+                raise ValueError('La cuota no pertenece a este cliente.')
+            # La cuota queda Pagada en la misma transacción que el comprobante
+            payment.estado = 'Pagada'
+        else:
+            raise ValueError('Tipo de comprobante inválido.')
+
+        context = ReceiptService.context(client, tipo, payment, params['generated_by'], params['generation_date'])
+        pdf_buffer = PDFService.generate_pdf(RECEIPT_TEMPLATE, context)
+
+        filename = ReceiptService.filename(client, tipo)
+        blob = DocumentStorage.store(pdf_buffer)
+        db.session.add(Document(**ReceiptService.document_values(
+            client, tipo, payment, filename, blob.sha256, job.requested_by_id
+        )))
+        return filename
+
+    @staticmethod
+    def _render_receipt_batch(job: PdfJob, params: Dict[str, Any]) -> str:
+        """
+        Generates the missing receipts of a period and returns the path of its Excel summary.
+        """
+        rows = ReceiptService.generate_batch(params['start_date'], params['end_date'],
+                                             job.requested_by_id, params['generated_by'],
+                                             heartbeat=lambda: PdfJobService.heartbeat(job))
+        return ReceiptService.write_summary(rows, params['start_date'], params['end_date'], job.id)
+
+    @staticmethod
+    def _render_balance(job: PdfJob, params: Dict[str, Any]) -> str:
+        """
+        Renders the general balance for the job's period into the report cache, under the
+        key (range and data version) computed when it was queued.
+        """
+        context = FinancialService.get_balance_pdf_context(params.get('start_date'), params.get('end_date'))
+        pdf_buffer = PDFService.generate_pdf('balance_pdf.html', context)
+        path = ReportCache.save(BALANCE_GENERAL, job.params_hash, pdf_buffer,
+                                params['start_date'], params['end_date'])
+        return os.path.relpath(path, current_app.config['UPLOAD_FOLDER'])
@@ -2,8 +2,19 @@ import os
 from xhtml2pdf import pisa
 from io import BytesIO
 from datetime import datetime
-from typing import Dict, Any
-from flask import render_template
+from functools import partial
+from typing import Dict, Any, Tuple
+from urllib.parse import urlsplit
+from flask import current_app, render_template
+
+def _local_static(static_folder: str, prefix: str, uri: str, rel: str) -> str:
+    # Función de módulo (no closure) para poder enviarla a los procesos de PDFService.html_to_pdf
+    path = urlsplit(uri).path
+    if path.startswith(prefix):
+        local = os.path.join(static_folder, path[len(prefix):])
+        if os.path.isfile(local):
+            return local
+    return uri
 
 class PDFService:
     @staticmethod
@@ -12,44 +23,26 @@ class PDFService:
         Generates a PDF buffer from a template and context.
         """
         html = render_template(template_name, **context)
-        buffer = BytesIO()
-        pisa_status = pisa.CreatePDF(html, dest=buffer)
-        
-        if pisa_status.err:
-            raise Exception(f"Error generating PDF: {pisa_status.err}")
-        
-        buffer.seek(0)
-        return buffer
+        return BytesIO(PDFService.html_to_pdf(html, PDFService.static_paths()))
 
     @staticmethod
-    def get_cached_report(report_name: str, params_hash: str) -> str:
+    def static_paths() -> Tuple[str, str]:
         """
-        Checks if a cached version of the report exists for the given params.
+        (static folder, static URL prefix) of the app, for html_to_pdf.
         """
-        cache_dir = os.path.join('uploads', 'reports')
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir, exist_ok=True)
-        
-        filename = f"{report_name}_{params_hash}.pdf"
-        file_path = os.path.join(cache_dir, filename)
-        
-        if os.path.exists(file_path):
-            return file_path
-        return None
+        return current_app.static_folder, current_app.static_url_path.rstrip('/') + '/'
 
     @staticmethod
-    def save_pdf_to_cache(report_name: str, params_hash: str, buffer: BytesIO) -> str:
+    def html_to_pdf(html: str, static_paths: Tuple[str, str]) -> bytes:
         """
-        Saves a PDF buffer to the cache directory.
+        Converts rendered HTML to PDF bytes. Needs no app context, so it can run in a
+        process pool. Files under /static/ are read from disk instead of over HTTP, so
+        templates can use url_for(..., _external=True) in the PDF worker, which has no real host.
         """
-        cache_dir = os.path.join('uploads', 'reports')
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir, exist_ok=True)
-            
-        filename = f"{report_name}_{params_hash}.pdf"
-        file_path = os.path.join(cache_dir, filename)
-        
-        with open(file_path, 'wb') as f:
-            f.write(buffer.getvalue())
-            
-        return file_path
+        buffer = BytesIO()
+        pisa_status = pisa.CreatePDF(html, dest=buffer, link_callback=partial(_local_static, *static_paths))
+
+        if pisa_status.err:
+            raise Exception(f"Error generating PDF: {pisa_status.err}")
+
+        return buffer.getvalue()
@@ -0,0 +1,246 @@
+from models import db, Client, ContractInstallment, Document, PaymentContract, PaymentDiagnosis, StoredBlob
+from services.document_storage import DocumentStorage
+from services.pdf_service import PDFService
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from flask import current_app, render_template
+from io import BytesIO
+from openpyxl import Workbook
+from sqlalchemy import exists, insert, update
+from sqlalchemy.orm import joinedload
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import multiprocessing
+import os
+import uuid
+
+COMPANY_NAME = 'MC Innovación Financiera S.A.S'
+RECEIPT_TEMPLATE = 'comprobantes/receipt_pdf.html'
+SUMMARY_DIR = 'comprobantes_lote'
+# Comprobantes renderizados por tanda: acota la memoria del proceso con periodos grandes
+BATCH_CHUNK = 50
+# Con menos comprobantes no compensa arrancar el pool de procesos
+POOL_MIN_RECEIPTS = 10
+
+class ReceiptService:
+    """
+    Payment receipts (comprobantes): one at a time from the comprobantes page, or for every
+    paid installment and verified analysis payment of a period that has none yet.
+
+    A receipt Document records the payment it acknowledges (payment_diagnosis_id or
+    contract_installment_id), which is how the batch knows what is still missing.
+    """
+
+    @staticmethod
+    def context(client: Client, tipo: str, payment, generated_by: str, generation_date: str) -> Dict[str, Any]:
+        """
+        Template context of receipt_pdf.html. `payment` is the client's PaymentDiagnosis for
+        tipo 'analisis' or a ContractInstallment for tipo 'cuota'.
+        """
+        context = {
+            'client': client,
+            'generation_date': generation_date,
+            'company_name': COMPANY_NAME,
+            'generated_by': generated_by,
+            'tipo': tipo
+        }
+
+        if tipo == 'analisis':
+            context['concepto'] = 'Pago de Análisis'
+            context['valor'] = payment.valor
+            context['fecha_pago'] = payment.fecha_pago
+            context['metodo_pago'] = payment.metodo_pago
+        elif tipo == 'cuota':
+            context['concepto'] = payment.concepto or f"Cuota {payment.numero_cuota}"
+            context['valor'] = payment.valor
+            context['fecha_pago'] = payment.fecha_vencimiento
+            context['metodo_pago'] = payment.metodo_pago
+        else:
+            raise ValueError('Tipo de comprobante inválido.')
+
+        # IVA si el cliente es responsable
+        if client.es_responsable_iva:
+            valor_float = float(context['valor'] or 0)
+            context['base_imponible'] = valor_float / 1.19
+            context['iva_amount'] = valor_float - context['base_imponible']
+        else:
+            context['base_imponible'] = float(context['valor'] or 0)
+            context['iva_amount'] = 0
+        return context
+
+    @staticmethod
+    def filename(client: Client, tipo: str) -> str:
+        prefix = 'Comprobante_Analisis' if tipo == 'analisis' else 'Comprobante_Contrato'
+        return f"{prefix}_{client.numero_id}_{uuid.uuid4().hex[:8]}.pdf"
+
+    @staticmethod
+    def document_values(client: Client, tipo: str, payment, filename: str, sha256: str, user_id: int) -> Dict[str, Any]:
+        """
+        Column values of the Document of a receipt, visible to the analyst and the client.
+        """
+        return {
+            'filename': filename,
+            'blob_sha256': sha256,
+            'client_id': client.id,
+            'uploaded_by_id': user_id,
+            'visible_para_analista': True,
+            'visible_para_cliente': True,
+            'payment_diagnosis_id': payment.id if tipo == 'analisis' else None,
+            'contract_installment_id': payment.id if tipo == 'cuota' else None,
+            'created_at': datetime.utcnow(),
+        }
+
+    @staticmethod
+    def pending(start_date: str, end_date: str) -> List[Tuple[str, Client, Any]]:
+        """
+        (tipo, client, payment) of the verified analysis payments and paid installments dated
+        in [start_date, end_date] that have no receipt document.
+
+        Receipts generated before documents were linked to their payment are only recognised
+        for the analysis payment (one per client, by file name); installments cannot be told apart.
+        """
+        diagnoses = PaymentDiagnosis.query.options(joinedload(PaymentDiagnosis.client)).filter(
+            PaymentDiagnosis.verificado == True,
+            PaymentDiagnosis.fecha_pago >= start_date,
+            PaymentDiagnosis.fecha_pago <= end_date,
+            ~exists().where(Document.payment_diagnosis_id == PaymentDiagnosis.id),
+            ~exists().where(Document.client_id == PaymentDiagnosis.client_id,
+                            Document.filename.like('Comprobante_Analisis_%'))
+        ).order_by(PaymentDiagnosis.fecha_pago, PaymentDiagnosis.id).all()
+
+        installments = ContractInstallment.query.options(
+            joinedload(ContractInstallment.payment_contract).joinedload(PaymentContract.client)
+        ).filter(
+            ContractInstallment.estado == 'Pagada',
+            ContractInstallment.fecha_vencimiento >= start_date,
+            ContractInstallment.fecha_vencimiento <= end_date,
+            ~exists().where(Document.contract_installment_id == ContractInstallment.id)
+        ).order_by(ContractInstallment.fecha_vencimiento, ContractInstallment.id).all()
+
+        return ([('analisis', diag.client, diag) for diag in diagnoses] +
+                [('cuota', inst.payment_contract.client, inst) for inst in installments])
+
+    @staticmethod
+    def generate_batch(start_date: str, end_date: str, user_id: int, generated_by: str,
+                       workers: Optional[int] = None,
+                       heartbeat: Optional[Callable[[], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Renders the receipts of every pending payment of the period and registers their
+        documents with one bulk insert per chunk of BATCH_CHUNK payments.
+
+        The HTML is rendered here (it needs the app and the database); the xhtml2pdf
+        conversion, which is the slow part, runs in a pool of `workers` processes
+        (RECEIPT_BATCH_WORKERS, default one per CPU). A payment that fails is reported in
+        the summary and does not stop the others.
+
+        Each chunk is committed on its own, after calling `heartbeat` (the PDF job uses it to
+        show it is still alive), so a retry after an interruption skips the receipts already
+        registered.
+
+        Returns:
+            One summary row per payment (client, concept, value, document or error).
+        """
+        workers = workers or current_app.config.get('RECEIPT_BATCH_WORKERS') or os.cpu_count() or 1
+        pending = ReceiptService.pending(start_date, end_date)
+        generation_date = datetime.now().strftime('%Y-%m-%d %H:%M')
+        static_paths = PDFService.static_paths()
+
+        rows = []
+        session = db.session()
+        # Los clientes y pagos de pending() se siguen leyendo después de cada commit
+        expire_on_commit, session.expire_on_commit = session.expire_on_commit, False
+        # 'spawn': los procesos no heredan las conexiones abiertas a la base de datos
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) \
+            if workers > 1 and len(pending) >= POOL_MIN_RECEIPTS else None
+        try:
+            for offset in range(0, len(pending), BATCH_CHUNK):
+                rendered = []
+                for tipo, client, payment in pending[offset:offset + BATCH_CHUNK]:
+                    row = ReceiptService._summary_row(tipo, client, payment)
+                    rows.append(row)
+                    try:
+                        context = ReceiptService.context(client, tipo, payment, generated_by, generation_date)
+                        rendered.append((row, tipo, client, payment, render_template(RECEIPT_TEMPLATE, **context)))
+                    except Exception as e:
+                        row.update(estado='Error', detalle=str(e))
+
+                if pool:
+                    results = [pool.submit(PDFService.html_to_pdf, html, static_paths) for *_, html in rendered]
+                else:
+                    results = [html for *_, html in rendered]
+
+                documents = []
+                for (row, tipo, client, payment, _), result in zip(rendered, results):
+                    try:
+                        pdf = result.result() if pool else PDFService.html_to_pdf(result, static_paths)
+                        blob = DocumentStorage.store(BytesIO(pdf))
+                        filename = ReceiptService.filename(client, tipo)
+                        documents.append(ReceiptService.document_values(client, tipo, payment, filename, blob.sha256, user_id))
+                        row.update(estado='Generado', documento=filename)
+                    except Exception as e:
+                        row.update(estado='Error', detalle=str(e))
+
+                ReceiptService._insert_documents(documents)
+                if heartbeat:
+                    heartbeat()
+                db.session.commit()
+        finally:
+            session.expire_on_commit = expire_on_commit
+            if pool:
+                pool.shutdown()
+        return rows
+
+    @staticmethod
+    def _insert_documents(documents: List[Dict[str, Any]]) -> None:
+        if not documents:
+            return
+        db.session.execute(insert(Document), documents)
+        # La inserción masiva no pasa por los eventos de DocumentStorage: se cuentan aquí las referencias
+        for sha256, count in Counter(doc['blob_sha256'] for doc in documents).items():
+            db.session.execute(update(StoredBlob).where(StoredBlob.sha256 == sha256).values(
+                ref_count=StoredBlob.ref_count + count
+            ))
+
+    @staticmethod
+    def _summary_row(tipo: str, client: Client, payment) -> Dict[str, Any]:
+        if tipo == 'analisis':
+            concepto, fecha = 'Pago de Análisis', payment.fecha_pago
+        else:
+            concepto, fecha = payment.concepto or f"Cuota {payment.numero_cuota}", payment.fecha_vencimiento
+        return {
+            'cliente': client.nombre,
+            'identificacion': f"{client.tipo_id or ''} {client.numero_id or ''}".strip(),
+            'tipo': 'Análisis' if tipo == 'analisis' else 'Cuota',
+            'concepto': concepto,
+            'valor': float(payment.valor or 0),
+            'fecha': fecha,
+            'documento': None,
+            'estado': 'Pendiente',
+            'detalle': None,
+        }
+
+    @staticmethod
+    def write_summary(rows: List[Dict[str, Any]], start_date: str, end_date: str, job_id: int) -> str:
+        """
+        Saves the batch summary as an Excel file under uploads/comprobantes_lote.
+        Returns its path relative to UPLOAD_FOLDER.
+        """
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Comprobantes')
+        sheet.append([f"Comprobantes del {start_date} al {end_date}"])
+        sheet.append(['Cliente', 'Identificación', 'Tipo', 'Concepto', 'Valor', 'Fecha de pago',
+                      'Documento', 'Estado', 'Detalle'])
+        for row in rows:
+            sheet.append([row['cliente'], row['identificacion'], row['tipo'], row['concepto'], row['valor'],
+                          row['fecha'], row['documento'], row['estado'], row['detalle']])
+
+        generated = [row for row in rows if row['estado'] == 'Generado']
+        sheet.append([])
+        sheet.append(['Generados', len(generated), '', 'Valor total', sum(row['valor'] for row in generated)])
+        sheet.append(['Con error', len(rows) - len(generated)])
+
+        relative = os.path.join(SUMMARY_DIR, f"Resumen_Comprobantes_{start_date}_{end_date}_{job_id}.xlsx")
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        workbook.save(path)
+        return relative
@@ -0,0 +1,291 @@
+from models import db, Client, ContractInstallment, Expense, PaymentContract, PaymentDiagnosis, ReportDataVersion
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import BinaryIO, Dict, Iterable, Optional, Set
+import hashlib
+import os
+import tempfile
+
+REPORTS_DIR = 'reports'
+# Primera parte de la clave (el rango de fechas); la segunda es el hash de las versiones de sus meses
+RANGE_HASH_LEN = 16
+
+def _month(value) -> Optional[str]:
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m')
+    return None
+
+class ReportCache:
+    """
+    On-disk cache of generated report PDFs under uploads/reports, keyed on the date range
+    plus the data version of every month in it.
+
+    ReportDataVersion keeps one counter per month. Mapper events on PaymentDiagnosis,
+    ContractInstallment and Expense (and the PaymentContract / Client fields the balance
+    shows) collect the months whose rows change, and one upsert per month bumps them in the
+    same transaction. A change in March gives every range that includes March a new key, so
+    the old file is never served again; ranges that exclude March keep their cache.
+
+    Bulk UPDATEs skip the mapper events. The only one on these tables is the arrears sweep,
+    and the balance does not read the 'En Mora' state.
+
+    The directory is bounded by REPORT_CACHE_MAX_BYTES: every hit refreshes the file's mtime
+    and saving evicts the least recently used files above the limit. A finished balance job
+    whose file was evicted or purged sends its download back to the balance view, which
+    serves the current version or renders it again.
+    """
+
+    @staticmethod
+    def init_app(app) -> None:
+        for model in (PaymentDiagnosis, ContractInstallment, Expense, PaymentContract, Client):
+            event.listen(model, 'after_insert', ReportCache._on_write)
+            event.listen(model, 'after_update', ReportCache._on_update)
+            event.listen(model, 'after_delete', ReportCache._on_write)
+        event.listen(db.session, 'after_flush', ReportCache._bump_pending)
+
+    @staticmethod
+    def cache_dir() -> str:
+        return os.path.join(current_app.config['UPLOAD_FOLDER'], REPORTS_DIR)
+
+    # --- Versiones de datos ---
+
+    @staticmethod
+    def _months_of(connection, target, updated: bool) -> Set[str]:
+        """
+        Months whose reports depend on the row. For updates, the months of the old values
+        count too (a payment moved from March to April changes both).
+        """
+        state = inspect(target)
+
+        def values(attr):
+            found = [getattr(target, attr)]
+            if updated:
+                found.extend(state.attrs[attr].history.deleted)
+            return found
+
+        def changed(*attrs):
+            return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+        if isinstance(target, PaymentDiagnosis):
+            dates = values('fecha_pago')
+        elif isinstance(target, ContractInstallment):
+            dates = values('fecha_vencimiento')
+        elif isinstance(target, Expense):
+            dates = values('fecha')
+        elif isinstance(target, PaymentContract):
+            # Las ventas de contratos se asignan al mes de la primera cuota
+            if updated and not changed('valor_total'):
+                return set()
+            installments = ContractInstallment.__table__
+            dates = connection.execute(select(installments.c.fecha_vencimiento).where(
+                installments.c.payment_contract_id == target.id, installments.c.numero_cuota == 1
+            )).scalars().all()
+        elif isinstance(target, Client):
+            # El PDF muestra el nombre del cliente y calcula impuestos con es_responsable_iva.
+            # Al crear o borrar un cliente cuentan los eventos de sus propios pagos
+            if not updated or not changed('nombre', 'es_responsable_iva'):
+                return set()
+            diagnoses = PaymentDiagnosis.__table__
+            installments = ContractInstallment.__table__
+            contracts = PaymentContract.__table__
+            dates = list(connection.execute(select(diagnoses.c.fecha_pago).where(
+                diagnoses.c.client_id == target.id
+            )).scalars())
+            dates += list(connection.execute(
+                select(installments.c.fecha_vencimiento)
+                .join(contracts, installments.c.payment_contract_id == contracts.c.id)
+                .where(contracts.c.client_id == target.id)
+            ).scalars())
+        else:
+            return set()
+        return {month for month in map(_month, dates) if month}
+
+    @staticmethod
+    def _collect(connection, target, updated: bool) -> None:
+        # Se acumulan los meses del flush y se suben una sola vez en after_flush
+        session = inspect(target).session
+        if session is None:
+            return
+        months = ReportCache._months_of(connection, target, updated)
+        if months:
+            session.info.setdefault('report_months', set()).update(months)
+
+    @staticmethod
+    def _on_write(mapper, connection, target) -> None:
+        ReportCache._collect(connection, target, updated=False)
+
+    @staticmethod
+    def _on_update(mapper, connection, target) -> None:
+        ReportCache._collect(connection, target, updated=True)
+
+    @staticmethod
+    def _bump_pending(session, flush_context) -> None:
+        months = session.info.pop('report_months', None)
+        if months:
+            ReportCache.bump(months, session)
+
+    @staticmethod
+    def bump(months: Iterable[str], session=None) -> None:
+        """
+        Increments the data version of each 'YYYY-MM' in `months` (creating it at 1).
+        """
+        session = session or db.session
+        table = ReportDataVersion.__table__
+        now = datetime.utcnow()
+        dialect = session.get_bind().dialect.name
+        for month in sorted(set(months)):
+            if dialect in ('postgresql', 'sqlite'):
+                insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+                stmt = insert(table).values(periodo=month, version=1, updated_at=now)
+                session.execute(stmt.on_conflict_do_update(
+                    index_elements=['periodo'], set_={'version': table.c.version + 1, 'updated_at': now}
+                ))
+            else:
+                updated = session.execute(table.update().where(table.c.periodo == month).values(
+                    version=table.c.version + 1, updated_at=now
+                )).rowcount
+                if not updated:
+                    session.execute(table.insert().values(periodo=month, version=1, updated_at=now))
+
+    @staticmethod
+    def range_key(start_date: str, end_date: str) -> str:
+        """
+        Cache key of a report over [start_date, end_date] ('YYYY-MM-DD'): 32 hex characters,
+        the range hash followed by the hash of the versions of the months it covers.
+        """
+        range_hash = hashlib.md5(f"{start_date}_{end_date}".encode()).hexdigest()[:RANGE_HASH_LEN]
+        versions = db.session.query(ReportDataVersion.periodo, ReportDataVersion.version).filter(
+            ReportDataVersion.periodo >= start_date[:7],
+            ReportDataVersion.periodo <= end_date[:7]
+        ).order_by(ReportDataVersion.periodo).all()
+        version_str = ','.join(f"{periodo}:{version}" for periodo, version in versions)
+        version_hash = hashlib.md5(version_str.encode()).hexdigest()[:32 - RANGE_HASH_LEN]
+        return range_hash + version_hash
+
+    # --- Archivos ---
+
+    @staticmethod
+    def _path(report_name: str, key: str) -> str:
+        return os.path.join(ReportCache.cache_dir(), f"{report_name}_{key[:RANGE_HASH_LEN]}_{key[RANGE_HASH_LEN:]}.pdf")
+
+    @staticmethod
+    def get(report_name: str, key: str) -> Optional[str]:
+        """
+        Path of the cached report, or None. A hit marks the file as recently used.
+        """
+        path = ReportCache._path(report_name, key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    @staticmethod
+    def save(report_name: str, key: str, buffer: BinaryIO, start_date: str, end_date: str) -> str:
+        """
+        Writes a report into the cache and returns its path. When `key` is still the current
+        key of [start_date, end_date], the older versions of the range are removed; a job
+        that finishes late under a superseded key leaves the newer files alone. Old files
+        over REPORT_CACHE_MAX_BYTES are evicted either way.
+        """
+        cache_dir = ReportCache.cache_dir()
+        os.makedirs(cache_dir, exist_ok=True)
+        path = ReportCache._path(report_name, key)
+
+        # Escritura atómica: una descarga concurrente nunca ve un PDF a medias
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(buffer.getvalue())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if ReportCache.range_key(start_date, end_date) == key:
+            # Solo se borran las versiones escritas antes que esta: un archivo más reciente
+            # es de una versión posterior guardada mientras tanto
+            written_at = os.stat(path).st_mtime
+            range_prefix = f"{report_name}_{key[:RANGE_HASH_LEN]}_"
+            with os.scandir(cache_dir) as entries:
+                for entry in entries:
+                    if not entry.name.startswith(range_prefix) or entry.path == path:
+                        continue
+                    try:
+                        older = entry.stat(follow_symlinks=False).st_mtime <= written_at
+                    except FileNotFoundError:
+                        continue
+                    if older:
+                        ReportCache._remove(entry.path)
+
+        ReportCache.evict(current_app.config.get('REPORT_CACHE_MAX_BYTES', 0), keep=path)
+        return path
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except FileNotFoundError:
+            # Otro proceso ya lo eliminó
+            return 0
+
+    @staticmethod
+    def _entries():
+        cache_dir = ReportCache.cache_dir()
+        if not os.path.isdir(cache_dir):
+            return []
+        files = []
+        with os.scandir(cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False) and entry.name.endswith('.pdf'):
+                    stat = entry.stat(follow_symlinks=False)
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    @staticmethod
+    def evict(max_bytes: int, keep: Optional[str] = None) -> Dict[str, int]:
+        """
+        Deletes the least recently used files until the cache fits in max_bytes (0 = no limit).
+        """
+        removed = {'files': 0, 'bytes': 0}
+        if not max_bytes:
+            return removed
+        files = sorted(ReportCache._entries())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            freed = ReportCache._remove(path)
+            total -= size
+            removed['files'] += 1
+            removed['bytes'] += freed
+        return removed
+
+    @staticmethod
+    def purge() -> Dict[str, int]:
+        """
+        Deletes every cached report (stale temporary files included).
+        """
+        removed = {'files': 0, 'bytes': 0}
+        cache_dir = ReportCache.cache_dir()
+        if not os.path.isdir(cache_dir):
+            return removed
+        with os.scandir(cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    removed['bytes'] += ReportCache._remove(entry.path)
+                    removed['files'] += 1
+        return removed
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        files = ReportCache._entries()
+        return {'files': len(files), 'bytes': sum(size for _, size, _ in files)}
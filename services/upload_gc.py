@@ -0,0 +1,193 @@
+from models import db, Document, AllyPayment, StoredBlob
+from services.document_storage import BLOBS_DIR
+from services.report_cache import REPORTS_DIR
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import exists
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+import os
+import re
+import shutil
+import time
+
+PAYMENTS_DIR = 'pagos_aliados'
+# Nombres de documentos planos: subidas (client_<id>_...) y comprobantes generados
+DOCUMENT_NAME = re.compile(r'^(client_\d+_.+|Comprobante_(Analisis|Contrato)_.+\.pdf)$')
+BATCH_SIZE = 1000
+
+class UploadGC:
+    """
+    Finds files under UPLOAD_FOLDER that no database row references any more:
+    flat documents and blobs of deleted documents or clients, ally payment proofs,
+    interrupted uploads (blobs/tmp) and interrupted report cache writes. The cached reports
+    themselves are left to ReportCache.evict.
+
+    Only files older than the grace period are considered, so uploads in progress and
+    rows that are about to be committed are never touched.
+    """
+
+    @staticmethod
+    def _batched(id_column, value_column, *filters) -> Iterator[str]:
+        """
+        Yields value_column of every row, reading BATCH_SIZE rows per query in id order.
+        """
+        last_id = 0
+        while True:
+            rows = db.session.query(id_column, value_column).filter(
+                id_column > last_id, *filters
+            ).order_by(id_column).limit(BATCH_SIZE).all()
+            if not rows:
+                return
+            for _, value in rows:
+                yield value
+            last_id = rows[-1][0]
+
+    @staticmethod
+    def live_sets() -> Dict[str, Set[str]]:
+        """
+        Names referenced by the database: flat documents, blob hashes and ally payment proofs.
+        """
+        return {
+            'documents': set(UploadGC._batched(Document.id, Document.filename, Document.blob_sha256.is_(None))),
+            'blobs': set(UploadGC._batched(Document.id, Document.blob_sha256, Document.blob_sha256.isnot(None))),
+            'payments': set(UploadGC._batched(AllyPayment.id, AllyPayment.filename)),
+        }
+
+    @staticmethod
+    def _walk(path: str) -> Iterator[os.DirEntry]:
+        # Recorre el árbol con scandir sin armar listas de directorios completos
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from UploadGC._walk(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+    @staticmethod
+    def find_orphans(grace: timedelta, live: Optional[Dict[str, Set[str]]] = None) -> Iterator[Tuple[str, int, str]]:
+        """
+        Streams (relative path, size, reason) for every orphan file older than `grace`.
+        Files in unknown subfolders are left alone.
+        """
+        root = current_app.config['UPLOAD_FOLDER']
+        if not os.path.isdir(root):
+            return
+        live = live if live is not None else UploadGC.live_sets()
+        cutoff = time.time() - grace.total_seconds()
+
+        for entry in UploadGC._walk(root):
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > cutoff:
+                continue
+            relative = os.path.relpath(entry.path, root)
+            parts = relative.split(os.sep)
+
+            if len(parts) == 1:
+                # Solo nombres de documentos: otros archivos sueltos en uploads/ no son de la limpieza
+                if DOCUMENT_NAME.match(entry.name) and entry.name not in live['documents']:
+                    yield relative, stat.st_size, 'documento sin registro'
+            elif parts[0] == BLOBS_DIR:
+                if parts[1] == 'tmp':
+                    yield relative, stat.st_size, 'subida interrumpida'
+                elif entry.name not in live['blobs']:
+                    yield relative, stat.st_size, 'blob sin documentos'
+            elif parts[0] == PAYMENTS_DIR and len(parts) == 2:
+                if entry.name not in live['payments']:
+                    yield relative, stat.st_size, 'comprobante de aliado sin registro'
+            elif parts[0] == REPORTS_DIR and len(parts) == 2 and entry.name.endswith('.tmp'):
+                # Los PDF de la caché los administra ReportCache.evict (LRU); aquí solo escrituras interrumpidas
+                yield relative, stat.st_size, 'reporte a medio escribir'
+
+    @staticmethod
+    def _delete_blob_row(sha256: str, cutoff: datetime) -> Optional[int]:
+        """
+        Deletes the row of an unreferenced blob created before `cutoff` and leaves it locked
+        until the caller commits, after removing the file. Returns the rows deleted (0 for a
+        file without row), or None if a document or a recent upload uses the blob.
+
+        A file without row gets a placeholder row first, so the lock also covers an upload
+        of the same content whose row is not committed yet: DocumentStorage.store waits for
+        this transaction and then writes the file again.
+        """
+        placeholder = {'sha256': sha256, 'size': 0, 'ref_count': 0, 'created_at': cutoff - timedelta(seconds=1)}
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            inserted = db.session.execute(
+                insert(StoredBlob).values(**placeholder).on_conflict_do_nothing(index_elements=['sha256'])
+            ).rowcount
+        elif db.session.get(StoredBlob, sha256) is None:
+            db.session.add(StoredBlob(**placeholder))
+            db.session.flush()
+            inserted = 1
+        else:
+            inserted = 0
+
+        blob = StoredBlob.query.filter(
+            StoredBlob.sha256 == sha256,
+            StoredBlob.created_at < cutoff,
+            ~exists().where(Document.blob_sha256 == StoredBlob.sha256)
+        ).with_for_update().first()
+        if blob is None:
+            return None
+        db.session.delete(blob)
+        db.session.flush()
+        return 0 if inserted else 1
+
+    @staticmethod
+    def collect(grace: timedelta, dry_run: bool = True, move_to: Optional[str] = None,
+                report=None) -> Dict[str, Any]:
+        """
+        Deletes the orphans (or moves them under move_to, keeping their relative path).
+        With dry_run only reports them. `report` is called with each (path, size, reason).
+
+        Blob rows left without documents are deleted too, and their files only when the
+        row delete succeeds, so a blob reused by a concurrent upload is kept.
+        """
+        root = current_app.config['UPLOAD_FOLDER']
+        summary = {'files': 0, 'bytes': 0, 'blob_rows': 0}
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        row_cutoff = datetime.utcnow() - grace
+
+        for relative, size, reason in UploadGC.find_orphans(grace):
+            path = os.path.join(root, relative)
+            sha256 = os.path.basename(relative) if reason == 'blob sin documentos' else None
+
+            if not dry_run and sha256:
+                deleted = UploadGC._delete_blob_row(sha256, row_cutoff)
+                if deleted is None:
+                    # Lo volvió a usar una subida mientras corría la limpieza
+                    db.session.rollback()
+                    continue
+                summary['blob_rows'] += deleted
+
+            if report:
+                report(relative, size, reason)
+            summary['files'] += 1
+            summary['bytes'] += size
+            if dry_run:
+                continue
+
+            try:
+                if move_to:
+                    target = os.path.join(move_to, stamp, relative)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.move(path, target)
+                else:
+                    os.remove(path)
+            except BaseException:
+                db.session.rollback()
+                raise
+            # El borrado de la fila se confirma después del archivo: hasta aquí la fila sigue bloqueada
+            db.session.commit()
+
+        if not dry_run:
+            # Filas de blobs cuyo archivo ya no existía en disco
+            cutoff = datetime.utcnow() - grace
+            summary['blob_rows'] += StoredBlob.query.filter(
+                StoredBlob.created_at < cutoff,
+                ~exists().where(Document.blob_sha256 == StoredBlob.sha256)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        return summary
@@ -2,6 +2,7 @@ from models import db, User, Client
 from sqlalchemy.exc import IntegrityError
 from typing import Dict, Any, Optional
 from werkzeug.security import generate_password_hash
+from utils.user_cache import UserCache
 
 class UserService:
     @staticmethod
@@ -39,6 +40,7 @@ class UserService:
         try:
             db.session.delete(user)
             db.session.commit()
+            UserCache.bump_version()
         except IntegrityError:
             db.session.rollback()
             raise ValueError('No se puede eliminar este usuario porque tiene clientes o registros asignados. Intenta reasignar sus casos primero.')
@@ -57,6 +59,7 @@ class UserService:
         user = User.query.get_or_404(user_id)
         user.password = generate_password_hash(new_password)
         db.session.commit()
+        UserCache.bump_version()
 
     @staticmethod
     def generate_client_access(client_id: int) -> Optional[User]:
@@ -83,12 +86,14 @@ class UserService:
                  # Reactivate if it was disabled
                  existing_user.is_active = True
                  db.session.commit()
+                 UserCache.bump_version()
                  raise ValueError(f'El usuario con email {email} ya existe. Se ha vinculado al cliente y se ha habilitado el acceso.')
             else:
                  # Reactivate if it was disabled
                  if not existing_user.is_active:
                      existing_user.is_active = True
                      db.session.commit()
+                     UserCache.bump_version()
                      return existing_user
                  raise ValueError(f'El usuario con email {email} ya existe y ya está habilitado.')
 
@@ -123,4 +128,5 @@ class UserService:
         if user:
             user.is_active = False
             db.session.commit()
+            UserCache.bump_version()
 
@@ -0,0 +1,43 @@
+// Selector asíncrono de clientes: Select2 consultando /api/clients/lookup mientras se escribe.
+// Requiere jQuery y Select2 cargados en la página.
+//
+// Uso:
+//   <select id="client_id" name="client_id" data-lookup-url="{{ url_for('main.lookup_clients') }}"></select>
+//   initClientLookup('#client_id', { dropdownParent: '#miModal' });
+function initClientLookup(selector, options) {
+    options = options || {};
+    const $select = $(selector);
+
+    const config = {
+        theme: 'bootstrap-5',
+        width: '100%',
+        placeholder: options.placeholder || 'Busque por nombre, cédula o contrato...',
+        allowClear: true,
+        minimumInputLength: 2,
+        ajax: {
+            url: $select.data('lookup-url') || '/api/clients/lookup',
+            dataType: 'json',
+            delay: 250,
+            data: function (params) {
+                return { q: params.term, limit: options.limit || 20 };
+            },
+            processResults: function (data) {
+                return { results: data.results || [] };
+            }
+        },
+        language: {
+            inputTooShort: function () { return 'Escriba al menos 2 caracteres'; },
+            searching: function () { return 'Buscando...'; },
+            noResults: function () { return 'No se encontraron clientes'; },
+            errorLoading: function () { return 'No se pudieron cargar los resultados'; }
+        }
+    };
+
+    // Dentro de un modal de Bootstrap el desplegable debe colgar del modal para recibir el foco
+    if (options.dropdownParent) {
+        config.dropdownParent = $(options.dropdownParent);
+    }
+
+    $select.select2(config);
+    return $select;
+}
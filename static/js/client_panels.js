@@ -0,0 +1,44 @@
+// Paneles diferidos de la ficha del cliente: cada contenedor con data-panel-url se pide al servidor
+// la primera vez que se muestra su pestaña (o al cargar la página si no está dentro de una pestaña).
+// El servidor responde con ETag y Cache-Control: no-cache, así que al volver a la ficha el navegador
+// revalida y recibe un 304 sin cuerpo si el panel no cambió.
+//
+// Uso:
+//   <div data-panel-url="{{ url_for('main.client_panel', client_id=client.id, panel='notes') }}"></div>
+//   document.addEventListener('DOMContentLoaded', initClientPanels);
+function loadClientPanel(container) {
+    if (container.dataset.panelState) return;
+    container.dataset.panelState = 'loading';
+
+    fetch(container.dataset.panelUrl, { credentials: 'same-origin' })
+        .then(res => {
+            if (!res.ok) throw new Error(res.status);
+            return res.text();
+        })
+        .then(html => {
+            container.innerHTML = html;
+            // Los fragmentos llegan sin token CSRF para que su ETag no cambie en cada petición
+            const meta = document.querySelector('meta[name="csrf-token"]');
+            if (meta) {
+                container.querySelectorAll('input[name="csrf_token"]').forEach(input => { input.value = meta.content; });
+            }
+            container.dataset.panelState = 'loaded';
+        })
+        .catch(() => {
+            // Sin estado: se vuelve a intentar la próxima vez que se muestre la pestaña
+            delete container.dataset.panelState;
+            container.innerHTML = '<div class="text-center text-danger py-4">No se pudo cargar la información.</div>';
+        });
+}
+
+function initClientPanels() {
+    document.querySelectorAll('[data-panel-url]').forEach(container => {
+        const pane = container.closest('.tab-pane');
+        if (!pane || pane.classList.contains('active')) loadClientPanel(container);
+    });
+
+    document.addEventListener('shown.bs.tab', function (event) {
+        const pane = document.querySelector(event.target.dataset.bsTarget);
+        if (pane) pane.querySelectorAll('[data-panel-url]').forEach(loadClientPanel);
+    });
+}
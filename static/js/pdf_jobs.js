@@ -0,0 +1,52 @@
+// Espera de PDFs generados en segundo plano ('flask pdf-worker'): consulta el estado del trabajo
+// hasta que termina. Al quedar listo recarga la página (data-pdf-job-ready="reload") o inicia
+// la descarga (data-pdf-job-ready="download"); si falla muestra el error dentro del contenedor.
+//
+// Uso:
+//   <div data-pdf-job-status="{{ url_for('pdf_jobs.job_status', job_id=job.id) }}" data-pdf-job-ready="reload">
+//       <span data-pdf-job-message>Generando...</span>
+//   </div>
+//   document.addEventListener('DOMContentLoaded', initPdfJobs);
+const PDF_JOB_POLL_MS = 1500;
+
+function watchPdfJob(container) {
+    const message = container.querySelector('[data-pdf-job-message]') || container;
+    let delay = PDF_JOB_POLL_MS;
+
+    function check() {
+        fetch(container.dataset.pdfJobStatus, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+            .then(res => {
+                if (!res.ok) throw new Error(res.status);
+                return res.json();
+            })
+            .then(job => {
+                if (job.ready || job.failed) {
+                    container.querySelectorAll('.spinner-border').forEach(spinner => spinner.remove());
+                }
+                if (job.ready) {
+                    if (container.dataset.pdfJobReady === 'download') {
+                        message.innerHTML = 'El PDF está listo. Si la descarga no inicia, <a href="' + job.download_url + '">haga clic aquí</a>.';
+                        window.location.href = job.download_url;
+                    } else {
+                        window.location.reload();
+                    }
+                } else if (job.failed) {
+                    message.textContent = 'No se pudo generar el PDF: ' + (job.error || 'error desconocido');
+                    container.classList.add('text-danger');
+                } else {
+                    delay = PDF_JOB_POLL_MS;
+                    setTimeout(check, delay);
+                }
+            })
+            .catch(() => {
+                // Error de red o del servidor: se reintenta cada vez más espaciado
+                delay = Math.min(delay * 2, 30000);
+                setTimeout(check, delay);
+            });
+    }
+    check();
+}
+
+function initPdfJobs() {
+    document.querySelectorAll('[data-pdf-job-status]').forEach(watchPdfJob);
+}
@@ -0,0 +1,52 @@
+from datetime import date, datetime, timedelta
+
+def parse_date(value):
+    """
+    Accepts a date, a datetime or an ISO 'YYYY-MM-DD' string (as sent by <input type="date">).
+    Returns a date, or None when the value is empty or invalid.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+def day_range(desde=None, hasta=None):
+    """
+    Converts an inclusive range of days into half-open datetime bounds [start, end).
+    Either side may be None. Swaps the days if they come reversed.
+    """
+    start_day, end_day = parse_date(desde), parse_date(hasta)
+    if start_day and end_day and start_day > end_day:
+        start_day, end_day = end_day, start_day
+
+    start = datetime.combine(start_day, datetime.min.time()) if start_day else None
+    end = datetime.combine(end_day + timedelta(days=1), datetime.min.time()) if end_day else None
+    return start, end
+
+def apply_date_range(query, column, fecha=None, desde=None, hasta=None):
+    """
+    Filters a query by a DateTime column with `column >= start AND column < end`,
+    which can use an index on the column (unlike func.date(column) == fecha).
+
+    Args:
+        query: SQLAlchemy query.
+        column: DateTime column to filter (e.g. Client.created_at).
+        fecha: Single day; takes precedence over desde/hasta.
+        desde: First day of the range (inclusive).
+        hasta: Last day of the range (inclusive).
+    """
+    if parse_date(fecha):
+        desde = hasta = fecha
+
+    start, end = day_range(desde, hasta)
+    if start:
+        query = query.filter(column >= start)
+    if end:
+        query = query.filter(column < end)
+    return query
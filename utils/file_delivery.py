@@ -0,0 +1,87 @@
+import hashlib
+import os
+import threading
+from urllib.parse import quote
+from flask import abort, current_app, request, send_file
+from werkzeug.utils import send_file as werkzeug_send_file
+
+# Backends que delegan el envío del archivo al servidor web
+OFFLOAD_BACKENDS = ('x-accel', 'x-sendfile')
+
+# Hash de contenido de archivos planos por (ruta, mtime, tamaño); se lee cada archivo una vez por proceso
+_etags = {}
+_etags_lock = threading.Lock()
+MAX_CACHED_ETAGS = 4096
+
+def content_etag(path):
+    """
+    Strong ETag (SHA-256 of the content) of a file that is not in the blob store.
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _etags_lock:
+        etag = _etags.get(key)
+    if etag:
+        return etag
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    etag = digest.hexdigest()
+
+    with _etags_lock:
+        if len(_etags) >= MAX_CACHED_ETAGS:
+            _etags.clear()
+        _etags[key] = etag
+    return etag
+
+def send_upload(path, mimetype=None, download_name=None, as_attachment=False, etag=None):
+    """
+    Sends a file stored under UPLOAD_FOLDER using the configured DOWNLOAD_BACKEND.
+
+    The caller does the authorization check first. Then:
+    - 'python' (default, development): the worker streams the file with send_file, with a strong
+      ETag (the blob hash given in `etag`, or the SHA-256 of the content), Last-Modified,
+      304 answers to If-None-Match / If-Modified-Since and byte ranges (206) for large PDFs.
+    - 'x-accel': empty response with X-Accel-Redirect to DOWNLOAD_ACCEL_PREFIX + the path
+      relative to UPLOAD_FOLDER; Nginx serves the bytes from an internal location:
+
+          location /_protected_uploads/ {
+              internal;
+              alias /ruta/al/crm/uploads/;
+          }
+
+    - 'x-sendfile': empty response with X-Sendfile and the absolute path (Apache mod_xsendfile,
+      Lighttpd).
+
+    With the offload backends the web server computes Content-Length, validators and ranges,
+    so the worker is free as soon as the headers are sent. Files outside UPLOAD_FOLDER are
+    always sent by Python.
+    """
+    if not path or not os.path.isfile(path):
+        abort(404)
+
+    abs_path = os.path.abspath(path)
+    upload_root = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+    backend = current_app.config.get('DOWNLOAD_BACKEND', 'python')
+
+    if backend not in OFFLOAD_BACKENDS or os.path.commonpath([upload_root, abs_path]) != upload_root:
+        # Cache-Control: no-cache (por defecto en send_file): el navegador revalida y recibe 304
+        return send_file(abs_path, mimetype=mimetype, download_name=download_name, as_attachment=as_attachment,
+                         etag=etag or content_etag(abs_path), conditional=True)
+
+    response = werkzeug_send_file(
+        abs_path, request.environ, mimetype=mimetype, download_name=download_name, as_attachment=as_attachment,
+        use_x_sendfile=True, conditional=False, etag=False, response_class=current_app.response_class
+    )
+    # Los calcula el servidor web a partir del archivo real
+    response.headers.pop('Content-Length', None)
+    response.headers.pop('Last-Modified', None)
+
+    if backend == 'x-accel':
+        relative = os.path.relpath(abs_path, upload_root).replace(os.sep, '/')
+        prefix = current_app.config.get('DOWNLOAD_ACCEL_PREFIX', '/_protected_uploads/')
+        del response.headers['X-Sendfile']
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(relative)
+    return response
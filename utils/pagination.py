@@ -0,0 +1,136 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, tuple_
+
+DEFAULT_PER_PAGE = 20
+
+def encode_cursor(sort_value, row_id, direction):
+    """
+    Builds an opaque, URL-safe cursor from the last/first row of a page.
+    """
+    payload = {'s': sort_value.isoformat() if sort_value else None, 'i': row_id, 'd': direction}
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Returns (sort_value, row_id, direction) or None if the cursor is missing or malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        direction = payload['d']
+        if direction not in ('next', 'prev') or payload['s'] is None:
+            return None
+        return datetime.fromisoformat(payload['s']), int(payload['i']), direction
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+class KeysetPage:
+    """
+    Page of results with the same attribute names the templates used with
+    Flask-SQLAlchemy's Pagination (items, has_next, has_prev, total), plus the cursors.
+    """
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None, per_page=DEFAULT_PER_PAGE):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class KeysetPaginator:
+    """
+    Keyset ("seek") pagination ordered by (sort_column DESC, id_column DESC).
+
+    Each page is a `WHERE (created_at, id) < (:c, :i) ORDER BY ... LIMIT n + 1`, so the cost does
+    not grow with the page depth and no COUNT(*) is needed to know whether there is a next page.
+    The sort column must be NOT NULL: a NULL never satisfies the row comparison.
+    The total is optional and cached per process for PAGINATION_COUNT_TTL seconds.
+    """
+    _counts = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def paginate(query, sort_column, id_column, cursor=None, per_page=DEFAULT_PER_PAGE, count_key=None):
+        """
+        Args:
+            query: Filtered query without order_by.
+            sort_column: Column of the ordering key (e.g. Client.created_at).
+            id_column: Unique tie-breaker (e.g. Client.id).
+            cursor: Opaque cursor received in the request, or None for the first page.
+            per_page: Page size.
+            count_key: Hashable key identifying the listing and its filters. When given,
+                the page includes the total number of rows (cached).
+        """
+        decoded = decode_cursor(cursor)
+        total = KeysetPaginator.count(query, id_column, count_key) if count_key is not None else None
+        query = query.order_by(None)
+
+        if decoded and decoded[2] == 'prev':
+            sort_value, row_id, _ = decoded
+            rows = query.filter(tuple_(sort_column, id_column) > tuple_(sort_value, row_id)).order_by(
+                sort_column.asc(), id_column.asc()
+            ).limit(per_page + 1).all()
+            has_prev = len(rows) > per_page
+            rows = rows[:per_page]
+            rows.reverse()
+            # Veníamos de una página posterior, así que siempre hay siguiente
+            has_next = bool(rows)
+        else:
+            if decoded:
+                sort_value, row_id, _ = decoded
+                query = query.filter(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+            rows = query.order_by(sort_column.desc(), id_column.desc()).limit(per_page + 1).all()
+            has_next = len(rows) > per_page
+            rows = rows[:per_page]
+            has_prev = decoded is not None and bool(rows)
+
+        sort_attr, id_attr = sort_column.key, id_column.key
+        next_cursor = encode_cursor(getattr(rows[-1], sort_attr), getattr(rows[-1], id_attr), 'next') if has_next else None
+        prev_cursor = encode_cursor(getattr(rows[0], sort_attr), getattr(rows[0], id_attr), 'prev') if has_prev else None
+        return KeysetPage(rows, next_cursor=next_cursor, prev_cursor=prev_cursor, total=total, per_page=per_page)
+
+    @staticmethod
+    def count(query, id_column, count_key):
+        """
+        COUNT(*) of the query, reused for PAGINATION_COUNT_TTL seconds per count_key.
+        """
+        ttl = current_app.config.get('PAGINATION_COUNT_TTL', 60)
+        now = time.monotonic()
+
+        if ttl > 0:
+            with KeysetPaginator._lock:
+                entry = KeysetPaginator._counts.get(count_key)
+            if entry and now - entry[0] < ttl:
+                return entry[1]
+
+        # COUNT(*) directo, sin la subconsulta con todas las columnas que arma Query.count()
+        total = query.order_by(None).with_entities(func.count(id_column)).scalar()
+
+        if ttl > 0:
+            with KeysetPaginator._lock:
+                # Evita que el diccionario crezca sin límite con combinaciones de filtros viejas
+                if len(KeysetPaginator._counts) > 1000:
+                    KeysetPaginator._counts = {k: v for k, v in KeysetPaginator._counts.items() if now - v[0] < ttl}
+                KeysetPaginator._counts[count_key] = (now, total)
+        return total
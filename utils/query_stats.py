@@ -0,0 +1,199 @@
+import functools
+import json
+import logging
+import re
+import sys
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger('crm.sql')
+
+# Literales y listas IN que cambian entre ejecuciones de la misma consulta
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+def statement_shape(statement):
+    """
+    Normalizes a SQL statement so that executions differing only in literals or in the
+    length of an IN list share the same shape.
+    """
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _PLACEHOLDER_LIST.sub('(?)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+def parse_budgets(value):
+    """
+    Parses 'endpoint=max,endpoint=max' (SQL_QUERY_BUDGETS) into a dict.
+    """
+    budgets = {}
+    for item in (value or '').split(','):
+        name, _, limit = item.partition('=')
+        if name.strip() and limit.strip().isdigit():
+            budgets[name.strip()] = int(limit)
+    return budgets
+
+
+class RequestQueryStats:
+    """
+    SQL statements run while serving one request.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.shapes = Counter()
+        # Secciones marcadas con QueryStats.track (p. ej. el context processor de notificaciones)
+        self.sections = {}
+        self._active_sections = []
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total_time += duration
+        if duration >= self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+        self.shapes[statement_shape(statement)] += 1
+        for name in self._active_sections:
+            section = self.sections[name]
+            section['count'] += 1
+            section['time'] += duration
+
+    def repeated(self, threshold):
+        """
+        Shapes executed at least `threshold` times: the signature of an N+1.
+        """
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+class QueryStats:
+    """
+    Opt-in per-request SQL instrumentation (SQL_STATS_ENABLED).
+
+    Counts the statements of each request from the engine events, with the total and
+    slowest DB time and the statement shapes that repeat (N+1). In debug mode the summary
+    goes to the X-SQL-Stats and Server-Timing headers; otherwise it is logged as one JSON
+    line per request on the 'crm.sql' logger. Endpoints or sections over their budget in
+    SQL_QUERY_BUDGETS are logged as warnings.
+    """
+
+    @staticmethod
+    def init_app(app, db):
+        if not app.config.get('SQL_STATS_ENABLED'):
+            return
+
+        budgets = parse_budgets(app.config.get('SQL_QUERY_BUDGETS'))
+        default_budget = app.config.get('SQL_QUERY_BUDGET_DEFAULT', 0)
+        repeat_threshold = app.config.get('SQL_STATS_REPEAT_THRESHOLD', 5)
+        send_header = app.debug or app.config.get('SQL_STATS_HEADER', False)
+
+        if not logger.handlers:
+            # Sin configuración de logging en el proyecto: una línea por petición a stderr
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+        with app.app_context():
+            engine = db.engine
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info.get('query_start')
+            if not started:
+                return
+            duration = time.perf_counter() - started.pop()
+            stats = QueryStats.current()
+            if stats is not None:
+                stats.record(statement, duration)
+
+        @app.before_request
+        def start_query_stats():
+            g.query_stats = RequestQueryStats()
+
+        @app.after_request
+        def report_query_stats(response):
+            stats = QueryStats.current()
+            if stats is None:
+                return response
+            endpoint = request.endpoint or 'unknown'
+            repeated = stats.repeated(repeat_threshold)
+
+            over_budget = []
+            for name, count in [(endpoint, stats.count)] + [(n, s['count']) for n, s in stats.sections.items()]:
+                budget = budgets.get(name, default_budget if name == endpoint else 0)
+                if budget and count > budget:
+                    over_budget.append({'name': name, 'statements': count, 'budget': budget})
+
+            if send_header:
+                response.headers['X-SQL-Stats'] = (
+                    f'count={stats.count}; time_ms={stats.total_time * 1000:.1f}; '
+                    f'slowest_ms={stats.slowest_time * 1000:.1f}; repeated={len(repeated)}'
+                )
+                response.headers.add('Server-Timing', f'db;dur={stats.total_time * 1000:.1f};desc="{stats.count} queries"')
+            else:
+                record = {
+                    'endpoint': endpoint,
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'statements': stats.count,
+                    'db_ms': round(stats.total_time * 1000, 1),
+                    'slowest_ms': round(stats.slowest_time * 1000, 1),
+                    'slowest': (stats.slowest_statement or '')[:300],
+                    'repeated': [{'count': count, 'statement': shape[:300]} for shape, count in repeated],
+                    'sections': {name: {'statements': s['count'], 'db_ms': round(s['time'] * 1000, 1)}
+                                 for name, s in stats.sections.items()},
+                }
+                logger.info(json.dumps(record, ensure_ascii=False))
+
+            for item in over_budget:
+                logger.warning(json.dumps({'event': 'sql_budget_exceeded', 'endpoint': endpoint, **item},
+                                          ensure_ascii=False))
+            if repeated:
+                logger.warning(json.dumps({
+                    'event': 'sql_repeated_statements', 'endpoint': endpoint,
+                    'repeated': [{'count': count, 'statement': shape[:300]} for shape, count in repeated]
+                }, ensure_ascii=False))
+            return response
+
+    @staticmethod
+    def current():
+        """
+        Stats of the request being served, or None (outside a request or when disabled).
+        """
+        if not has_request_context():
+            return None
+        return g.get('query_stats')
+
+    @staticmethod
+    def track(name):
+        """
+        Decorator that also counts the statements run inside the function under `name`,
+        for code that is not an endpoint of its own (context processors, helpers).
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                stats = QueryStats.current()
+                if stats is None:
+                    return func(*args, **kwargs)
+                stats.sections.setdefault(name, {'count': 0, 'time': 0.0})
+                stats._active_sections.append(name)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    stats._active_sections.remove(name)
+            return wrapper
+        return decorator
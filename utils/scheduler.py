@@ -0,0 +1,76 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+def seconds_until(hour, now=None):
+    """
+    Seconds from now until the next occurrence of hour:00 (local server time).
+    """
+    now = now or datetime.now()
+    next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+class DailyJob:
+    """
+    Runs a function once a day at a fixed hour in a daemon thread of the web process.
+
+    Every gunicorn worker imports the app, so an exclusive flock on a file in the
+    instance folder makes sure only one process per server runs the job. The lock
+    is held for the life of the process that wins it.
+    """
+    _started = {}
+
+    def __init__(self, app, name, hour, func):
+        self.app = app
+        self.name = name
+        self.hour = hour
+        self.func = func
+        self._lock_file = None
+
+    def _acquire_lock(self):
+        os.makedirs(self.app.instance_path, exist_ok=True)
+        path = os.path.join(self.app.instance_path, f'{self.name}.lock')
+        lock_file = open(path, 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def start(self):
+        """
+        Starts the thread if no other process on this server holds the job lock.
+        Returns True if this process will run the job.
+        """
+        if self.name in DailyJob._started or not self._acquire_lock():
+            return False
+        thread = threading.Thread(target=self._run, name=f'daily-{self.name}', daemon=True)
+        DailyJob._started[self.name] = thread
+        thread.start()
+        return True
+
+    def _run(self):
+        # Primera ejecución al arrancar: cubre los días en que el servidor estuvo apagado a la hora programada
+        self._run_once()
+        while True:
+            time.sleep(seconds_until(self.hour))
+            self._run_once()
+
+    def _run_once(self):
+        try:
+            with self.app.app_context():
+                result = self.func()
+            logger.info("Tarea diaria '%s' ejecutada: %s", self.name, result)
+        except Exception:
+            # Un fallo no debe detener las ejecuciones de los días siguientes
+            logger.exception("Error en la tarea diaria '%s'", self.name)
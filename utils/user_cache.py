@@ -0,0 +1,143 @@
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Campos del usuario que la app lee en casi todas las peticiones
+CACHED_FIELDS = ('id', 'rol', 'nombre_completo', 'is_active')
+# Fila de cache_version que invalida este caché
+VERSION_NAME = 'users'
+
+class CachedUser(UserMixin):
+    """
+    Lightweight stand-in for User used as current_user.
+    Exposes the cached fields directly and loads the full User row only when
+    another attribute is read (password, client_profile, ...).
+    Writes must go through the User model / UserService, never through current_user.
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self._model = None
+
+    @property
+    def id(self):
+        return self._data['id']
+
+    @property
+    def rol(self):
+        return self._data['rol']
+
+    @property
+    def nombre_completo(self):
+        return self._data['nombre_completo']
+
+    @property
+    def is_active(self):
+        return self._data['is_active'] is not False
+
+    def get_model(self):
+        from models import User
+        if self._model is None:
+            self._model = User.query.get(self.id)
+        return self._model
+
+    def __getattr__(self, name):
+        # Solo se llama para atributos que no están en el caché
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get_model(), name)
+
+
+class UserCache:
+    """
+    Per-process cache for the Flask-Login user loader.
+
+    Entries expire after USER_CACHE_TTL seconds. Every process also reads a version stamp
+    from the database (the 'users' row of cache_version) at most every
+    USER_CACHE_VERSION_CHECK seconds, and drops its whole cache when another process, on
+    this server or another one, has bumped it. Password changes, deletions and access
+    revocations therefore apply everywhere within that interval, and at once in the
+    process that made them.
+    """
+    _entries = {}
+    _version = None
+    _checked_at = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _current_version():
+        from models import db, CacheVersion
+
+        interval = current_app.config.get('USER_CACHE_VERSION_CHECK', 5)
+        now = time.monotonic()
+        with UserCache._lock:
+            if UserCache._checked_at is not None and now - UserCache._checked_at < interval:
+                return UserCache._version
+        version = db.session.query(CacheVersion.version).filter(CacheVersion.name == VERSION_NAME).scalar() or 0
+        with UserCache._lock:
+            UserCache._checked_at = now
+        return version
+
+    @staticmethod
+    def bump_version():
+        """
+        Invalidates the cached users of every process that shares the database, and commits.
+        """
+        from models import db, CacheVersion
+
+        table = CacheVersion.__table__
+        now = datetime.utcnow()
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            stmt = insert(table).values(name=VERSION_NAME, version=1, updated_at=now)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['name'], set_={'version': table.c.version + 1, 'updated_at': now}
+            ))
+        else:
+            updated = db.session.execute(table.update().where(table.c.name == VERSION_NAME).values(
+                version=table.c.version + 1, updated_at=now
+            )).rowcount
+            if not updated:
+                db.session.execute(table.insert().values(name=VERSION_NAME, version=1, updated_at=now))
+        db.session.commit()
+        with UserCache._lock:
+            UserCache._entries.clear()
+            # La próxima carga de este proceso relee la versión nueva
+            UserCache._checked_at = None
+
+    @staticmethod
+    def load(user_id):
+        """
+        Returns a CachedUser for the session, or None if the user no longer exists or is inactive.
+        """
+        from models import db, User
+
+        ttl = current_app.config.get('USER_CACHE_TTL', 60)
+        version = UserCache._current_version()
+        now = time.monotonic()
+
+        with UserCache._lock:
+            if version != UserCache._version:
+                UserCache._entries.clear()
+                UserCache._version = version
+            entry = UserCache._entries.get(user_id)
+
+        if entry and ttl > 0 and now - entry[0] < ttl:
+            data = entry[1]
+        else:
+            row = db.session.query(*[getattr(User, field) for field in CACHED_FIELDS]).filter(User.id == user_id).first()
+            if not row:
+                return None
+            data = dict(zip(CACHED_FIELDS, row))
+            if ttl > 0:
+                with UserCache._lock:
+                    UserCache._entries[user_id] = (now, data)
+
+        # Un usuario desactivado pierde la sesión inmediatamente
+        if data['is_active'] is False:
+            return None
+        return CachedUser(data)
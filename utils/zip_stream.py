@@ -0,0 +1,96 @@
+import os
+import zipfile
+from datetime import datetime
+from flask import Response
+
+CHUNK_SIZE = 64 * 1024
+
+class _StreamBuffer:
+    """
+    Write-only, unseekable file object for ZipFile: keeps only the bytes written since
+    the last drain, so the archive is never held in memory or on disk.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def unique_arcname(name, used):
+    """
+    Returns name, or 'name (2).ext', 'name (3).ext'... if the archive already has it.
+    """
+    stem, ext = os.path.splitext(name)
+    candidate = name
+    n = 1
+    while candidate in used:
+        n += 1
+        candidate = f"{stem} ({n}){ext}"
+    used.add(candidate)
+    return candidate
+
+def stream_zip(entries, missing_note='archivos_faltantes.txt'):
+    """
+    Generator of the bytes of a ZIP archive built on the fly.
+
+    Args:
+        entries: Iterable of (arcname, path, modified datetime or None). Files are copied in
+            CHUNK_SIZE blocks, so memory use does not depend on the number or size of the files.
+        missing_note: Name of a text entry listing the files that were not found on disk.
+
+    Entries are stored without compression: PDFs and images barely shrink and the CPU
+    cost would fall on the web worker.
+    """
+    buffer = _StreamBuffer()
+    missing = []
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, path, modified in entries:
+            if not path or not os.path.isfile(path):
+                missing.append(arcname)
+                continue
+            # ZIP no admite fechas anteriores a 1980
+            date_time = max(modified or datetime.now(), datetime(1980, 1, 1)).timetuple()[:6]
+            info = zipfile.ZipInfo(arcname, date_time=date_time)
+            info.compress_type = zipfile.ZIP_STORED
+            with open(path, 'rb') as source, archive.open(info, mode='w', force_zip64=True) as target:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    target.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            # Descriptor de datos y cabecera que escribe ZipFile al cerrar cada entrada
+            data = buffer.drain()
+            if data:
+                yield data
+
+        if missing:
+            archive.writestr(missing_note, '\n'.join(missing) + '\n')
+    # Directorio central
+    yield buffer.drain()
+
+def zip_response(entries, download_name):
+    """
+    Streaming response of a ZIP built with stream_zip. `entries` must not need the
+    request context: the generator runs after the view returns.
+    """
+    response = Response(stream_zip(entries), mimetype='application/zip')
+    response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    response.headers['Cache-Control'] = 'no-store'
+    # Nginx no debe acumular la respuesta completa antes de enviarla
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
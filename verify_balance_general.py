@@ -0,0 +1,203 @@
+import os
+import tempfile
+import unittest
+
+# Base de datos SQLite temporal: la prueba nunca toca la base configurada en .env
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+os.environ.setdefault('SECRET_KEY', 'verify-balance-general')
+
+from datetime import date, datetime
+from sqlalchemy import event, func
+from werkzeug.security import generate_password_hash
+from app import app, db
+from models import User, Client, Expense, PaymentDiagnosis, PaymentContract, ContractInstallment
+from services.financial_service import FinancialService
+
+# Periodos comparados: meses con datos, uno parcial, uno largo y uno sin movimientos
+PERIODS = [
+    ('2025-03-01', '2025-03-31'),
+    ('2025-04-01', '2025-04-30'),
+    ('2025-03-15', '2025-04-15'),
+    ('2025-01-01', '2025-12-31'),
+    ('2024-01-01', '2024-01-31'),
+]
+SCALAR_KEYS = ['total_ingresos', 'costo_negocio', 'utilidad_neta', 'ventas_totales', 'ventas_diagnosticos',
+               'ventas_contratos', 'income_diagnosis', 'income_installments', 'costos_totales', 'costos_directos',
+               'costos_indirectos', 'gastos_administrativos', 'impuestos_clientes', 'total_gross_income',
+               'total_iva', 'total_retefuente', 'total_ica', 'start_date_used', 'end_date_used']
+
+
+def legacy_balance_totals(start_date, end_date):
+    """KPIs del balance con las consultas por separado que tenía get_balance_general."""
+    q_income_diag_total = db.session.query(func.sum(PaymentDiagnosis.valor)).filter(
+        PaymentDiagnosis.verificado == True,
+        PaymentDiagnosis.fecha_pago >= start_date,
+        PaymentDiagnosis.fecha_pago <= end_date
+    ).scalar() or 0.0
+    q_contracts_total = db.session.query(func.sum(PaymentContract.valor_total)).join(ContractInstallment).filter(
+        ContractInstallment.numero_cuota == 1,
+        ContractInstallment.fecha_vencimiento >= start_date,
+        ContractInstallment.fecha_vencimiento <= end_date
+    ).scalar() or 0.0
+    ventas_totales = float(q_income_diag_total) + float(q_contracts_total)
+
+    end_date_str = f"{end_date} 23:59:59"
+    q_expenses_indirect = db.session.query(func.sum(Expense.valor_base)).filter(
+        Expense.tipo == 'Costo Indirecto', Expense.fecha >= start_date, Expense.fecha <= end_date_str
+    ).scalar() or 0.0
+    q_expenses_operative = db.session.query(func.sum(Expense.valor_base)).filter(
+        Expense.tipo == 'Gasto Operativo', Expense.fecha >= start_date, Expense.fecha <= end_date_str
+    ).scalar() or 0.0
+
+    count_diag_sold = PaymentDiagnosis.query.filter(
+        PaymentDiagnosis.verificado == True,
+        PaymentDiagnosis.fecha_pago >= start_date,
+        PaymentDiagnosis.fecha_pago <= end_date
+    ).count()
+    costos_totales = (count_diag_sold * 35000.0) + float(q_expenses_indirect)
+    gastos_administrativos = float(q_expenses_operative)
+
+    q_tax_diag_base = db.session.query(func.sum(PaymentDiagnosis.valor)).join(Client).filter(
+        PaymentDiagnosis.verificado == True, Client.es_responsable_iva == True,
+        PaymentDiagnosis.fecha_pago >= start_date, PaymentDiagnosis.fecha_pago <= end_date
+    )
+    q_tax_inst_base = db.session.query(func.sum(ContractInstallment.valor)).join(PaymentContract).join(Client).filter(
+        ContractInstallment.estado == 'Pagada', Client.es_responsable_iva == True,
+        ContractInstallment.fecha_vencimiento >= start_date, ContractInstallment.fecha_vencimiento <= end_date
+    )
+    base_taxable = float((q_tax_diag_base.scalar() or 0) + (q_tax_inst_base.scalar() or 0))
+    total_iva = base_taxable * 0.19
+    total_retefuente = base_taxable * 0.025
+    total_ica = base_taxable * 0.01104
+    impuestos_clientes = total_iva + total_retefuente + total_ica
+
+    total_ingresos = float(db.session.query(func.sum(PaymentDiagnosis.valor)).filter(
+        PaymentDiagnosis.verificado == True, PaymentDiagnosis.fecha_pago >= start_date,
+        PaymentDiagnosis.fecha_pago <= end_date
+    ).scalar() or 0) + float(db.session.query(func.sum(ContractInstallment.valor)).filter(
+        ContractInstallment.estado == 'Pagada', ContractInstallment.fecha_vencimiento >= start_date,
+        ContractInstallment.fecha_vencimiento <= end_date
+    ).scalar() or 0)
+
+    return {
+        'total_ingresos': total_ingresos,
+        'costo_negocio': count_diag_sold * 35000.0,
+        'utilidad_neta': ventas_totales - (costos_totales + gastos_administrativos + impuestos_clientes),
+        'ventas_totales': ventas_totales,
+        'ventas_diagnosticos': float(q_income_diag_total),
+        'ventas_contratos': float(q_contracts_total),
+        'income_diagnosis': float(q_income_diag_total),
+        'income_installments': total_ingresos - float(q_income_diag_total),
+        'costos_totales': costos_totales,
+        'costos_directos': count_diag_sold * 35000.0,
+        'costos_indirectos': float(q_expenses_indirect),
+        'gastos_administrativos': gastos_administrativos,
+        'impuestos_clientes': impuestos_clientes,
+        'total_gross_income': total_ingresos,
+        'total_iva': total_iva,
+        'total_retefuente': total_retefuente,
+        'total_ica': total_ica,
+        'start_date_used': start_date,
+        'end_date_used': end_date,
+    }
+
+
+class BalanceGeneralEquivalenceTestCase(unittest.TestCase):
+    """
+    get_balance_general computes its KPIs in a single statement; the results must match the
+    original one-query-per-figure implementation for every period.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+            admin = User(nombre_completo='Admin Verify', email='admin@verify.test', rol='Admin',
+                         password=generate_password_hash('verify'))
+            db.session.add(admin)
+            db.session.commit()
+
+            # Clientes con y sin IVA, análisis verificados o no, dentro y fuera de los periodos
+            clients = [
+                ('Con IVA marzo', True, date(2025, 3, 5), True, 250000, date(2025, 3, 10), 1800000),
+                ('Sin IVA marzo', False, date(2025, 3, 31), True, 200000, date(2025, 3, 31), 1200000),
+                ('Con IVA abril', True, date(2025, 4, 1), True, 300000.50, date(2025, 4, 20), 2400000),
+                ('No verificado', True, date(2025, 3, 20), False, 150000, date(2025, 2, 28), 900000),
+                ('Sin análisis', False, None, None, None, date(2025, 4, 30), 600000),
+            ]
+            for i, (nombre, iva, fecha_pago, verificado, valor, first_due, valor_total) in enumerate(clients):
+                client = Client(nombre=nombre, telefono='3000000000', numero_id=str(1000 + i), es_responsable_iva=iva)
+                db.session.add(client)
+                db.session.flush()
+                if fecha_pago:
+                    db.session.add(PaymentDiagnosis(client_id=client.id, valor=valor, fecha_pago=fecha_pago,
+                                                    verificado=verificado))
+                contract = PaymentContract(client_id=client.id, valor_total=valor_total, numero_cuotas=3)
+                db.session.add(contract)
+                db.session.flush()
+                for n, estado in enumerate(['Pagada', 'Pendiente', 'En Mora'], start=1):
+                    due = date(first_due.year + (first_due.month + n - 2) // 12, (first_due.month + n - 2) % 12 + 1,
+                               min(first_due.day, 28))
+                    db.session.add(ContractInstallment(payment_contract_id=contract.id, numero_cuota=n,
+                                                       valor=valor_total / 3, fecha_vencimiento=due, estado=estado))
+
+            expenses = [
+                ('Costo Indirecto', 50000.0, datetime(2025, 3, 1, 0, 0)),
+                ('Costo Indirecto', 75000.25, datetime(2025, 3, 31, 23, 30)),
+                ('Gasto Operativo', 120000.0, datetime(2025, 4, 15, 12, 0)),
+                ('Gasto Operativo', 30000.0, datetime(2025, 3, 15, 8, 0)),
+                ('Gasto Operativo', 99999.0, datetime(2024, 12, 31, 23, 59)),
+            ]
+            for tipo, valor_base, fecha in expenses:
+                db.session.add(Expense(tipo=tipo, descripcion=tipo, valor_base=valor_base, fecha=fecha,
+                                       usuario_id=admin.id))
+            db.session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        os.close(_db_fd)
+        os.remove(_db_path)
+
+    def test_matches_legacy_queries(self):
+        with app.app_context():
+            for start_date, end_date in PERIODS:
+                data = FinancialService.get_balance_general(start_date, end_date)
+                expected = legacy_balance_totals(start_date, end_date)
+                for key in SCALAR_KEYS:
+                    if isinstance(expected[key], float):
+                        self.assertAlmostEqual(data[key], expected[key], places=6,
+                                               msg=f'{key} difiere en {start_date} - {end_date}')
+                    else:
+                        self.assertEqual(data[key], expected[key], f'{key} difiere en {start_date} - {end_date}')
+
+    def test_recent_queries_match_period(self):
+        with app.app_context():
+            data = FinancialService.get_balance_general('2025-03-01', '2025-03-31')
+            self.assertEqual(sorted(d.client.nombre for d in data['q_recent_diag'].all()),
+                             ['Con IVA marzo', 'Sin IVA marzo'])
+            self.assertEqual(len(data['q_recent_inst'].all()), 2)
+
+    def test_single_statement(self):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            db.session.remove()
+            event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+            try:
+                FinancialService.get_balance_general('2025-03-01', '2025-04-30')
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        self.assertEqual(len(statements), 1, f'get_balance_general ejecutó {len(statements)} sentencias SQL')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import tempfile
+import unittest
+
+# Base de datos SQLite temporal: la prueba nunca toca la base configurada en .env
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+os.environ.setdefault('SECRET_KEY', 'verify-client-detail')
+
+from datetime import date, datetime, timedelta
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app import app, db
+from models import (User, Client, CaseMessage, ClientNote, Document, FinancialObligation, Negotiation,
+                    PaymentDiagnosis, PaymentContract, ContractInstallment)
+
+# Máximo de sentencias SQL para renderizar /client/<id> (incluye user_loader y notificaciones de base.html)
+MAX_STATEMENTS = 10
+# Máximo por fragmento /client/<id>/panel/<panel> (user_loader, cliente y el panel)
+MAX_PANEL_STATEMENTS = 4
+PANELS = ('documents', 'negotiations', 'notes')
+# Con mensajes sin leer el abogado además marca como leído y recarga la ficha tras el commit
+MAX_STATEMENTS_WITH_UPDATES = 20
+
+
+class ClientDetailQueryBudgetTestCase(unittest.TestCase):
+    """
+    The client detail page and its lazily loaded panels must run a fixed number of queries,
+    no matter how many messages, notes, documents, installments or obligations the client has.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        app.config['SESSION_COOKIE_SECURE'] = False
+        app.config['REMEMBER_COOKIE_SECURE'] = False
+        with app.app_context():
+            db.create_all()
+            password = generate_password_hash('verify')
+            users = {}
+            for rol in ['Admin', 'Abogado', 'Analista', 'Radicador', 'Negociador', 'Cliente']:
+                users[rol] = User(nombre_completo=f'{rol} Verify', email=f'{rol.lower()}@verify.test', rol=rol, password=password)
+                db.session.add(users[rol])
+            db.session.commit()
+
+            client = Client(nombre='Cliente Verify', telefono='3000000000', numero_id='123', estado='Con_Contrato',
+                            analista_id=users['Analista'].id, abogado_id=users['Abogado'].id,
+                            radicador_id=users['Radicador'].id, login_user_id=users['Cliente'].id,
+                            motivo_consulta='Motivo', conclusion_analisis='Conclusión')
+            db.session.add(client)
+            db.session.commit()
+
+            db.session.add(PaymentDiagnosis(client_id=client.id, valor=100000, fecha_pago=date.today(), verificado=True))
+            contract = PaymentContract(client_id=client.id, valor_total=1200000, numero_cuotas=0)
+            db.session.add(contract)
+            db.session.commit()
+
+            cls.client_id = client.id
+            cls.contract_id = contract.id
+            cls.user_ids = {rol: u.id for rol, u in users.items()}
+            cls.add_records(5)
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        os.close(_db_fd)
+        os.remove(_db_path)
+
+    @classmethod
+    def add_records(cls, count):
+        """Agrega `count` registros de cada panel de la ficha."""
+        with app.app_context():
+            start = ContractInstallment.query.filter_by(payment_contract_id=cls.contract_id).count()
+            for i in range(count):
+                n = start + i + 1
+                db.session.add(CaseMessage(content=f'Mensaje {n}', sender_id=cls.user_ids['Cliente'], client_id=cls.client_id,
+                                           is_read_by_recipient=True))
+                db.session.add(ClientNote(content=f'Nota {n}', author_id=cls.user_ids['Abogado'], client_id=cls.client_id))
+                db.session.add(Document(filename=f'doc_{n}.pdf', client_id=cls.client_id, uploaded_by_id=cls.user_ids['Analista']))
+                db.session.add(ContractInstallment(payment_contract_id=cls.contract_id, numero_cuota=n, valor=100000,
+                                                   fecha_vencimiento=date.today() + timedelta(days=30 * n), estado='Pendiente'))
+                obligation = FinancialObligation(client_id=cls.client_id, entidad=f'Banco {n}', estado='Reportado', valor=50000)
+                db.session.add(obligation)
+                db.session.flush()
+                db.session.add(Negotiation(obligation_id=obligation.id, negociador_id=cls.user_ids['Negociador'],
+                                           created_at=datetime.utcnow()))
+            db.session.commit()
+
+    def count_statements(self, email, path):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.test_client() as web:
+            web.post('/login', data={'email': email, 'password': 'verify'})
+            with app.app_context():
+                engine = db.engine
+            event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+            try:
+                response = web.get(path)
+            finally:
+                event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+        self.assertEqual(response.status_code, 200)
+        return len(statements)
+
+    def test_admin_detail_within_budget(self):
+        count = self.count_statements('admin@verify.test', f'/client/{self.client_id}')
+        self.assertLessEqual(count, MAX_STATEMENTS, f'client_detail ejecutó {count} sentencias SQL')
+
+    def test_panels_within_budget(self):
+        for panel in PANELS:
+            count = self.count_statements('admin@verify.test', f'/client/{self.client_id}/panel/{panel}')
+            self.assertLessEqual(count, MAX_PANEL_STATEMENTS, f'el panel {panel} ejecutó {count} sentencias SQL')
+
+    def test_query_count_does_not_grow_with_records(self):
+        paths = [f'/client/{self.client_id}'] + [f'/client/{self.client_id}/panel/{panel}' for panel in PANELS]
+        before = [self.count_statements('admin@verify.test', path) for path in paths]
+        self.add_records(20)
+        after = [self.count_statements('admin@verify.test', path) for path in paths]
+        self.assertEqual(before, after, f'{before} sentencias con pocos registros y {after} con más registros')
+
+    def test_lawyer_detail_with_unread_messages_within_budget(self):
+        with app.app_context():
+            for i in range(10):
+                db.session.add(CaseMessage(content=f'Sin leer {i}', sender_id=self.user_ids['Cliente'], client_id=self.client_id))
+            db.session.commit()
+
+        count = self.count_statements('abogado@verify.test', f'/client/{self.client_id}')
+        self.assertLessEqual(count, MAX_STATEMENTS_WITH_UPDATES, f'client_detail ejecutó {count} sentencias SQL')
+
+        count = self.count_statements('abogado@verify.test', f'/client/{self.client_id}')
+        self.assertLessEqual(count, MAX_STATEMENTS, f'client_detail ejecutó {count} sentencias SQL')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+
+# Base de datos SQLite temporal: la prueba nunca toca la base configurada en .env
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+os.environ.setdefault('SECRET_KEY', 'verify-client-search')
+
+from sqlalchemy import text
+from app import app, db
+from models import Client
+from services.client_search import ClientSearch, FTS_TABLE, SEARCHABLE_FIELDS
+
+
+class ClientSearchFts5TestCase(unittest.TestCase):
+    """
+    On SQLite the dashboard search must match accents and case like before and be answered
+    by the FTS5 trigram index, not by a scan of the virtual table.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        app.config['TESTING'] = True
+        with app.app_context():
+            db.create_all()
+            # Misma tabla que crea la migración a3c91f0d7e52 en SQLite
+            db.session.execute(text(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(nombre, telefono, numero_id, tokenize='trigram')"))
+            db.session.commit()
+            ClientSearch._backend = None
+            for i, nombre in enumerate(['José Pérez', 'Ñandú Gómez', 'Maria_Lopez', 'Pedro 100% Ruiz']):
+                db.session.add(Client(nombre=nombre, telefono=f'300555{i:04d}', numero_id=f'10{i:04d}'))
+            db.session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.session.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+            db.session.commit()
+            db.engine.dispose()
+        ClientSearch._backend = None
+
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        self.assertEqual(ClientSearch.backend(), 'fts5')
+
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+
+    def names(self, term, fields=SEARCHABLE_FIELDS):
+        return sorted(c.nombre for c in ClientSearch.apply(Client.query, term, fields))
+
+    def test_matches(self):
+        self.assertEqual(self.names('jose PEREZ'), ['José Pérez'])
+        self.assertEqual(self.names('nandu gom'), ['Ñandú Gómez'])
+        self.assertEqual(self.names('3005550001'), ['Ñandú Gómez'])
+        self.assertEqual(self.names('100002'), ['Maria_Lopez'])
+        self.assertEqual(self.names('xyz'), [])
+
+    def test_wildcards_are_plain_characters(self):
+        # '%' y '_' se buscan tal cual, también en términos cortos que no usan el índice
+        self.assertEqual(self.names('100%'), ['Pedro 100% Ruiz'])
+        self.assertEqual(self.names('a_l'), ['Maria_Lopez'])
+        self.assertEqual(self.names('%'), ['Pedro 100% Ruiz'])
+        self.assertEqual(self.names('_'), ['Maria_Lopez'])
+        self.assertEqual(self.names('p%z'), [])
+        self.assertEqual(self.names('"pérez'), [])
+
+    def test_short_terms_fold_accents(self):
+        self.assertEqual(self.names('ñ'), ['Ñandú Gómez'])
+        self.assertEqual(self.names('jo'), ['José Pérez'])
+
+    def test_query_plan_uses_trigram_index(self):
+        query = ClientSearch.apply(db.session.query(Client.id), 'perez', SEARCHABLE_FIELDS)
+        sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = [row[-1] for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+        fts_steps = [step for step in plan if FTS_TABLE in step]
+        self.assertEqual(len(fts_steps), 1, plan)
+        # 'INDEX 0:M<n>' = MATCH atendido por el índice; 'INDEX 0:' solo = recorrido completo
+        self.assertRegex(fts_steps[0], r'VIRTUAL TABLE INDEX 0:M\d', plan)
+
+
+class ClientSearchFallbackTestCase(unittest.TestCase):
+    """
+    Without the search index (migrations not applied) the search still ignores accents and case.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        with app.app_context():
+            db.create_all()
+            for i, nombre in enumerate(['José Pérez', 'ÑANDÚ GÓMEZ', 'Maria_Lopez']):
+                db.session.add(Client(nombre=nombre, telefono=f'300666{i:04d}', numero_id=f'20{i:04d}'))
+            db.session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        ClientSearch._backend = None
+
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        ClientSearch._backend = None
+        self.assertEqual(ClientSearch.backend(), 'ilike')
+
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+
+    def names(self, term):
+        return sorted(c.nombre for c in ClientSearch.apply(Client.query, term, SEARCHABLE_FIELDS))
+
+    def test_matches_without_accents(self):
+        self.assertEqual(self.names('jose perez'), ['José Pérez'])
+        self.assertEqual(self.names('PÉREZ'), ['José Pérez'])
+        self.assertEqual(self.names('nandu'), ['ÑANDÚ GÓMEZ'])
+        self.assertEqual(self.names('a_l'), ['Maria_Lopez'])
+        self.assertEqual(self.names('a%l'), [])
+
+def tearDownModule():
+    os.close(_db_fd)
+    os.remove(_db_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
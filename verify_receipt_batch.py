@@ -0,0 +1,187 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+# Base de datos SQLite y carpeta de uploads temporales: la prueba nunca toca los datos configurados
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+os.environ.setdefault('SECRET_KEY', 'verify-receipt-batch')
+
+from datetime import date, datetime, timedelta
+from unittest import mock
+from werkzeug.security import generate_password_hash
+from app import app, db
+from models import User, Client, Document, PaymentDiagnosis, PaymentContract, ContractInstallment, PdfJob, StoredBlob
+from services.pdf_job_service import PdfJobService, COMPROBANTES_LOTE, DONE, RUNNING, PENDING
+from services.receipt_service import ReceiptService
+
+START, END = '2026-01-01', '2026-01-31'
+CHUNK = 2
+
+
+class ReceiptBatchTestCase(unittest.TestCase):
+    """
+    The receipt batch only generates the payments without a receipt, counts the blob
+    references of its bulk insert, commits chunk by chunk and keeps its job alive while it
+    runs, so a job taken for dead stops and its retry only generates what is still missing.
+    """
+
+    def setUp(self):
+        self.upload_folder = tempfile.mkdtemp()
+        app.config['TESTING'] = True
+        app.config['UPLOAD_FOLDER'] = self.upload_folder
+        self.ctx = app.test_request_context()
+        self.ctx.push()
+        db.create_all()
+
+        admin = User(nombre_completo='Admin Verify', email='admin@verify.test', rol='Admin',
+                     password=generate_password_hash('verify'))
+        db.session.add(admin)
+        db.session.commit()
+        self.user_id = admin.id
+
+        # 5 pagos del periodo: 3 análisis verificados y 2 cuotas pagadas (más una pendiente y una fuera del rango)
+        for i in range(3):
+            client = Client(nombre=f'Cliente {i}', telefono='3000000000', numero_id=f'10{i}')
+            db.session.add(client)
+            db.session.flush()
+            db.session.add(PaymentDiagnosis(client_id=client.id, valor=100000, fecha_pago=date(2026, 1, 10 + i),
+                                            metodo_pago='Nequi', verificado=True))
+            if i == 0:
+                contract = PaymentContract(client_id=client.id, valor_total=900000, numero_cuotas=4)
+                db.session.add(contract)
+                db.session.flush()
+                for n, (due, estado) in enumerate([(date(2026, 1, 5), 'Pagada'), (date(2026, 1, 25), 'Pagada'),
+                                                   (date(2026, 1, 28), 'Pendiente'), (date(2026, 2, 5), 'Pagada')], start=1):
+                    db.session.add(ContractInstallment(payment_contract_id=contract.id, numero_cuota=n, valor=225000,
+                                                       fecha_vencimiento=due, estado=estado))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        shutil.rmtree(self.upload_folder, ignore_errors=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.engine.dispose()
+        os.close(_db_fd)
+        os.remove(_db_path)
+
+    def receipts_per_payment(self):
+        rows = db.session.query(Document.payment_diagnosis_id, Document.contract_installment_id).all()
+        return sorted(rows, key=lambda r: (r[0] or 0, r[1] or 0))
+
+    def generate(self, heartbeat=None):
+        with mock.patch('services.receipt_service.BATCH_CHUNK', CHUNK):
+            return ReceiptService.generate_batch(START, END, self.user_id, 'Admin Verify', workers=1, heartbeat=heartbeat)
+
+    def test_heartbeat_and_commit_per_chunk(self):
+        committed = []
+
+        def heartbeat():
+            committed.append(db.session.query(Document.id).count())
+
+        rows = self.generate(heartbeat)
+        self.assertEqual([row['estado'] for row in rows], ['Generado'] * 5)
+        # Un latido por tanda, y cada tanda ya confirmada cuando empieza la siguiente
+        self.assertEqual(committed, [2, 4, 5])
+        self.assertEqual(len(self.receipts_per_payment()), 5)
+
+    def test_requeued_job_stops_and_retry_skips_committed_chunks(self):
+        job = PdfJob(tipo=COMPROBANTES_LOTE, estado=RUNNING, params='{}', requested_by_id=self.user_id,
+                     attempts=1, started_at=datetime.utcnow())
+        db.session.add(job)
+        db.session.commit()
+        beats = []
+
+        def heartbeat():
+            beats.append(1)
+            if len(beats) == 2:
+                # requeue_stale lo tomó por muerto y otro worker lo reclamó
+                PdfJob.query.filter_by(id=job.id).update({'estado': RUNNING, 'attempts': 2}, synchronize_session=False)
+            PdfJobService.heartbeat(job)
+
+        with self.assertRaises(RuntimeError):
+            self.generate(heartbeat)
+        db.session.rollback()
+        # Solo la primera tanda quedó registrada
+        self.assertEqual(len(self.receipts_per_payment()), CHUNK)
+
+        rows = self.generate()
+        self.assertEqual(len(rows), 5 - CHUNK)
+        receipts = self.receipts_per_payment()
+        self.assertEqual(len(receipts), 5)
+        self.assertEqual(len(set(receipts)), 5)
+
+    def test_heartbeat_refreshes_started_at(self):
+        job = PdfJob(tipo=COMPROBANTES_LOTE, estado=RUNNING, params='{}', requested_by_id=self.user_id,
+                     attempts=1, started_at=datetime(2020, 1, 1))
+        db.session.add(job)
+        db.session.commit()
+        PdfJobService.heartbeat(job)
+        db.session.commit()
+        db.session.refresh(job)
+        self.assertGreater(job.started_at, datetime(2020, 1, 1))
+
+        job.estado = PENDING
+        db.session.commit()
+        with self.assertRaises(RuntimeError):
+            PdfJobService.heartbeat(job)
+
+    def test_pending_skips_receipted_payments(self):
+        diagnosis = PaymentDiagnosis.query.order_by(PaymentDiagnosis.id).first()
+        installment = ContractInstallment.query.filter_by(numero_cuota=1).first()
+        # Comprobante ya enlazado a la cuota 1 y uno de análisis anterior al enlace (solo por nombre)
+        db.session.add(Document(filename='Comprobante_Contrato_100_aaaa1111.pdf', client_id=installment.payment_contract.client_id,
+                                uploaded_by_id=self.user_id, contract_installment_id=installment.id))
+        db.session.add(Document(filename='Comprobante_Analisis_100_bbbb2222.pdf', client_id=diagnosis.client_id,
+                                uploaded_by_id=self.user_id))
+        db.session.commit()
+
+        pending = ReceiptService.pending(START, END)
+        self.assertEqual(sorted((tipo, payment.id) for tipo, _, payment in pending),
+                         sorted([('analisis', d.id) for d in PaymentDiagnosis.query if d.id != diagnosis.id] +
+                                [('cuota', i.id) for i in ContractInstallment.query.filter(
+                                    ContractInstallment.estado == 'Pagada',
+                                    ContractInstallment.fecha_vencimiento <= date(2026, 1, 31),
+                                    ContractInstallment.id != installment.id)]))
+
+        rows = self.generate()
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(ReceiptService.pending(START, END), [])
+
+    def test_bulk_insert_counts_blob_references(self):
+        # Mismo PDF para todos: un solo blob con una referencia por documento insertado en bloque
+        with mock.patch('services.receipt_service.PDFService.html_to_pdf', return_value=b'%PDF-1.4 igual'):
+            self.generate()
+        documents = Document.query.all()
+        self.assertEqual(len(documents), 5)
+        self.assertEqual({doc.blob_sha256 for doc in documents}, {documents[0].blob_sha256})
+        self.assertEqual(db.session.get(StoredBlob, documents[0].blob_sha256).ref_count, 5)
+
+        # Los eventos de DocumentStorage siguen funcionando sobre esas filas
+        db.session.delete(documents[0])
+        db.session.commit()
+        self.assertEqual(db.session.get(StoredBlob, documents[1].blob_sha256).ref_count, 4)
+
+    def test_purge_removes_batch_summary(self):
+        rows = self.generate()
+        job = PdfJob(tipo=COMPROBANTES_LOTE, estado=DONE, params='{}', requested_by_id=self.user_id,
+                     attempts=1, finished_at=datetime.utcnow() - timedelta(days=30))
+        db.session.add(job)
+        db.session.commit()
+        job.result_filename = ReceiptService.write_summary(rows, START, END, job.id)
+        db.session.commit()
+        path = os.path.join(self.upload_folder, job.result_filename)
+        self.assertTrue(os.path.isfile(path))
+
+        self.assertEqual(PdfJobService.purge_finished(timedelta(days=7)), 1)
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
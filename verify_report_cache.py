@@ -0,0 +1,191 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+# Base de datos SQLite y carpeta de uploads temporales: la prueba nunca toca los datos configurados
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+os.environ.setdefault('SECRET_KEY', 'verify-report-cache')
+
+from datetime import date, datetime
+from io import BytesIO
+from werkzeug.security import generate_password_hash
+from app import app, db
+from models import User, Client, Expense, PaymentDiagnosis, PaymentContract, ContractInstallment, PdfJob
+from services.pdf_job_service import BALANCE_GENERAL, DONE
+from services.report_cache import ReportCache
+
+REPORT = 'balance_general'
+MARCH = ('2025-03-01', '2025-03-31')
+APRIL = ('2025-04-01', '2025-04-30')
+QUARTER = ('2025-01-01', '2025-03-31')
+
+
+class ReportCacheTestCase(unittest.TestCase):
+    """
+    Every write to the balance's rows gives a new key to the ranges that cover its months
+    and only to them; saving never removes a newer version of the same range, and the
+    directory stays within its size limit by evicting the least recently used files.
+    """
+
+    def setUp(self):
+        self.upload_folder = tempfile.mkdtemp()
+        app.config['TESTING'] = True
+        app.config['UPLOAD_FOLDER'] = self.upload_folder
+        app.config['REPORT_CACHE_MAX_BYTES'] = 0
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        admin = User(nombre_completo='Admin Verify', email='admin@verify.test', rol='Admin',
+                     password=generate_password_hash('verify'))
+        self.client_row = Client(nombre='Cliente Verify', telefono='3000000000', numero_id='123')
+        db.session.add_all([admin, self.client_row])
+        db.session.commit()
+        self.admin_id = admin.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        shutil.rmtree(self.upload_folder, ignore_errors=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.engine.dispose()
+        os.close(_db_fd)
+        os.remove(_db_path)
+
+    def keys(self):
+        return {period: ReportCache.range_key(*period) for period in (MARCH, APRIL, QUARTER)}
+
+    def assertBumped(self, before, *periods):
+        after = self.keys()
+        changed = {period for period in before if before[period] != after[period]}
+        self.assertEqual(changed, set(periods))
+        return after
+
+    def save(self, key, content, period=MARCH):
+        return ReportCache.save(REPORT, key, BytesIO(content), *period)
+
+    def test_writes_bump_only_their_months(self):
+        keys = self.keys()
+
+        diagnosis = PaymentDiagnosis(client_id=self.client_row.id, valor=100000, fecha_pago=date(2025, 3, 10))
+        db.session.add(diagnosis)
+        db.session.commit()
+        keys = self.assertBumped(keys, MARCH, QUARTER)
+
+        diagnosis.valor = 150000
+        db.session.commit()
+        keys = self.assertBumped(keys, MARCH, QUARTER)
+
+        # Mover la fecha cambia el mes de origen y el de destino
+        diagnosis.fecha_pago = date(2025, 4, 2)
+        db.session.commit()
+        keys = self.assertBumped(keys, MARCH, APRIL, QUARTER)
+
+        db.session.delete(diagnosis)
+        db.session.commit()
+        keys = self.assertBumped(keys, APRIL)
+
+        db.session.add(Expense(tipo='Gasto Operativo', descripcion='Arriendo', valor_base=50000,
+                               fecha=datetime(2025, 4, 15, 12, 0), usuario_id=self.admin_id))
+        db.session.commit()
+        keys = self.assertBumped(keys, APRIL)
+
+        contract = PaymentContract(client_id=self.client_row.id, valor_total=900000, numero_cuotas=2)
+        db.session.add(contract)
+        db.session.flush()
+        db.session.add_all([
+            ContractInstallment(payment_contract_id=contract.id, numero_cuota=1, valor=450000,
+                                fecha_vencimiento=date(2025, 3, 5)),
+            ContractInstallment(payment_contract_id=contract.id, numero_cuota=2, valor=450000,
+                                fecha_vencimiento=date(2025, 4, 5)),
+        ])
+        db.session.commit()
+        keys = self.assertBumped(keys, MARCH, APRIL, QUARTER)
+
+        # El valor del contrato cuenta en el mes de su primera cuota
+        contract.valor_total = 1000000
+        db.session.commit()
+        keys = self.assertBumped(keys, MARCH, QUARTER)
+
+        # Campos del cliente que el balance no muestra no invalidan nada
+        self.client_row.telefono = '3111111111'
+        db.session.commit()
+        keys = self.assertBumped(keys)
+
+        self.client_row.es_responsable_iva = True
+        db.session.commit()
+        self.assertBumped(keys, MARCH, APRIL, QUARTER)
+
+    def test_late_job_keeps_newer_version(self):
+        old_key = ReportCache.range_key(*MARCH)
+        db.session.add(PaymentDiagnosis(client_id=self.client_row.id, valor=100000, fecha_pago=date(2025, 3, 10)))
+        db.session.commit()
+        new_key = ReportCache.range_key(*MARCH)
+
+        new_path = self.save(new_key, b'%PDF nuevo')
+        # El trabajo encolado antes del cambio termina después: su archivo no reemplaza al nuevo
+        old_path = self.save(old_key, b'%PDF viejo')
+        self.assertTrue(os.path.isfile(new_path))
+        self.assertEqual(ReportCache.get(REPORT, new_key), new_path)
+
+        # La siguiente versión vigente sí reemplaza a las anteriores del mismo rango
+        april_path = self.save(ReportCache.range_key(*APRIL), b'%PDF abril', APRIL)
+        db.session.add(Expense(tipo='Costo Indirecto', descripcion='Papelería', valor_base=20000,
+                               fecha=datetime(2025, 3, 11, 9, 0), usuario_id=self.admin_id))
+        db.session.commit()
+        latest_path = self.save(ReportCache.range_key(*MARCH), b'%PDF actual')
+        self.assertFalse(os.path.exists(old_path))
+        self.assertFalse(os.path.exists(new_path))
+        self.assertTrue(os.path.isfile(latest_path))
+        self.assertTrue(os.path.isfile(april_path))
+
+    def test_evict_removes_least_recently_used(self):
+        paths = []
+        for i, period in enumerate([MARCH, APRIL, QUARTER]):
+            path = self.save(ReportCache.range_key(*period), b'x' * 100, period)
+            os.utime(path, (1000 + i, 1000 + i))
+            paths.append(path)
+        # Un acierto marca el archivo más viejo como recién usado
+        self.assertEqual(ReportCache.get(REPORT, ReportCache.range_key(*MARCH)), paths[0])
+
+        removed = ReportCache.evict(200)
+        self.assertEqual(removed, {'files': 1, 'bytes': 100})
+        self.assertEqual([os.path.exists(path) for path in paths], [True, False, True])
+        self.assertEqual(ReportCache.stats(), {'files': 2, 'bytes': 200})
+
+        # El archivo recién guardado nunca se expulsa, aunque solo él quepa
+        removed = ReportCache.evict(50, keep=paths[2])
+        self.assertEqual(removed['files'], 1)
+        self.assertEqual([os.path.exists(path) for path in paths], [False, False, True])
+
+    def test_done_job_with_evicted_file_sends_back_to_balance(self):
+        key = ReportCache.range_key(*MARCH)
+        path = self.save(key, b'%PDF balance')
+        job = PdfJob(tipo=BALANCE_GENERAL, estado=DONE, params_hash=key, requested_by_id=self.admin_id, attempts=1,
+                     params='{"start_date": "%s", "end_date": "%s"}' % MARCH, finished_at=datetime.utcnow(),
+                     result_filename=os.path.relpath(path, self.upload_folder))
+        db.session.add(job)
+        db.session.commit()
+
+        with app.test_client() as client:
+            with client.session_transaction() as session:
+                session['_user_id'] = str(self.admin_id)
+            response = client.get(f'/pdf-jobs/{job.id}/download')
+            self.assertEqual(response.status_code, 200)
+            response.close()
+
+            # La caché lo expulsó: la descarga vuelve a la vista del balance con el mismo periodo
+            ReportCache.purge()
+            response = client.get(f'/pdf-jobs/{job.id}/download')
+            self.assertEqual(response.status_code, 302)
+            self.assertIn('/balance_general/pdf?start_date=2025-03-01&end_date=2025-03-31', response.headers['Location'])
+
+
+if __name__ == '__main__':
+    unittest.main()
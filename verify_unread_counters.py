@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+
+# Base de datos SQLite temporal: la prueba nunca toca la base configurada en .env
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+os.environ.setdefault('SECRET_KEY', 'verify-unread-counters')
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app import app, db
+from models import User, Client, CaseMessage, UnreadMessageCounter
+from services.notification_service import NotificationService
+
+
+class UnreadCounterUpsertTestCase(unittest.TestCase):
+    """
+    register_message upserts the unread counters, so a counter row created by a concurrent
+    message the session never saw is incremented instead of violating the unique constraint;
+    refresh_clients rebuilds many clients' counters with set-based statements.
+    """
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+        users = {}
+        for rol in ('Admin', 'Analista', 'Abogado'):
+            users[rol] = User(nombre_completo=f'{rol} Verify', email=f'{rol.lower()}@verify.test', rol=rol,
+                              password=generate_password_hash('verify'))
+        db.session.add_all(users.values())
+        db.session.flush()
+        self.users = {rol: user.id for rol, user in users.items()}
+        client = Client(nombre='Cliente Verify', telefono='3000000000', numero_id='123',
+                        analista_id=self.users['Analista'], abogado_id=self.users['Abogado'])
+        db.session.add(client)
+        db.session.commit()
+        self.client_id = client.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.engine.dispose()
+        os.close(_db_fd)
+        os.remove(_db_path)
+
+    def send(self, sender_rol):
+        message = CaseMessage(content='Hola', sender_id=self.users[sender_rol], client_id=self.client_id)
+        db.session.add(message)
+        db.session.flush()
+        NotificationService.register_message(message)
+        db.session.commit()
+
+    def counts(self):
+        return {user_id: count for user_id, count in db.session.query(
+            UnreadMessageCounter.user_id, UnreadMessageCounter.count
+        ).filter_by(client_id=self.client_id)}
+
+    def test_counts_every_recipient_but_the_sender(self):
+        self.send('Analista')
+        self.send('Analista')
+        self.send('Abogado')
+        self.assertEqual(self.counts(), {self.users['Admin']: 3, self.users['Abogado']: 2, self.users['Analista']: 1})
+
+    def test_counter_created_concurrently_is_incremented(self):
+        # Otro envío confirmó la fila del abogado por su propia conexión; esta sesión nunca la cargó
+        with db.engine.begin() as connection:
+            connection.execute(UnreadMessageCounter.__table__.insert().values(
+                user_id=self.users['Abogado'], client_id=self.client_id, count=1
+            ))
+        self.send('Analista')
+        self.assertEqual(self.counts(), {self.users['Admin']: 1, self.users['Abogado']: 2})
+
+    def test_refresh_clients_matches_refresh_client(self):
+        # Más clientes, uno con usuario del portal, y mensajes leídos y sin leer de varios remitentes
+        portal = User(nombre_completo='Cliente Portal', email='portal@verify.test', rol='Cliente',
+                      password=generate_password_hash('verify'))
+        db.session.add(portal)
+        db.session.flush()
+        client_ids = [self.client_id]
+        for i in range(3):
+            client = Client(nombre=f'Cliente {i}', telefono='3000000000', numero_id=f'20{i}',
+                            analista_id=self.users['Analista'] if i != 1 else None,
+                            abogado_id=self.users['Abogado'] if i == 2 else None,
+                            login_user_id=portal.id if i == 0 else None)
+            db.session.add(client)
+            db.session.flush()
+            client_ids.append(client.id)
+        senders = [self.users['Analista'], self.users['Abogado'], self.users['Admin'], portal.id]
+        for n in range(12):
+            db.session.add(CaseMessage(content='Hola', sender_id=senders[n % 4], client_id=client_ids[n % 4],
+                                       is_read_by_recipient=(n % 5 == 0)))
+        db.session.commit()
+
+        for client_id in client_ids:
+            NotificationService.refresh_client(client_id)
+        db.session.commit()
+        expected = self.all_counts()
+
+        # Contadores viejos que la reconstrucción debe reemplazar
+        UnreadMessageCounter.query.update({UnreadMessageCounter.count: 99})
+        db.session.commit()
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            NotificationService.refresh_clients(client_ids)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        db.session.commit()
+
+        self.assertEqual(len(expected), 8)
+        self.assertEqual(self.all_counts(), expected)
+        # Un DELETE y un INSERT ... SELECT, sin importar cuántos clientes
+        self.assertEqual(len(statements), 2)
+
+    def all_counts(self):
+        return sorted(db.session.query(UnreadMessageCounter.client_id, UnreadMessageCounter.user_id,
+                                       UnreadMessageCounter.count).filter(UnreadMessageCounter.count > 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# Base de datos SQLite y carpeta de uploads temporales: la prueba nunca toca los datos configurados
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+os.environ.setdefault('SECRET_KEY', 'verify-upload-gc')
+
+from datetime import datetime, timedelta
+from io import BytesIO
+from unittest import mock
+from werkzeug.datastructures import FileStorage
+from werkzeug.security import generate_password_hash
+from app import app, db
+from models import User, Client, Document, StoredBlob
+from services.document_service import DocumentService
+from services.document_storage import DocumentStorage
+from services.upload_gc import UploadGC
+
+GRACE = timedelta(hours=24)
+CONTENT = b'%PDF-1.4 contenido repetido'
+
+
+class UploadGCBlobRaceTestCase(unittest.TestCase):
+    """
+    The cleanup must never remove a blob that an upload of the same content is reusing,
+    whether the upload lands while the orphans are listed or between store() and the
+    flush of its Document.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.upload_folder = tempfile.mkdtemp()
+        app.config['TESTING'] = True
+        app.config['UPLOAD_FOLDER'] = cls.upload_folder
+        with app.app_context():
+            db.create_all()
+            user = User(nombre_completo='Admin Verify', email='admin@verify.test', rol='Admin',
+                        password=generate_password_hash('verify'))
+            client = Client(nombre='Cliente Verify', telefono='3000000000', numero_id='123')
+            db.session.add_all([user, client])
+            db.session.commit()
+            cls.user_id = user.id
+            cls.client_id = client.id
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        shutil.rmtree(cls.upload_folder, ignore_errors=True)
+        os.close(_db_fd)
+        os.remove(_db_path)
+
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        Document.query.delete()
+        StoredBlob.query.delete()
+        db.session.commit()
+        shutil.rmtree(os.path.join(self.upload_folder, 'blobs'), ignore_errors=True)
+
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+
+    def upload(self):
+        return DocumentService.upload_file(FileStorage(BytesIO(CONTENT), 'soporte.pdf'), self.client_id, self.user_id)
+
+    def orphan_blob(self):
+        """Blob sin documentos, con archivo y fila más viejos que el periodo de gracia."""
+        doc = self.upload()
+        sha256 = doc.blob_sha256
+        DocumentService.delete_document(doc.id)
+        old = datetime.utcnow() - 2 * GRACE
+        StoredBlob.query.filter_by(sha256=sha256).update({'created_at': old})
+        db.session.commit()
+        os.utime(DocumentStorage.blob_path(sha256), (old.timestamp(), old.timestamp()))
+        return sha256
+
+    def collect_with(self, orphans):
+        # Simula la carrera: los huérfanos se listaron antes de que llegara la subida
+        with mock.patch.object(UploadGC, 'find_orphans', return_value=iter(orphans)):
+            return UploadGC.collect(GRACE, dry_run=False)
+
+    def test_upload_committed_after_listing_keeps_blob(self):
+        sha256 = self.orphan_blob()
+        orphans = list(UploadGC.find_orphans(GRACE))
+        self.assertIn('blob sin documentos', [reason for _, _, reason in orphans])
+
+        doc = self.upload()
+        summary = self.collect_with(orphans)
+
+        self.assertEqual(summary['files'], 0)
+        self.assertEqual(doc.blob_sha256, sha256)
+        self.assertTrue(os.path.isfile(DocumentStorage.blob_path(sha256)))
+        self.assertEqual(db.session.get(StoredBlob, sha256).ref_count, 1)
+
+    def test_cleanup_between_store_and_document_flush_keeps_blob(self):
+        sha256 = self.orphan_blob()
+        orphans = list(UploadGC.find_orphans(GRACE))
+
+        blob = DocumentStorage.store(BytesIO(CONTENT))
+        # La limpieza corre en otro proceso (aquí otro hilo con su propia sesión) antes del flush del Document
+        summaries = []
+
+        def run_gc():
+            with app.app_context():
+                summaries.append(self.collect_with(orphans))
+                db.session.remove()
+
+        gc_thread = threading.Thread(target=run_gc)
+        gc_thread.start()
+        time.sleep(0.3)
+        db.session.add(Document(filename='client_x_soporte.pdf', client_id=self.client_id,
+                                uploaded_by_id=self.user_id, blob_sha256=blob.sha256))
+        db.session.commit()
+        gc_thread.join()
+
+        self.assertEqual(summaries[0]['files'], 0)
+        self.assertTrue(os.path.isfile(DocumentStorage.blob_path(sha256)))
+        self.assertEqual(db.session.get(StoredBlob, sha256).ref_count, 1)
+
+    def test_upload_while_cleanup_removes_file_keeps_blob(self):
+        sha256 = self.orphan_blob()
+        uploads = []
+
+        def upload_in_thread():
+            with app.app_context():
+                uploads.append(self.upload().blob_sha256)
+                db.session.remove()
+
+        def report(path, size, reason):
+            # La subida del mismo contenido llega justo cuando la limpieza va a borrar el archivo
+            upload_thread = threading.Thread(target=upload_in_thread)
+            upload_thread.start()
+            threads.append(upload_thread)
+            time.sleep(0.3)
+
+        threads = []
+        summary = UploadGC.collect(GRACE, dry_run=False, report=report)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(summary['files'], 1)
+        self.assertEqual(uploads, [sha256])
+        self.assertTrue(os.path.isfile(DocumentStorage.blob_path(sha256)))
+        self.assertEqual(db.session.get(StoredBlob, sha256).ref_count, 1)
+
+    def test_upload_after_cleanup_writes_blob_again(self):
+        sha256 = self.orphan_blob()
+        summary = UploadGC.collect(GRACE, dry_run=False)
+        self.assertEqual(summary['files'], 1)
+        self.assertFalse(os.path.exists(DocumentStorage.blob_path(sha256)))
+        self.assertIsNone(db.session.get(StoredBlob, sha256))
+
+        self.upload()
+        self.assertTrue(os.path.isfile(DocumentStorage.blob_path(sha256)))
+        self.assertEqual(db.session.get(StoredBlob, sha256).ref_count, 1)
+
+    def test_blob_file_without_row_is_collected(self):
+        sha256 = self.orphan_blob()
+        StoredBlob.query.filter_by(sha256=sha256).delete()
+        db.session.commit()
+
+        summary = UploadGC.collect(GRACE, dry_run=False)
+        self.assertEqual(summary['files'], 1)
+        self.assertFalse(os.path.exists(DocumentStorage.blob_path(sha256)))
+        self.assertIsNone(db.session.get(StoredBlob, sha256))
+
+
+class UploadGCScopeTestCase(unittest.TestCase):
+    """
+    The cleanup only considers files it owns: document-shaped names at the upload root and
+    interrupted writes of the report cache, whose PDFs are left to its own eviction.
+    """
+
+    def setUp(self):
+        self.upload_folder = tempfile.mkdtemp()
+        app.config['UPLOAD_FOLDER'] = self.upload_folder
+        self.ctx = app.app_context()
+        self.ctx.push()
+        old = datetime.now() - 2 * GRACE
+        for relative in ['client_7_contrato.pdf', 'Comprobante_Analisis_123_ab12cd34.pdf', 'robots.txt',
+                         'reports/balance_general_0123456789abcdef_fedcba9876543210.pdf', 'reports/tmp1234.tmp']:
+            path = os.path.join(self.upload_folder, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'x')
+            os.utime(path, (old.timestamp(), old.timestamp()))
+
+    def tearDown(self):
+        db.session.remove()
+        self.ctx.pop()
+        shutil.rmtree(self.upload_folder, ignore_errors=True)
+
+    def test_only_owned_files_are_orphans(self):
+        live = {'documents': {'client_7_contrato.pdf'}, 'blobs': set(), 'payments': set()}
+        orphans = {relative: reason for relative, _, reason in UploadGC.find_orphans(GRACE, live)}
+        self.assertEqual(orphans, {
+            'Comprobante_Analisis_123_ab12cd34.pdf': 'documento sin registro',
+            os.path.join('reports', 'tmp1234.tmp'): 'reporte a medio escribir',
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
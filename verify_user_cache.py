@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+# Base de datos SQLite temporal: la prueba nunca toca la base configurada en .env
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+os.environ.setdefault('SECRET_KEY', 'verify-user-cache')
+
+from werkzeug.security import generate_password_hash
+from app import app, db
+from models import User, Client
+from services.user_service import UserService
+from utils.user_cache import UserCache
+
+
+class UserCacheVersionTestCase(unittest.TestCase):
+    """
+    A revocation made by another server reaches this process through the database version
+    stamp within USER_CACHE_VERSION_CHECK seconds, not after the cache TTL.
+    """
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['USER_CACHE_TTL'] = 3600
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+        user = User(nombre_completo='Cliente Portal', email='portal@verify.test', rol='Cliente',
+                    password=generate_password_hash('verify'))
+        db.session.add(user)
+        db.session.flush()
+        client = Client(nombre='Cliente Verify', telefono='3000000000', numero_id='123', login_user_id=user.id)
+        db.session.add(client)
+        db.session.commit()
+        self.user_id = user.id
+        self.client_id = client.id
+        UserCache._entries = {}
+        UserCache._version = None
+        UserCache._checked_at = None
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.engine.dispose()
+        os.close(_db_fd)
+        os.remove(_db_path)
+
+    def revoke_from_other_server(self):
+        # Otro servidor revoca el acceso: cambia la fila y sube la versión, sin tocar el caché de este proceso
+        entries, checked_at = UserCache._entries, UserCache._checked_at
+        UserCache._entries = {}
+        UserService.disable_portal_access(self.client_id)
+        UserCache._entries, UserCache._checked_at = entries, checked_at
+
+    def test_revocation_on_other_server_applies_after_version_check(self):
+        app.config['USER_CACHE_VERSION_CHECK'] = 3600
+        self.assertIsNotNone(UserCache.load(self.user_id))
+        self.revoke_from_other_server()
+        # Dentro del intervalo este proceso aún no releyó la versión
+        self.assertIsNotNone(UserCache.load(self.user_id))
+
+        UserCache._checked_at -= 3600
+        self.assertIsNone(UserCache.load(self.user_id))
+
+    def test_revocation_in_same_process_applies_at_once(self):
+        app.config['USER_CACHE_VERSION_CHECK'] = 3600
+        self.assertIsNotNone(UserCache.load(self.user_id))
+        UserService.disable_portal_access(self.client_id)
+        self.assertIsNone(UserCache.load(self.user_id))
+
+
+if __name__ == '__main__':
+    unittest.main()